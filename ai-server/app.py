@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Union, Any
@@ -7,18 +7,21 @@ import uvicorn
 from pathlib import Path
 import json
 import logging
+import threading
 from datetime import datetime
 import os
 
 from model import (
     Patient, MealPlan, WeeklyMealPlan, HybridNeuralEngine, 
-    Food, AyurvedaKnowledgeGraph
+    Food, AyurvedaKnowledgeGraph, AdapterBaseMismatchError
 )
 from train import (
     load_foods_csv, load_patients_csv, load_doctor_plans_csv,
-    MealPlanTrainer, create_sample_data
+    create_sample_data
 )
+from training_jobs import TrainingJob, TrainingJobManager, JobAlreadyRunningError
 from rag_chatbot import rag_chatbot
+from nutrition import NUTRIENTS
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -43,8 +46,20 @@ app.add_middleware(
 # Global variables
 engine: Optional[HybridNeuralEngine] = None
 graph_data = None
+job_manager: Optional[TrainingJobManager] = None
+engine_swap_lock = threading.Lock()
 models_dir = Path("./models")
 data_dir = Path("./datasets")
+# ENGINE_MODE=solver serves from the plan solver; with MAX_CONCURRENT_GENERATIONS set,
+# requests beyond that many concurrent T5 decodes are answered by the solver
+engine_options = dict(
+    engine_mode=os.getenv("ENGINE_MODE", "t5"),
+    max_concurrent_generations=int(os.getenv("MAX_CONCURRENT_GENERATIONS", "0")) or None,
+    default_plans_path=os.getenv("DEFAULT_PLANS_FILE"),
+    # Decoded plans shared by all workers on the host (off unless PLAN_CACHE_FILE is set)
+    plan_cache_path=os.getenv("PLAN_CACHE_FILE"),
+    plan_cache_max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "10000")),
+)
 
 # Pydantic models for API
 class PatientCreate(BaseModel):
@@ -71,6 +86,11 @@ class PatientResponse(BaseModel):
     allergies: List[str]
     preferred_cuisine: List[str]
 
+class ResolvedItem(BaseModel):
+    item: str
+    food_id: Optional[str] = None  # foods.csv food_id, None when unresolved
+    confidence: float = 0.0
+
 class MealPlanResponse(BaseModel):
     patient_id: str
     day: int
@@ -80,11 +100,59 @@ class MealPlanResponse(BaseModel):
     snacks: List[str]
     restrictions: List[str]
     doctor_notes: str
+    resolved: Optional[Dict[str, List[ResolvedItem]]] = None
+    safety_notes: List[str] = []
+    nutrition: Optional[Dict[str, float]] = None  # day totals: calories, protein, carbs, fats, fiber
+    score: Optional[float] = None
+    alternatives: Optional[List["MealPlanResponse"]] = None
 
 class WeeklyMealPlanResponse(BaseModel):
     patient_id: str
     days: List[MealPlanResponse]
     weekly_notes: str
+    nutrition: Optional[Dict[str, float]] = None  # week totals
+    score: Optional[float] = None
+    alternatives: Optional[List["WeeklyMealPlanResponse"]] = None
+
+class NutritionDay(BaseModel):
+    breakfast: List[str] = []
+    lunch: List[str] = []
+    dinner: List[str] = []
+    snacks: List[str] = []
+
+class NutritionPlan(BaseModel):
+    plan_id: Optional[str] = None
+    days: List[NutritionDay]
+
+class NutritionReportRequest(BaseModel):
+    plans: List[NutritionPlan] = Field(..., description="Plans to total, one entry per plan")
+
+class NutritionPlanReport(BaseModel):
+    plan_id: Optional[str] = None
+    days: List[Dict[str, float]]
+    total: Dict[str, float]
+    daily_average: Dict[str, float]
+    unresolved_items: int
+
+class NutritionReportResponse(BaseModel):
+    nutrients: List[str]
+    reports: List[NutritionPlanReport]
+
+class PairingRequest(BaseModel):
+    items: List[str] = Field(..., min_length=1, description="Foods already in the meal")
+    meal: str = Field("any", pattern="^(breakfast|lunch|dinner|snacks|any)$",
+                      description="Meal slot whose co-occurrence statistics to use")
+    k: int = Field(10, ge=1, le=100, description="Number of suggestions")
+    patient: Optional[PatientCreate] = Field(None, description="Leave out foods unsafe for this patient")
+
+class PairingSuggestion(BaseModel):
+    food_id: str
+    name: str
+    score: float
+
+class PairingResponse(BaseModel):
+    suggestions: List[PairingSuggestion]
+    unresolved_items: List[str]
 
 class GenerationRequest(BaseModel):
     patient: PatientCreate
@@ -92,12 +160,51 @@ class GenerationRequest(BaseModel):
     weekly: bool = Field(False, description="Generate 7-day plan instead of single day")
     temperature: float = Field(0.9, ge=0.1, le=2.0, description="Generation temperature")
     use_knowledge_graph: bool = Field(True, description="Use knowledge graph for recommendations")
+    adapter: Optional[str] = Field(None, description="Clinic LoRA adapter to generate with (models/adapters/<name>)")
+    num_candidates: int = Field(3, ge=1, le=8, description="Candidates decoded and reranked against the knowledge graph")
+    return_alternatives: bool = Field(False, description="Include the lower-ranked candidates in the response")
+    safety_mode: Optional[str] = Field("remove", pattern="^(flag|remove|replace)$",
+                                       description="How to handle items unsafe for the patient's allergies and conditions (null to skip)")
+    engine_mode: Optional[str] = Field(None, pattern="^(t5|solver|retrieval|library)$",
+                                       description="Override the server's engine mode: T5 decoding, the plan solver, doctor plans of similar patients, or the archetype plan library")
+
+class RegenerationTarget(BaseModel):
+    day: int = Field(..., ge=1, le=7, description="Day to regenerate")
+    meals: Optional[List[str]] = Field(None, description="Meals of the day to replace (breakfast, lunch, dinner, snacks); all when omitted")
+
+class RegenerationRequest(BaseModel):
+    patient: PatientCreate
+    plan: WeeklyMealPlanResponse = Field(..., description="Plan to patch, as returned by /generate/weekly")
+    targets: List[RegenerationTarget] = Field(..., min_length=1, description="Days or meals to replace")
+    temperature: float = Field(0.9, ge=0.1, le=2.0, description="Generation temperature")
+    adapter: Optional[str] = Field(None, description="Clinic LoRA adapter to generate with (models/adapters/<name>)")
+    num_candidates: int = Field(3, ge=1, le=8, description="Candidates decoded per regenerated day")
+    safety_mode: Optional[str] = Field("remove", pattern="^(flag|remove|replace)$",
+                                       description="How to handle items unsafe for the patient's allergies and conditions (null to skip)")
+    engine_mode: Optional[str] = Field(None, pattern="^(t5|solver)$",
+                                       description="Regenerate with T5 decoding or the plan solver")
 
 class TrainingRequest(BaseModel):
     epochs: int = Field(3, ge=1, le=20, description="Number of training epochs")
     batch_size: int = Field(1, ge=1, le=8, description="Training batch size")
     learning_rate: float = Field(3e-4, gt=0, description="Learning rate")
     weekly_mode: bool = Field(True, description="Train for weekly plans")
+    model_name: str = Field("t5-small", description="Base model (t5-small/t5-base/t5-large)")
+    incremental: bool = Field(False, description="Fine-tune the deployed model on plans added since its last run")
+    replay_ratio: float = Field(0.1, ge=0, le=1, description="Share of older plans replayed in incremental mode")
+
+class TrainingJobResponse(BaseModel):
+    job_id: str
+    status: str
+    params: Dict[str, Any]
+    output_dir: str
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    return_code: Optional[int] = None
+    error: Optional[str] = None
+    deployed: bool = False
+    progress: Dict[str, Any] = Field(default={}, description="Step, loss, steps/s and ETA reported by the training process")
 
 # New model for backend integration
 class BackendPatientData(BaseModel):
@@ -116,6 +223,9 @@ class ModelInfo(BaseModel):
     is_loaded: bool
     models_available: List[str]
     last_trained: Optional[str] = None
+    adapters_available: List[str] = []
+    adapters_loaded: List[str] = []
+    plan_cache: Optional[Dict[str, Any]] = None
 
 class RAGChatRequest(BaseModel):
     message: str = Field(..., description="User's message for the RAG chatbot")
@@ -148,9 +258,10 @@ def convert_patient_create_to_patient(patient_create: PatientCreate, patient_id:
         preferred_cuisine=patient_create.preferred_cuisine
     )
 
-def convert_meal_plan_to_response(meal_plan: MealPlan) -> MealPlanResponse:
+def convert_meal_plan_to_response(meal_plan: MealPlan, score: Optional[float] = None) -> MealPlanResponse:
     """Convert MealPlan to MealPlanResponse"""
     return MealPlanResponse(
+        score=score,
         patient_id=meal_plan.patient_id,
         day=meal_plan.day,
         breakfast=meal_plan.breakfast,
@@ -158,7 +269,32 @@ def convert_meal_plan_to_response(meal_plan: MealPlan) -> MealPlanResponse:
         dinner=meal_plan.dinner,
         snacks=meal_plan.snacks,
         restrictions=meal_plan.restrictions,
-        doctor_notes=meal_plan.doctor_notes
+        doctor_notes=meal_plan.doctor_notes,
+        safety_notes=meal_plan.safety_notes,
+        nutrition=meal_plan.nutrition or None,
+        resolved={
+            meal: [
+                ResolvedItem(item=item, food_id=resolution.food_id, confidence=resolution.confidence)
+                for item, resolution in zip(getattr(meal_plan, meal), resolutions)
+            ]
+            for meal, resolutions in meal_plan.resolved.items()
+        } or None
+    )
+
+def convert_job_to_response(job: TrainingJob) -> TrainingJobResponse:
+    """Convert TrainingJob to TrainingJobResponse"""
+    return TrainingJobResponse(
+        job_id=job.job_id,
+        status=job.status,
+        params=job.params,
+        output_dir=job.output_dir,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        return_code=job.return_code,
+        error=job.error,
+        deployed=job.deployed,
+        progress=job.progress
     )
 
 def convert_weekly_plan_to_response(weekly_plan: WeeklyMealPlan) -> WeeklyMealPlanResponse:
@@ -166,16 +302,27 @@ def convert_weekly_plan_to_response(weekly_plan: WeeklyMealPlan) -> WeeklyMealPl
     return WeeklyMealPlanResponse(
         patient_id=weekly_plan.patient_id,
         days=[convert_meal_plan_to_response(day) for day in weekly_plan.days],
-        weekly_notes=weekly_plan.weekly_notes
+        weekly_notes=weekly_plan.weekly_notes,
+        nutrition=getattr(weekly_plan, 'nutrition', None) or None,
+        score=getattr(weekly_plan, 'score', None),
+        alternatives=[
+            convert_weekly_plan_to_response(alt) for alt in getattr(weekly_plan, 'alternatives', [])
+        ] or None
     )
 
 async def initialize_engine():
     """Initialize the AI engine"""
-    global engine, graph_data
+    global engine, graph_data, job_manager
     
     try:
         logger.info("Initializing AI engine...")
         
+        job_manager = TrainingJobManager(
+            models_dir=str(models_dir),
+            dataset_dir=str(data_dir),
+            on_complete=swap_in_trained_model
+        )
+        
         # Try to find and load any existing trained model
         available_models = []
         if models_dir.exists():
@@ -183,16 +330,21 @@ async def initialize_engine():
                 if model_path.is_dir() and (model_path / "config.json").exists():
                     available_models.append(model_path)
         
+        # Prefer the model most recently deployed by a training job
+        latest_job = job_manager.latest_deployed()
+        if latest_job is not None:
+            available_models.insert(0, Path(latest_job.output_dir))
+        
         if available_models:
             # Load the most recent model (or first available)
             model_to_load = available_models[0]  # You could sort by modification time
             logger.info(f"Found trained model: {model_to_load.name}")
             logger.info(f"Loading existing model from {model_to_load}")
-            engine = HybridNeuralEngine(models_dir=str(models_dir))
+            engine = HybridNeuralEngine(models_dir=str(models_dir), **engine_options)
             engine.load_model(str(model_to_load))
         else:
             logger.info("No existing trained models found, initializing new model")
-            engine = HybridNeuralEngine(models_dir=str(models_dir))
+            engine = HybridNeuralEngine(models_dir=str(models_dir), **engine_options)
         
         # Load data and build knowledge graph
         await load_and_build_graph()
@@ -202,38 +354,74 @@ async def initialize_engine():
     except Exception as e:
         logger.error(f"Failed to initialize AI engine: {e}")
         # Initialize with basic engine as fallback
-        engine = HybridNeuralEngine(models_dir=str(models_dir))
+        engine = HybridNeuralEngine(models_dir=str(models_dir), **engine_options)
 
 async def load_and_build_graph():
     """Load data and build knowledge graph"""
     global graph_data
     
     try:
-        # Setup data paths
-        foods_csv = data_dir / "foods.csv"
-        patients_csv = data_dir / "patients.csv"
-        plans_csv = data_dir / "doctor_plans.csv"
-        
-        # Check if data files exist, create sample data if not
-        if not all(p.exists() for p in [foods_csv, patients_csv, plans_csv]):
-            logger.info("Creating sample data files...")
-            data_dir.mkdir(parents=True, exist_ok=True)
-            create_sample_data(str(foods_csv), str(patients_csv), str(plans_csv))
-        
-        # Load data
-        logger.info("Loading knowledge base data...")
-        foods = load_foods_csv(str(foods_csv))
-        patients = load_patients_csv(str(patients_csv))
-        
-        # Build knowledge graph
-        logger.info("Building knowledge graph...")
-        graph_data = engine.build_knowledge_graph(foods, patients)
-        logger.info(f"✓ Knowledge graph built with {graph_data.x.shape[0]} nodes")
-        
+        graph_data = build_graph_for_engine(engine)
     except Exception as e:
         logger.error(f"Failed to load data and build graph: {e}")
         graph_data = None
 
+def build_graph_for_engine(target_engine: HybridNeuralEngine):
+    """Load the knowledge base data and build the graph on `target_engine`"""
+    # Setup data paths
+    foods_csv = data_dir / "foods.csv"
+    patients_csv = data_dir / "patients.csv"
+    plans_csv = data_dir / "doctor_plans.csv"
+    
+    # Check if data files exist, create sample data if not
+    if not all(p.exists() for p in [foods_csv, patients_csv, plans_csv]):
+        logger.info("Creating sample data files...")
+        data_dir.mkdir(parents=True, exist_ok=True)
+        create_sample_data(str(foods_csv), str(patients_csv), str(plans_csv))
+    
+    # Load data
+    logger.info("Loading knowledge base data...")
+    foods = load_foods_csv(str(foods_csv))
+    patients = load_patients_csv(str(patients_csv))
+    
+    # Build knowledge graph
+    logger.info("Building knowledge graph...")
+    new_graph_data = target_engine.build_knowledge_graph(foods, patients)
+    logger.info(f"✓ Knowledge graph built with {new_graph_data.x.shape[0]} nodes")
+
+    # Doctor plans of similar patients back the retrieval mode; their food
+    # co-occurrences back pairing suggestions when the model has none saved
+    plans = load_doctor_plans_csv(str(plans_csv))
+    target_engine.build_plan_index(patients, plans)
+    if target_engine.get_food_pairing() is None:
+        target_engine.build_food_pairing(plans)
+
+    # Archetype plans written by build_plan_library.py back the library mode
+    library_path = Path(os.getenv("PLAN_LIBRARY_FILE", str(models_dir / "plan_library.json")))
+    if library_path.exists():
+        try:
+            target_engine.load_plan_library(str(library_path))
+        except Exception as e:
+            logger.warning(f"Failed to load plan library {library_path}: {e}")
+    return new_graph_data
+
+def swap_in_trained_model(job: TrainingJob):
+    """Load a finished job's model off the request path, then swap it in.
+
+    Called from the job manager's watcher thread. Requests already running
+    keep their reference to the old engine; new requests see the new one.
+    """
+    global engine, graph_data
+    
+    logger.info(f"Loading model from training job {job.job_id}...")
+    new_engine = HybridNeuralEngine(models_dir=str(models_dir), **engine_options)
+    new_engine.load_model(job.output_dir)
+    new_graph_data = build_graph_for_engine(new_engine)
+    
+    with engine_swap_lock:
+        engine, graph_data = new_engine, new_graph_data
+    logger.info(f"✓ Swapped in model from training job {job.job_id}")
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
@@ -280,7 +468,10 @@ async def get_model_info():
         model_name=getattr(engine, 'model_name', 'unknown'),
         is_loaded=True,
         models_available=available_models,
-        last_trained=None  # Could be enhanced to track training timestamps
+        last_trained=None,  # Could be enhanced to track training timestamps
+        adapters_available=engine.available_adapters(),
+        adapters_loaded=engine.loaded_adapters(),
+        plan_cache=engine.plan_cache.stats() if getattr(engine, 'plan_cache', None) else None
     )
 
 @app.post("/model/load/{model_name}")
@@ -308,32 +499,50 @@ async def generate_single_day_plan(request: GenerationRequest):
         # Convert request to Patient object
         patient = convert_patient_create_to_patient(request.patient, "temp_patient")
         
-        # Generate meal plan
-        generated_text = engine.generate_meal_plan(
+        # Generate and rerank candidate plans, best first
+        candidates = await asyncio.to_thread(
+            engine.generate_meal_plan,
             patient=patient,
             day=request.day,
             graph_data=graph_data,
             temperature=request.temperature,
-            use_knowledge_graph=request.use_knowledge_graph
-        )
-        
-        # Parse the generated text
-        parsed_plan = engine.parse_generated_plan(generated_text)
-        
-        # Create meal plan object
-        meal_plan = MealPlan(
-            patient_id=patient.id,
-            day=request.day,
-            breakfast=parsed_plan['breakfast'],
-            lunch=parsed_plan['lunch'],
-            dinner=parsed_plan['dinner'],
-            snacks=parsed_plan['snacks'],
-            restrictions=[],
-            doctor_notes=f"AI-generated plan for {patient.prakriti} constitution"
+            use_knowledge_graph=request.use_knowledge_graph,
+            adapter=request.adapter,
+            num_candidates=request.num_candidates,
+            return_alternatives=True,
+            engine_mode=request.engine_mode
         )
         
-        return convert_meal_plan_to_response(meal_plan)
-        
+        responses = []
+        for generated_text, score in candidates:
+            # Parse the generated text
+            parsed_plan = engine.parse_generated_plan(generated_text)
+            
+            # Create meal plan object
+            meal_plan = MealPlan(
+                patient_id=patient.id,
+                day=request.day,
+                breakfast=parsed_plan['breakfast'],
+                lunch=parsed_plan['lunch'],
+                dinner=parsed_plan['dinner'],
+                snacks=parsed_plan['snacks'],
+                restrictions=[],
+                doctor_notes=f"AI-generated plan for {patient.prakriti} constitution"
+            )
+            engine.get_food_resolver().resolve_meal_plan(meal_plan)
+            engine.apply_safety_filter(patient, [meal_plan], request.safety_mode)
+            engine.get_nutrient_matrix().annotate([meal_plan])
+            responses.append(convert_meal_plan_to_response(meal_plan, score))
+        
+        best = responses[0]
+        if request.return_alternatives and len(responses) > 1:
+            best.alternatives = responses[1:]
+        return best
+        
+    except AdapterBaseMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating single day plan: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate meal plan: {str(e)}")
@@ -348,20 +557,88 @@ async def generate_weekly_plan(request: GenerationRequest):
         # Convert request to Patient object
         patient = convert_patient_create_to_patient(request.patient, "temp_patient")
         
-        # Generate weekly meal plan
-        weekly_plan = engine.generate_weekly_meal_plan(
+        # Generate weekly meal plan off the event loop, so concurrent requests can
+        # overflow to the solver
+        weekly_plan = await asyncio.to_thread(
+            engine.generate_weekly_meal_plan,
             patient=patient,
             graph_data=graph_data,
             temperature=request.temperature,
-            use_knowledge_graph=request.use_knowledge_graph
+            use_knowledge_graph=request.use_knowledge_graph,
+            adapter=request.adapter,
+            num_candidates=request.num_candidates,
+            return_alternatives=request.return_alternatives,
+            safety_mode=request.safety_mode,
+            engine_mode=request.engine_mode
         )
         
         return convert_weekly_plan_to_response(weekly_plan)
         
+    except AdapterBaseMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Error generating weekly plan: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate weekly meal plan: {str(e)}")
 
+@app.post("/generate/regenerate", response_model=WeeklyMealPlanResponse)
+async def regenerate_plan_segments(request: RegenerationRequest):
+    """Replace selected days or meals of an existing weekly plan, keeping the rest"""
+    if not engine:
+        raise HTTPException(status_code=503, detail="AI engine not initialized")
+    
+    patient = convert_patient_create_to_patient(request.patient, request.plan.patient_id)
+    weekly_plan = WeeklyMealPlan(
+        patient_id=request.plan.patient_id,
+        days=[
+            MealPlan(
+                patient_id=request.plan.patient_id,
+                day=day.day,
+                breakfast=list(day.breakfast),
+                lunch=list(day.lunch),
+                dinner=list(day.dinner),
+                snacks=list(day.snacks),
+                restrictions=list(day.restrictions),
+                doctor_notes=day.doctor_notes,
+                safety_notes=list(day.safety_notes)
+            )
+            for day in request.plan.days
+        ],
+        weekly_notes=request.plan.weekly_notes
+    )
+    # Several targets for one day are merged; a whole-day target wins
+    targets: Dict[int, Optional[List[str]]] = {}
+    for target in request.targets:
+        if target.meals is None or (target.day in targets and targets[target.day] is None):
+            targets[target.day] = None
+        else:
+            targets[target.day] = sorted(set(targets.get(target.day) or []) | set(target.meals))
+    
+    try:
+        patched = await asyncio.to_thread(
+            engine.regenerate_plan_segments,
+            patient=patient,
+            weekly_plan=weekly_plan,
+            targets=targets,
+            temperature=request.temperature,
+            adapter=request.adapter,
+            num_candidates=request.num_candidates,
+            safety_mode=request.safety_mode,
+            engine_mode=request.engine_mode
+        )
+        return convert_weekly_plan_to_response(patched)
+        
+    except AdapterBaseMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error regenerating plan segments: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to regenerate plan segments: {str(e)}")
+
 @app.post("/generate", response_model=Union[MealPlanResponse, WeeklyMealPlanResponse])
 async def generate_meal_plan(request: GenerationRequest):
     """Generate meal plan (single day or weekly based on request)"""
@@ -499,64 +776,37 @@ async def rag_chat(request: RAGChatRequest):
             error=str(e)
         )
 
-@app.post("/train")
-async def train_model(request: TrainingRequest, background_tasks: BackgroundTasks):
-    """Train or fine-tune the model"""
-    if not engine:
-        raise HTTPException(status_code=503, detail="AI engine not initialized")
-    
-    # Add training to background tasks
-    background_tasks.add_task(run_training, request)
+@app.post("/train", response_model=TrainingJobResponse)
+async def train_model(request: TrainingRequest):
+    """Start a training job in a separate process"""
+    if not job_manager:
+        raise HTTPException(status_code=503, detail="Training job manager not initialized")
     
-    return {
-        "message": "Training started in background",
-        "status": "started",
-        "epochs": request.epochs,
-        "batch_size": request.batch_size,
-        "weekly_mode": request.weekly_mode
-    }
-
-async def run_training(request: TrainingRequest):
-    """Run training in background"""
     try:
-        logger.info("Starting model training...")
-        
-        # Initialize trainer
-        trainer = MealPlanTrainer(
-            model_type=engine.model_type,
-            model_name=getattr(engine, 'model_name', 't5-small'),
-            models_dir=str(models_dir)
-        )
-        trainer.engine = engine  # Use existing engine
-        
-        # Setup data paths
-        foods_csv = data_dir / "foods.csv"
-        patients_csv = data_dir / "patients.csv"
-        plans_csv = data_dir / "doctor_plans.csv"
-        
-        # Load data
-        foods, patients, plans = trainer.prepare_data(
-            str(foods_csv), str(patients_csv), str(plans_csv)
-        )
-        
-        # Train model
-        model_path = trainer.train(
-            foods=foods,
-            patients=patients,
-            plans=plans,
-            num_epochs=request.epochs,
-            batch_size=request.batch_size,
-            learning_rate=request.learning_rate,
-            weekly_mode=request.weekly_mode
-        )
-        
-        logger.info(f"✓ Training completed! Model saved to: {model_path}")
-        
-        # Rebuild knowledge graph with updated engine
-        await load_and_build_graph()
-        
-    except Exception as e:
-        logger.error(f"Training failed: {e}")
+        job = job_manager.submit(request.model_dump())
+    except JobAlreadyRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    logger.info(f"Started training job {job.job_id}")
+    return convert_job_to_response(job)
+
+@app.get("/train", response_model=List[TrainingJobResponse])
+async def list_training_jobs():
+    """List training jobs, most recent first"""
+    if not job_manager:
+        raise HTTPException(status_code=503, detail="Training job manager not initialized")
+    return [convert_job_to_response(job) for job in job_manager.list_jobs()]
+
+@app.get("/train/{job_id}", response_model=TrainingJobResponse)
+async def get_training_job(job_id: str):
+    """Get status and progress metrics (steps/s, loss, ETA) for a training job"""
+    if not job_manager:
+        raise HTTPException(status_code=503, detail="Training job manager not initialized")
+    
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    return convert_job_to_response(job)
 
 @app.get("/patients/sample", response_model=List[PatientResponse])
 async def get_sample_patients():
@@ -608,6 +858,51 @@ async def get_food_categories():
         logger.error(f"Error getting food categories: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get food categories: {str(e)}")
 
+@app.post("/nutrition/report", response_model=NutritionReportResponse)
+async def nutrition_report(request: NutritionReportRequest):
+    """Per-day and per-plan nutrient totals for many plans at once"""
+    if not engine or not engine.knowledge_graph:
+        raise HTTPException(status_code=503, detail="Knowledge graph not available")
+    
+    try:
+        reports = engine.get_nutrient_matrix().plan_totals(
+            [[day.model_dump() for day in plan.days] for plan in request.plans]
+        )
+        return NutritionReportResponse(
+            nutrients=list(NUTRIENTS),
+            reports=[
+                NutritionPlanReport(plan_id=plan.plan_id, **report)
+                for plan, report in zip(request.plans, reports)
+            ]
+        )
+    except Exception as e:
+        logger.error(f"Error computing nutrition report: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute nutrition report: {str(e)}")
+
+@app.post("/foods/pairings", response_model=PairingResponse)
+async def food_pairings(request: PairingRequest):
+    """Foods doctors most often combine with the given partial meal"""
+    if not engine or engine.get_food_pairing() is None:
+        raise HTTPException(status_code=503, detail="Food pairing statistics not available")
+    
+    try:
+        patient = None
+        if request.patient is not None:
+            patient = convert_patient_create_to_patient(request.patient, "temp_patient")
+        suggestions, unresolved = engine.suggest_pairings(
+            request.items, meal=request.meal, k=request.k, patient=patient
+        )
+        return PairingResponse(
+            suggestions=[
+                PairingSuggestion(food_id=food_id, name=name, score=round(score, 4))
+                for food_id, name, score in suggestions
+            ],
+            unresolved_items=unresolved
+        )
+    except Exception as e:
+        logger.error(f"Error computing food pairings: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute food pairings: {str(e)}")
+
 # Error handlers
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Golden-corpus check and micro-benchmark for the generated plan parser.
+
+The corpus is built from the doctor plans (formatted like the training
+targets, daily and weekly) plus hand-written edge cases and seeded random
+mutations of both (reordered, repeated and missing markers, tags, case). Every
+text is parsed with `plan_parser` and with the original substring-search
+parser kept below as the reference; any difference is reported and makes the
+script exit non-zero. Then both parsers are timed on batches of plans.
+
+Usage:
+    python benchmark_plan_parser.py [--plans ../docs/datasets/doctor_plans.csv]
+                                    [--batch-size 256] [--repeat 5] [--mutations 2000]
+"""
+
+import argparse
+import csv
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from plan_parser import MEAL_TYPES, StreamingPlanParser, parse_plan_text, parse_weekly_text
+
+
+# Reference implementation: the parser as it was before plan_parser
+def legacy_parse_plan(generated_text: str) -> Dict[str, List[str]]:
+    plan = {
+        'breakfast': [],
+        'lunch': [],
+        'dinner': [],
+        'snacks': []
+    }
+
+    text = generated_text.lower()
+
+    for meal_type in ['breakfast', 'lunch', 'dinner', 'snacks']:
+        if f'{meal_type}:' in text:
+            start = text.index(f'{meal_type}:') + len(f'{meal_type}:')
+            end = len(text)
+            for next_meal in ['breakfast', 'lunch', 'dinner', 'snacks']:
+                if next_meal != meal_type and f'{next_meal}:' in text[start:]:
+                    next_pos = text.index(f'{next_meal}:', start)
+                    if next_pos < end:
+                        end = next_pos
+
+            section = text[start:end].strip()
+            section = section.replace('</', ' ').replace('<', ' ')
+            items = [item.strip() for item in section.split(',')]
+            cleaned_items = []
+            for item in items:
+                item = ' '.join(item.split())
+                item = item.rstrip('.,;')
+                if item and len(item) > 1 and not item.startswith('/'):
+                    cleaned_items.append(item)
+
+            plan[meal_type] = cleaned_items[:5]
+
+    if not any(plan.values()):
+        plan = {
+            'breakfast': ['oatmeal', 'fruits', 'milk'],
+            'lunch': ['rice', 'dal', 'vegetables', 'yogurt'],
+            'dinner': ['chapati', 'vegetables', 'soup'],
+            'snacks': ['nuts', 'fruits']
+        }
+
+    return plan
+
+
+def legacy_parse_weekly(generated_text: str) -> Dict[int, Dict[str, List[str]]]:
+    days = {}
+    text = generated_text.lower()
+    for day_num in range(1, 8):
+        day_pattern = f"day{day_num}:"
+        if day_pattern in text:
+            start = text.index(day_pattern) + len(day_pattern)
+            end = len(text)
+            for next_day in range(day_num + 1, 8):
+                next_pattern = f"day{next_day}:"
+                if next_pattern in text[start:]:
+                    next_pos = text.index(next_pattern, start)
+                    if next_pos < end:
+                        end = next_pos
+            days[day_num] = legacy_parse_plan(text[start:end])
+    return days
+
+
+EDGE_CASES = [
+    "",
+    "no meals here",
+    "breakfast:",
+    "Breakfast: Oats, Milk. Lunch: Rice; Dal, , x, /y dinner: soup snacks: nuts",
+    "breakfast: a, bb lunch: cc breakfast: dd dinner: ee",
+    "lunch: rice breakfast: oats lunch: dal",
+    "breakfast: oats breakfast: milk, tea lunch: rice",
+    "<pad> breakfast: <unk>, poha</s> lunch: </s>dal | dinner: khichdi",
+    "day1: breakfast: oats | day3: lunch: rice | day2: dinner: soup | day1: snacks: nuts",
+    "day7: breakfast: oats day1: lunch: rice day2: day2: dinner: dal",
+    "day1: day2: day3: day4: day5: day6: day7:",
+    "day10: breakfast: oats day1: lunch: rice day11: dinner: dal",
+    "DAY1: BREAKFAST: OATS, MILK | LUNCH: RICE | DAY2: Dinner: Soup",
+    "day1: breakfast: a, b, c, d, e, f, g | lunch: h day8: snacks: i",
+    "day1:breakfast:x,yy|lunch:zz day2:snacks:,,ab,",
+    "sunday1: breakfast: oats monday2: lunch: rice",
+    "day1: breakfast: idli,\n  sambar\tchutney | day2: lunch:\n\n rice",
+]
+
+
+def load_corpus(plans_csv: Path) -> List[str]:
+    """Daily and weekly texts formatted like the training targets"""
+    texts = []
+    with open(plans_csv, newline='') as f:
+        rows = list(csv.DictReader(f))
+    days_text = []
+    for row in rows:
+        day_text = " | ".join(
+            f"{meal}: {', '.join(i.strip() for i in row.get(meal, '').split(',')[:3])}"
+            for meal in MEAL_TYPES
+        )
+        texts.append(day_text)
+        days_text.append(day_text)
+    for start in range(0, len(days_text) - 6, 7):
+        texts.append(" | ".join(f"day{i + 1}: {t}" for i, t in enumerate(days_text[start:start + 7])))
+    return texts
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    """Shuffle, drop, repeat or decorate the marker-delimited pieces of a text"""
+    pieces = text.split(" | ")
+    op = rng.randrange(6)
+    if op == 0:
+        rng.shuffle(pieces)
+    elif op == 1 and len(pieces) > 1:
+        del pieces[rng.randrange(len(pieces))]
+    elif op == 2:
+        pieces.insert(rng.randrange(len(pieces) + 1), rng.choice(pieces))
+    elif op == 3:
+        pieces = [p.upper() if rng.random() < 0.3 else p for p in pieces]
+    elif op == 4:
+        pieces = [p.replace(",", rng.choice([" </s>,", ",<pad>", ",,", ", /"]), 1) for p in pieces]
+    else:
+        cut = rng.randrange(len(text) + 1)
+        return text[:cut]
+    return rng.choice([" | ", " ", "\n", ""]).join(pieces)
+
+
+def check(corpus: List[str]) -> int:
+    mismatches = 0
+    for text in corpus:
+        expected_daily = legacy_parse_plan(text)
+        expected_weekly = legacy_parse_weekly(text)
+        streaming = StreamingPlanParser()
+        for start in range(0, len(text), 7):
+            streaming.feed(text[start:start + 7])
+        results = {
+            'daily': parse_plan_text(text) == expected_daily,
+            'weekly': parse_weekly_text(text) == expected_weekly,
+            'streaming daily': streaming.daily() == expected_daily,
+            'streaming weekly': streaming.weekly() == expected_weekly,
+        }
+        failed = [name for name, ok in results.items() if not ok]
+        if failed:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"✗ {', '.join(failed)} mismatch for: {text[:120]!r}")
+    return mismatches
+
+
+def benchmark(name: str, parse, texts: List[str], batch_size: int, repeat: int) -> float:
+    batch = (texts * (batch_size // max(len(texts), 1) + 1))[:batch_size]
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in batch:
+            parse(text)
+        best = min(best, time.perf_counter() - start)
+    print(f"  {name:<10} {best * 1000:8.2f} ms / {batch_size} plans "
+          f"({best / batch_size * 1e6:7.1f} µs per plan)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the plan parser")
+    parser.add_argument(
+        '--plans',
+        type=str,
+        default=str(Path(__file__).parent.parent / "docs" / "datasets" / "doctor_plans.csv"),
+        help='Doctor plans CSV used to build the corpus'
+    )
+    parser.add_argument('--batch-size', type=int, default=256, help='Plans per timed batch')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed repetitions (best is reported)')
+    parser.add_argument('--mutations', type=int, default=2000, help='Random mutations added to the corpus')
+    parser.add_argument('--seed', type=int, default=42, help='Mutation seed')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    base = load_corpus(Path(args.plans)) if Path(args.plans).exists() else []
+    if not base:
+        print(f"⚠ {args.plans} not found, using the edge cases only")
+    seeds = base + EDGE_CASES
+    corpus = seeds + [mutate(rng.choice(seeds), rng) for _ in range(args.mutations)]
+
+    mismatches = check(corpus)
+    print(f"{'✓' if not mismatches else '✗'} Golden corpus: {len(corpus) - mismatches}/{len(corpus)} texts match")
+
+    weekly = [t for t in corpus if t.startswith("day1:")] or corpus
+    print(f"\nWeekly plans, batch of {args.batch_size}:")
+    old = benchmark("legacy", legacy_parse_weekly, weekly, args.batch_size, args.repeat)
+    new = benchmark("single-pass", parse_weekly_text, weekly, args.batch_size, args.repeat)
+    print(f"  speedup {old / new:.1f}x")
+    # Degenerate outputs that repeat sections until the generation length limit
+    # (512 tokens is roughly 2500 characters)
+    looping = [" ".join(weekly[i:i + 3])[:2500] for i in range(0, min(len(weekly), 300), 3)]
+    print(f"\nLooping outputs (cut at 2500 characters), batch of {args.batch_size}:")
+    old = benchmark("legacy", legacy_parse_weekly, looping, args.batch_size, args.repeat)
+    new = benchmark("single-pass", parse_weekly_text, looping, args.batch_size, args.repeat)
+    print(f"  speedup {old / new:.1f}x")
+    print(f"\nDaily plans, batch of {args.batch_size}:")
+    old = benchmark("legacy", legacy_parse_plan, base or corpus, args.batch_size, args.repeat)
+    new = benchmark("single-pass", parse_plan_text, base or corpus, args.batch_size, args.repeat)
+    print(f"  speedup {old / new:.1f}x")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Offline Plan Library Builder for Patient Archetypes
+
+Enumerates the archetype grid of `plan_library.py` (prakriti x lifestyle x
+major condition x BMI band), decodes a weekly plan for representative patients
+of every archetype in large padded batches, and keeps the best plan per
+archetype that parses into 7 complete days and survives the archetype's
+contraindication filter. Archetypes without a usable decoded plan get a plan
+from the catalog solver. The library is written to `models/plan_library.json`
+and served with `engine_mode="library"`.
+
+Usage:
+    python build_plan_library.py [options]
+
+Options:
+    --batch-size INT    Inputs decoded per batch (default: 32)
+    --num-beams INT     Beams per input (default: 1, greedy)
+    --max-new-tokens INT Token limit of a decoded week (default: 512)
+    --dataset-dir STR   Directory containing the training CSVs (default: ../docs/datasets)
+    --models-dir STR    Directory where trained models are stored (default: ./models next to this script)
+    --model-dir STR     T5 model to decode with (default: models/ayurveda_meal_planner)
+    --output STR        Library file (default: models/plan_library.json)
+"""
+
+import os
+import sys
+import argparse
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+# Add the current directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from generation_eval import generate_texts, plan_parse_success
+from model import HybridNeuralEngine
+from plan_library import PlanLibrary, archetype_grid, archetype_patients
+from train_model import load_datasets, setup_directories
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def build_plan_library(engine: HybridNeuralEngine, output_path: str, batch_size: int = 32,
+                       num_beams: int = 1, max_new_tokens: int = 512) -> Dict:
+    """Generate, validate and store one weekly plan per archetype; returns a report.
+
+    `engine` must have its knowledge graph built (scoring, safety filter, solver).
+    """
+    start = time.perf_counter()
+    keys = archetype_grid()
+    representatives = [(key, patient) for key in keys for patient in archetype_patients(key)]
+    inputs = [engine.planner.format_patient_input_weekly(patient) for _, patient in representatives]
+    logger.info(f"Decoding {len(inputs)} inputs for {len(keys)} archetypes...")
+    texts = generate_texts(engine, inputs, batch_size=batch_size,
+                           max_new_tokens=max_new_tokens, num_beams=num_beams)
+    decode_seconds = time.perf_counter() - start
+
+    library = PlanLibrary()
+    scorer = engine.get_plan_scorer()
+    by_key = {}
+    for (key, patient), text in zip(representatives, texts):
+        by_key.setdefault(key, []).append((patient, text))
+    for key in keys:
+        best, best_score = None, -np.inf
+        for patient, text in by_key[key]:
+            if not plan_parse_success(engine, text, weekly_mode=True):
+                continue
+            plan = engine.parse_generated_weekly_plan(text, patient_id=patient.id, patient=patient)
+            # Contraindications of the archetype's condition; allergies are filtered when serving
+            engine.apply_safety_filter(patient, plan.days, "remove")
+            if not engine._has_valid_weekly_content(plan):
+                continue
+            scores, _ = scorer.score(
+                patient, [[meal for day in plan.days for meal in (day.breakfast, day.lunch, day.dinner, day.snacks)]]
+            )
+            if scores[0] > best_score:
+                best, best_score = plan, float(scores[0])
+        if best is not None:
+            library.add(key, best, source="t5", score=round(best_score, 4))
+        else:
+            patient = by_key[key][0][0]
+            library.add(key, engine.get_plan_solver().solve_weekly_plan(patient), source="solver")
+
+    sources = Counter(entry['source'] for entry in library.plans.values())
+    library.metadata = {
+        'model_dir': str(engine.model_dir) if engine.model_dir else None,
+        'archetypes': len(library),
+        'sources': dict(sources),
+    }
+    library.save(output_path)
+    return {
+        'archetypes': len(library),
+        'decoded': len(inputs),
+        'sources': dict(sources),
+        'decode_seconds': round(decode_seconds, 1),
+        'total_seconds': round(time.perf_counter() - start, 1),
+    }
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Build the archetype plan library served with engine_mode=library",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+    # Build the library with the default trained model
+    python build_plan_library.py
+
+    # Larger batches with beam search
+    python build_plan_library.py --batch-size 64 --num-beams 3
+        """
+    )
+    parser.add_argument('--batch-size', type=int, default=32, help='Inputs decoded per batch (default: 32)')
+    parser.add_argument('--num-beams', type=int, default=1, help='Beams per input (default: 1, greedy)')
+    parser.add_argument('--max-new-tokens', type=int, default=512, help='Token limit of a decoded week (default: 512)')
+    parser.add_argument('--dataset-dir', type=str, default=None, help='Directory containing the training CSVs')
+    parser.add_argument('--models-dir', type=str, default=None, help='Directory where trained models are stored')
+    parser.add_argument('--model-dir', type=str, default=None,
+                        help='T5 model to decode with (default: models/ayurveda_meal_planner)')
+    parser.add_argument('--output', type=str, default=None, help='Library file (default: models/plan_library.json)')
+    return parser.parse_args()
+
+
+def main():
+    """Main library build function"""
+    logger.info("=" * 60)
+    logger.info("📚 Ayurveda Archetype Plan Library")
+    logger.info("=" * 60)
+
+    args = parse_arguments()
+    dataset_dir, models_dir = setup_directories(args.dataset_dir, args.models_dir)
+    model_dir: Optional[Path] = Path(args.model_dir) if args.model_dir else models_dir / "ayurveda_meal_planner"
+    output_path = Path(args.output) if args.output else models_dir / "plan_library.json"
+
+    try:
+        foods, patients, _ = load_datasets(dataset_dir, load_plans=False)
+    except Exception as e:
+        logger.error(f"Failed to load datasets: {e}")
+        return 1
+
+    engine = HybridNeuralEngine(models_dir=str(models_dir))
+    if model_dir.exists():
+        engine.load_model(str(model_dir))
+    else:
+        logger.warning(f"Model directory not found: {model_dir}, decoding with the base model")
+    engine.build_knowledge_graph(foods, patients)
+
+    try:
+        report = build_plan_library(
+            engine, str(output_path),
+            batch_size=args.batch_size,
+            num_beams=args.num_beams,
+            max_new_tokens=args.max_new_tokens
+        )
+    except Exception as e:
+        logger.error(f"❌ Library build failed: {e}")
+        return 1
+
+    logger.info("=" * 60)
+    logger.info("✅ Plan library built!")
+    logger.info(f"📁 Library saved to: {output_path}")
+    logger.info(f"📈 {report['archetypes']} archetypes ({report['sources']}), "
+                f"decoding took {report['decode_seconds']} s")
+    logger.info("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
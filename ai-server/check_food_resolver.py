@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Golden-example check for the food resolver.
+
+Resolves hand-picked generated items (the examples of the `food_resolver`
+docstring, dishes built around one catalog food, spelling variants) against
+the food catalog and compares the catalog name and match method with the
+expected ones. Any difference is reported and makes the script exit non-zero.
+
+Usage:
+    python check_food_resolver.py [--foods ../docs/datasets/foods.csv]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from food_resolver import FoodResolver
+from train import load_foods_csv
+
+# item -> (catalog name, method); (None, 'none') when it must stay unresolved
+EXAMPLES = {
+    'moong dal': ('Moong Dal', 'exact'),
+    'Moong Dal (145)': ('Moong Dal', 'exact'),
+    'मूंग': ('Moong Dal', 'exact'),
+    'moong dal with ghee': ('Moong Dal', 'trie'),
+    'soaked almonds': ('Almonds', 'trie'),
+    'masoor dal soup': ('Masoor Dal', 'trie'),
+    'steamed idli with sambar': ('Idli', 'trie'),
+    'moong daal': ('Moong Dal', 'ngram'),
+    'basmathi rice': ('Basmati Rice', 'ngram'),
+    'fresh fruit salad': (None, 'none'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the food resolver on golden examples")
+    parser.add_argument('--foods', type=str,
+                        default=str(Path(__file__).parent.parent / "docs" / "datasets" / "foods.csv"),
+                        help='Food catalog CSV (default: ../docs/datasets/foods.csv)')
+    args = parser.parse_args()
+
+    foods = load_foods_csv(args.foods)
+    names = {food.id: food.name for food in foods}
+    resolver = FoodResolver(foods)
+
+    failures = 0
+    for item, (expected_name, expected_method) in EXAMPLES.items():
+        resolution = resolver.resolve(item)
+        name = names.get(resolution.food_id)
+        ok = name == expected_name and resolution.method == expected_method
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {item!r}: {name} ({resolution.method}, {resolution.confidence})"
+              + ('' if ok else f", expected {expected_name} ({expected_method})"))
+
+    print(f"{len(EXAMPLES) - failures}/{len(EXAMPLES)} examples resolved as expected")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Near-duplicate removal for meal plan training corpora.
+
+Doctor plans repeat the same meal lists across days and patients, so many
+training pairs are identical or nearly identical once normalized. Compaction
+keeps one representative per duplicate cluster and gives it a weight equal to
+the cluster size; training with a weighted loss then sees the same
+distribution in fewer samples.
+
+Duplicates are found in two passes over normalized (input, target) pairs:
+    1. exact: hash of the normalized pair
+    2. near: MinHash signatures over word shingles, banded LSH for candidate
+       pairs, kept when both the input and the target estimated Jaccard
+       similarity reach the threshold
+"""
+
+import hashlib
+import re
+import zlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from torch.utils.data import Dataset
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return ' '.join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def _shingles(text: str, size: int = 3) -> np.ndarray:
+    words = text.split()
+    if len(words) < size:
+        grams = [' '.join(words)]
+    else:
+        grams = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.array(sorted({zlib.crc32(g.encode()) for g in grams}), dtype=np.uint64)
+
+
+class MinHasher:
+    """MinHash signatures with `num_perm` universal hash functions"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 42):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = _shingles(text)
+        with np.errstate(over='ignore'):
+            permuted = (hashes[:, None] * self.a + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            # Keep the lowest index as representative
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+def find_duplicate_clusters(pairs: List[Tuple[str, str]], threshold: float = 0.9,
+                            num_perm: int = 128, bands: int = 16,
+                            seed: int = 42) -> Tuple[List[int], Dict[str, int]]:
+    """Cluster id (index of its representative) for every pair, plus counts"""
+    n = len(pairs)
+    uf = _UnionFind(n)
+    normalized = [(normalize_text(inp), normalize_text(tgt)) for inp, tgt in pairs]
+
+    # 1. Exact duplicates
+    first_seen: Dict[str, int] = {}
+    for idx, (inp, tgt) in enumerate(normalized):
+        digest = hashlib.sha1(f"{inp}\0{tgt}".encode()).hexdigest()
+        if digest in first_seen:
+            uf.union(first_seen[digest], idx)
+        else:
+            first_seen[digest] = idx
+    num_exact = n - len(first_seen)
+
+    # 2. Near duplicates among the remaining unique pairs
+    unique = sorted(first_seen.values())
+    num_near = 0
+    if threshold < 1.0 and len(unique) > 1:
+        hasher = MinHasher(num_perm=num_perm, seed=seed)
+        input_sigs = np.stack([hasher.signature(normalized[i][0]) for i in unique])
+        target_sigs = np.stack([hasher.signature(normalized[i][1]) for i in unique])
+        rows = num_perm // bands
+        candidates = set()
+        for band in range(bands):
+            buckets: Dict[bytes, List[int]] = {}
+            band_slice = slice(band * rows, (band + 1) * rows)
+            for pos in range(len(unique)):
+                key = target_sigs[pos, band_slice].tobytes() + input_sigs[pos, band_slice].tobytes()
+                buckets.setdefault(key, []).append(pos)
+            for members in buckets.values():
+                if len(members) > 1:
+                    head = members[0]
+                    candidates.update((head, other) for other in members[1:])
+        for i, j in sorted(candidates):
+            input_sim = float(np.mean(input_sigs[i] == input_sigs[j]))
+            target_sim = float(np.mean(target_sigs[i] == target_sigs[j]))
+            if input_sim >= threshold and target_sim >= threshold:
+                ui, uj = unique[i], unique[j]
+                if uf.find(ui) != uf.find(uj):
+                    uf.union(ui, uj)
+                    num_near += 1
+
+    clusters = [uf.find(i) for i in range(n)]
+    return clusters, {'num_exact_duplicates': num_exact, 'num_near_duplicates': num_near}
+
+
+class WeightedDataset(Dataset):
+    """Adds a `sample_weight` to every item of a dataset"""
+
+    def __init__(self, dataset, weights: np.ndarray):
+        self.dataset = dataset
+        self.weights = np.asarray(weights, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx) -> Dict[str, Any]:
+        item = dict(self.dataset[idx])
+        item['sample_weight'] = float(self.weights[idx])
+        return item
+
+    def get_text_pair(self, idx):
+        return self.dataset.get_text_pair(idx)
+
+
+def compact_dataset(dataset, threshold: float = 0.9, num_perm: int = 128, bands: int = 16,
+                    seed: int = 42) -> Tuple[List[int], np.ndarray, Dict[str, Any]]:
+    """Pick one representative per duplicate cluster of `dataset`.
+
+    Returns the kept indices, their weights (cluster sizes, normalized to
+    mean 1 so the loss scale is unchanged) and a report of what was removed.
+    """
+    pairs = [dataset.get_text_pair(i) for i in range(len(dataset))]
+    clusters, counts = find_duplicate_clusters(pairs, threshold, num_perm, bands, seed)
+    sizes: Dict[int, int] = {}
+    for rep in clusters:
+        sizes[rep] = sizes.get(rep, 0) + 1
+    keep = sorted(sizes)
+    weights = np.array([sizes[rep] for rep in keep], dtype=np.float32)
+    weights /= weights.mean()
+    removed = len(pairs) - len(keep)
+    report = {
+        'num_samples': len(pairs),
+        'num_kept': len(keep),
+        'num_removed': removed,
+        'removed_fraction': round(removed / len(pairs), 4) if pairs else 0.0,
+        'threshold': threshold,
+        **counts,
+        'largest_clusters': sorted(
+            ({'representative': rep, 'size': size} for rep, size in sizes.items() if size > 1),
+            key=lambda c: -c['size']
+        )[:20],
+    }
+    return keep, weights, report
@@ -0,0 +1,74 @@
+"""
+Default meal plans used when generation is unavailable or fails.
+
+The defaults are read from a JSON file (`default_plans.json` next to this
+module unless another path is given) and expanded once into a table of
+structured days per prakriti, so a fallback is a dictionary lookup plus a
+copy of the day's lists. A prakriti entry is either
+
+    {"breakfast": [...], "lunch": [...], ...}   food pools; day variation v
+                                                takes `portions[meal]` items
+                                                starting at v
+    [{"breakfast": [...], ...}, ...]            explicit days, used in turn
+
+`generic` has the same shape and is used when no patient is known.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from plan_parser import MEAL_TYPES
+
+DEFAULT_PLANS_FILE = Path(__file__).with_name("default_plans.json")
+
+Day = Dict[str, Tuple[str, ...]]
+
+
+def _clean(items: List[str]) -> Tuple[str, ...]:
+    """Lowercased, whitespace-collapsed items, as the plan parser would return them"""
+    return tuple(item for item in (' '.join(str(i).split()).lower() for i in items) if item)
+
+
+def expand_days(entry: Union[Dict, List], portions: Dict[str, int], variations: int) -> List[Day]:
+    """Structured days of one prakriti entry"""
+    if isinstance(entry, list):
+        days = [{meal: _clean(day.get(meal, [])) for meal in MEAL_TYPES} for day in entry]
+    else:
+        days = [
+            {meal: _clean(entry.get(meal, [])[v:v + portions.get(meal, 3)]) for meal in MEAL_TYPES}
+            for v in range(variations)
+        ]
+    if not days:
+        raise ValueError("Default plan entry has no days")
+    return days
+
+
+class DefaultPlans:
+    """Precomputed default days per prakriti"""
+
+    def __init__(self, config: Dict):
+        variations = int(config.get('variations', 3))
+        portions = config.get('portions', {})
+        self.table: Dict[str, List[Day]] = {
+            prakriti.lower(): expand_days(entry, portions, variations)
+            for prakriti, entry in config['prakriti'].items()
+        }
+        fallback = str(config.get('fallback_prakriti', next(iter(self.table)))).lower()
+        if fallback not in self.table:
+            raise ValueError(f"Fallback prakriti '{fallback}' has no default plan")
+        self.fallback = self.table[fallback]
+        generic = config.get('generic')
+        self.generic = (expand_days(generic['foods'], generic.get('portions', portions), variations)
+                        if generic else self.fallback)
+
+    @classmethod
+    def load(cls, path: Optional[Union[str, Path]] = None) -> "DefaultPlans":
+        path = Path(path) if path else DEFAULT_PLANS_FILE
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def day(self, prakriti: Optional[str], day: int) -> Day:
+        """Default day `day` (1-based) for a prakriti; generic defaults when prakriti is None"""
+        days = self.generic if prakriti is None else self.table.get(prakriti.lower(), self.fallback)
+        return days[(day - 1) % len(days)]
@@ -0,0 +1,144 @@
+"""
+Knowledge distillation from a large T5 teacher into a small student.
+
+The teacher (e.g. t5-base / t5-large) is trained on doctor plans as usual,
+then decodes the whole patient cohort in batched offline passes. Its outputs
+become sequence-level pseudo-labels for a small student (t5-small), which is
+served in production. A report compares latency and plan-parse success of
+teacher and student on held-out patients.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from generation_eval import generate_texts, plan_parse_success
+from model import Food, HybridNeuralEngine, MealPlan, Patient
+from train import (
+    MealPlanTrainer, TextPairDataset,
+    format_daily_training_input, format_weekly_training_input
+)
+
+
+def build_cohort_inputs(patients: List[Patient], weekly_mode: bool = True) -> List[str]:
+    """Model inputs for every patient (and every day in daily mode)"""
+    if weekly_mode:
+        return [format_weekly_training_input(p) for p in patients]
+    return [format_daily_training_input(p, day) for p in patients for day in range(1, 8)]
+
+
+def benchmark_generation(engine: HybridNeuralEngine, input_texts: List[str],
+                         weekly_mode: bool = True, num_beams: int = 3,
+                         max_new_tokens: int = 512) -> Dict[str, float]:
+    """Per-request latency (batch size 1, as in serving) and parse success rate"""
+    latencies, successes = [], 0
+    for text in input_texts:
+        start = time.perf_counter()
+        generated = generate_texts(engine, [text], batch_size=1,
+                                   max_new_tokens=max_new_tokens, num_beams=num_beams)[0]
+        latencies.append(time.perf_counter() - start)
+        successes += plan_parse_success(engine, generated, weekly_mode)
+    latencies = np.array(latencies) * 1000.0
+    return {
+        'samples': len(input_texts),
+        'latency_ms_mean': round(float(latencies.mean()), 1) if len(latencies) else None,
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None,
+        'parse_success_rate': round(successes / len(input_texts), 4) if input_texts else None,
+    }
+
+
+def run_distillation(foods: List[Food], patients: List[Patient], plans: List[MealPlan],
+                     models_dir: str, output_dir: str,
+                     teacher_name: str = "t5-base", student_name: str = "t5-small",
+                     teacher_dir: Optional[str] = None, num_epochs: int = 3,
+                     batch_size: int = 2, learning_rate: float = 3e-4,
+                     weekly_mode: bool = True, label_batch_size: int = 32,
+                     eval_size: int = 20, include_doctor_plans: bool = True,
+                     max_input_length: int = 128, max_target_length: int = 512,
+                     seed: int = 42) -> Dict[str, Any]:
+    """Train (or load) a teacher, pseudo-label the cohort and train a small student"""
+    models_dir = Path(models_dir)
+    output_dir = Path(output_dir)
+
+    # Hold out patients for the teacher/student comparison
+    order = np.random.default_rng(seed).permutation(len(patients))
+    eval_patients = [patients[i] for i in order[:eval_size]]
+    label_patients = [patients[i] for i in order[eval_size:]]
+    eval_ids = {p.id for p in eval_patients}
+    train_plans = [plan for plan in plans if plan.patient_id not in eval_ids]
+
+    # 1. Teacher
+    teacher_trainer = MealPlanTrainer(model_name=teacher_name, models_dir=str(models_dir))
+    if teacher_dir and (Path(teacher_dir) / "config.json").exists():
+        print(f"🎓 Loading teacher from {teacher_dir}")
+        teacher_trainer.load_checkpoint(teacher_dir)
+    else:
+        teacher_dir = teacher_dir or str(models_dir / f"teacher_{teacher_name}")
+        print(f"🎓 Training teacher {teacher_name}...")
+        teacher_trainer.train(
+            foods=foods, patients=patients, plans=train_plans, output_dir=teacher_dir,
+            num_epochs=num_epochs, batch_size=batch_size, learning_rate=learning_rate,
+            weekly_mode=weekly_mode, max_input_length=max_input_length,
+            max_target_length=max_target_length, seed=seed
+        )
+    teacher = teacher_trainer.engine
+
+    # 2. Sequence-level pseudo-labels over the cohort, in batched offline passes
+    label_inputs = build_cohort_inputs(label_patients, weekly_mode)
+    print(f"🏷️  Generating {len(label_inputs)} pseudo-labels with the teacher...")
+    start = time.perf_counter()
+    pseudo_targets = generate_texts(teacher, label_inputs, batch_size=label_batch_size,
+                                    max_new_tokens=max_target_length)
+    labeling_seconds = time.perf_counter() - start
+    pairs: List[Tuple[str, str]] = [
+        (inp, tgt) for inp, tgt in zip(label_inputs, pseudo_targets)
+        if plan_parse_success(teacher, tgt, weekly_mode)
+    ]
+    num_kept = len(pairs)
+    print(f"✓ Kept {num_kept}/{len(label_inputs)} parseable pseudo-labels")
+
+    # 3. Student on pseudo-labels (plus the original doctor targets)
+    student_trainer = MealPlanTrainer(model_name=student_name, models_dir=str(models_dir))
+    student_trainer.initialize_engine()
+    if include_doctor_plans:
+        doctor_dataset = student_trainer.build_dataset(
+            patients, train_plans, weekly_mode, max_input_length, max_target_length
+        )
+        pairs += [doctor_dataset.get_text_pair(i) for i in range(len(doctor_dataset))]
+    student_dataset = TextPairDataset(
+        pairs, student_trainer.engine.tokenizer,
+        max_input_length=max_input_length, max_target_length=max_target_length,
+        weekly_mode=weekly_mode
+    )
+    print(f"🧑‍🎓 Training student {student_name} on {len(student_dataset)} samples...")
+    model_path = student_trainer.train(
+        foods=foods, patients=patients, plans=train_plans, output_dir=str(output_dir),
+        num_epochs=num_epochs, batch_size=batch_size, learning_rate=learning_rate,
+        weekly_mode=weekly_mode, max_input_length=max_input_length,
+        max_target_length=max_target_length, seed=seed, dataset=student_dataset
+    )
+
+    # 4. Compare teacher and student on held-out patients
+    eval_inputs = build_cohort_inputs(eval_patients, weekly_mode)
+    print(f"📏 Benchmarking teacher and student on {len(eval_inputs)} held-out inputs...")
+    report = {
+        'teacher': {'model_name': teacher_name, 'model_dir': str(teacher_dir),
+                    **benchmark_generation(teacher, eval_inputs, weekly_mode)},
+        'student': {'model_name': student_name, 'model_dir': str(model_path),
+                    **benchmark_generation(student_trainer.engine, eval_inputs, weekly_mode)},
+        'pseudo_labels': {'generated': len(label_inputs), 'kept': num_kept,
+                          'labeling_seconds': round(labeling_seconds, 1)},
+        'weekly_mode': weekly_mode,
+    }
+    t_lat, s_lat = report['teacher']['latency_ms_mean'], report['student']['latency_ms_mean']
+    if t_lat and s_lat:
+        report['speedup'] = round(t_lat / s_lat, 2)
+
+    with open(output_dir / "distillation_report.json", "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Distillation report saved to {output_dir / 'distillation_report.json'}")
+    return report
@@ -0,0 +1,138 @@
+"""
+"Pairs well with" suggestions from food co-occurrence in doctor plans.
+
+Doctor plan items are resolved to catalog foods, and every pair of foods
+served in the same meal is counted, per meal slot and over all slots. The
+counts become positive pointwise mutual information,
+
+    PPMI(a, b) = max(0, log(count(a, b) * meals / (count(a) * count(b))))
+
+kept for pairs seen at least `min_count` times, and are stored per slot as a
+CSR matrix (indptr / indices / data arrays, each row sorted by PPMI). The
+matrices are saved with the model (`food_pairs.npz`). Suggestions for one food
+are a row slice; for a partial meal the rows of its foods are summed.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from food_resolver import FoodResolver, MEAL_TYPES
+from model import Food, MealPlan
+
+SLOTS = (*MEAL_TYPES, 'any')
+MIN_COUNT = 2
+
+# (indptr, indices, data) of a CSR matrix
+CSR = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _ppmi_csr(pair_keys: np.ndarray, occurrences: np.ndarray, meals: int,
+              n: int, min_count: int) -> CSR:
+    """CSR PPMI matrix from flattened (row * n + col) pair keys, rows sorted by PPMI"""
+    keys, counts = np.unique(pair_keys, return_counts=True)
+    keep = counts >= min_count
+    keys, counts = keys[keep], counts[keep]
+    rows, cols = keys // n, keys % n
+    pmi = np.log(counts * float(max(meals, 1)) / (occurrences[rows] * occurrences[cols]))
+    positive = pmi > 0
+    rows, cols, pmi = rows[positive], cols[positive], pmi[positive]
+    order = np.lexsort((-pmi, rows))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n))]).astype(np.int64)
+    return indptr, cols[order].astype(np.int32), pmi[order].astype(np.float32)
+
+
+class FoodPairing:
+    """Per-slot PPMI matrices over catalog food IDs"""
+
+    def __init__(self, food_ids: Sequence[str], matrices: Dict[str, CSR]):
+        self.food_ids = list(food_ids)
+        self.index = {food_id: i for i, food_id in enumerate(self.food_ids)}
+        self.matrices = matrices
+
+    @classmethod
+    def build(cls, plans: Sequence[MealPlan], foods: Sequence[Food], resolver: FoodResolver,
+              min_count: int = MIN_COUNT) -> "FoodPairing":
+        food_ids = [food.id for food in foods]
+        index = {food_id: i for i, food_id in enumerate(food_ids)}
+        n = len(food_ids)
+        pair_keys: Dict[str, List[int]] = {slot: [] for slot in MEAL_TYPES}
+        occurrences = {slot: np.zeros(n, dtype=np.float64) for slot in MEAL_TYPES}
+        meals = dict.fromkeys(MEAL_TYPES, 0)
+        for plan in plans:
+            for meal in MEAL_TYPES:
+                ids = sorted({index[r.food_id] for r in resolver.resolve_many(getattr(plan, meal))
+                              if r.food_id in index})
+                if not ids:
+                    continue
+                meals[meal] += 1
+                occurrences[meal][ids] += 1
+                for a in ids:
+                    pair_keys[meal].extend(a * n + b for b in ids if b != a)
+
+        matrices = {
+            meal: _ppmi_csr(np.array(pair_keys[meal], dtype=np.int64), occurrences[meal], meals[meal], n, min_count)
+            for meal in MEAL_TYPES
+        }
+        matrices['any'] = _ppmi_csr(
+            np.array([key for meal in MEAL_TYPES for key in pair_keys[meal]], dtype=np.int64),
+            sum(occurrences.values()), sum(meals.values()), n, min_count
+        )
+        return cls(food_ids, matrices)
+
+    def save(self, path: Union[str, Path]):
+        arrays = {'food_ids': np.array(self.food_ids)}
+        for slot, (indptr, indices, data) in self.matrices.items():
+            arrays.update({f'{slot}_indptr': indptr, f'{slot}_indices': indices, f'{slot}_data': data})
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "FoodPairing":
+        with np.load(path, allow_pickle=False) as arrays:
+            matrices = {
+                slot: (arrays[f'{slot}_indptr'], arrays[f'{slot}_indices'], arrays[f'{slot}_data'])
+                for slot in SLOTS
+            }
+            return cls([str(food_id) for food_id in arrays['food_ids']], matrices)
+
+    def pairs(self) -> int:
+        return int(len(self.matrices['any'][1]))
+
+    def complements(self, food_ids: Sequence[str], slot: str = 'any', k: int = 10,
+                    exclude: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Top-k (food ID, score) complementing the foods of a partial meal, best first.
+
+        The score is the summed PPMI with the meal's foods; foods already in
+        the meal and those in `exclude` are skipped.
+        """
+        if slot not in self.matrices:
+            raise ValueError(f"Unknown meal slot: {slot} (expected one of {SLOTS})")
+        indptr, indices, data = self.matrices[slot]
+        rows = sorted({self.index[food_id] for food_id in food_ids if food_id in self.index})
+        if not rows:
+            return []
+        skip = set(rows)
+        if exclude:
+            skip.update(self.index[food_id] for food_id in exclude if food_id in self.index)
+        if len(rows) == 1:
+            # Rows are stored best first: walk the slice
+            start, end = indptr[rows[0]], indptr[rows[0] + 1]
+            out = []
+            for col, score in zip(indices[start:end], data[start:end]):
+                if col not in skip:
+                    out.append((self.food_ids[col], float(score)))
+                    if len(out) == k:
+                        break
+            return out
+        scores = np.zeros(len(self.food_ids), dtype=np.float32)
+        for row in rows:
+            start, end = indptr[row], indptr[row + 1]
+            scores[indices[start:end]] += data[start:end]
+        scores[list(skip)] = 0.0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(self.food_ids[i], float(scores[i])) for i in candidates]
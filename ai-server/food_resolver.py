@@ -0,0 +1,203 @@
+"""
+Resolution of generated food items to food catalog IDs.
+
+Generated plans name foods as free text ("moong dal", "Moong Dal (145)",
+"moong dal with ghee"). `FoodResolver` links them to `Food.id` using three indexes built
+once from the catalog's English and vernacular names:
+
+    exact    hash of the normalized name                       confidence 1.0
+    trie     longest catalog name found as a token sequence    scaled by the
+             inside the item ("moong dal with ghee")           share of tokens,
+                                                               at least 0.6
+    n-gram   character trigram overlap (Dice) for spelling     scaled by the
+             variants and transliterations of similar length   similarity
+
+The n-gram search only scores catalog names that share one of the item's
+rarest trigrams and could still reach the similarity floor (prefix
+filtering), so an unseen item costs a few set intersections. Results are
+memoized per normalized item, so resolving a whole weekly plan is mostly
+dictionary lookups.
+"""
+
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from model import Food, MealPlan
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snacks')
+
+TRIE_CONFIDENCE = 0.9
+# A whole catalog name inside a dish ("soaked almonds") is a match however
+# many other tokens surround it
+TRIE_MIN_CONFIDENCE = 0.6
+# Words after which a dish names its sides ("idli with sambar")
+CONNECTORS = ('with', 'and')
+NGRAM_CONFIDENCE = 0.8
+NGRAM_MIN_SIMILARITY = 0.65
+# Spelling variants have about the same length; longer items ("jeera rice")
+# are dishes containing a catalog name and are left to the trie
+NGRAM_MAX_LENGTH_RATIO = 1.35
+MIN_CONFIDENCE = 0.5
+CACHE_SIZE = 50000
+
+_END = ''  # trie key marking the end of a catalog name
+_PARENTHESES = re.compile(r'\(([^)]*)\)')
+# ASCII punctuation only; Indic vowel signs are not \w and must be kept
+_PUNCTUATION = re.compile(r'[!-/:-@\[-`{-~]')
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase, drop punctuation and numeric suffixes like '(119)', collapse whitespace"""
+    text = _PARENTHESES.sub(lambda m: '' if m.group(1).strip().isdigit() else f' {m.group(1)} ', text.lower())
+    return ' '.join(_PUNCTUATION.sub(' ', text).split())
+
+
+def name_aliases(name: str) -> Tuple[List[str], List[str]]:
+    """Normalized aliases of a catalog name: the full name and the name without
+    its parenthetical, plus the parenthetical itself ('Kabuli Chana (Chickpeas)').
+    Parentheticals are often qualifiers ('Grapes (Green)'), so they are returned
+    separately and only used for exact matches."""
+    names = [normalize_name(name), normalize_name(_PARENTHESES.sub(' ', name))]
+    names = [a for i, a in enumerate(names) if a and a not in names[:i]]
+    inner = [normalize_name(part) for part in _PARENTHESES.findall(name)]
+    return names, [a for a in inner if a and not a.isdigit() and a not in names]
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class Resolution:
+    """A generated item linked to a catalog food"""
+    food_id: Optional[str]
+    confidence: float
+    method: str  # 'exact', 'trie', 'ngram' or 'none'
+
+
+UNRESOLVED = Resolution(food_id=None, confidence=0.0, method='none')
+
+
+class FoodResolver:
+    """Exact, token-trie and character n-gram indexes over catalog food names"""
+
+    def __init__(self, foods: Sequence[Food], min_confidence: float = MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        self.exact: Dict[str, str] = {}
+        self.trie: Dict[str, dict] = {}
+        self.ngrams: Dict[str, List[int]] = defaultdict(list)
+        self.aliases: List[Tuple[str, str, frozenset]] = []  # (alias, food id, trigrams)
+        self._cache: Dict[str, Resolution] = {}
+
+        for food in foods:
+            names = [food.name, *getattr(food, 'vernacular_names', [])]  # older pickles lack vernacular names
+            for name in names:
+                aliases, exact_only = name_aliases(name)
+                # First food wins for names shared by duplicate catalog rows
+                for alias in exact_only:
+                    self.exact.setdefault(alias, food.id)
+                for alias in aliases:
+                    if alias in self.exact:
+                        continue
+                    self.exact[alias] = food.id
+                    self._add_to_trie(alias, food.id)
+                    grams = frozenset(_trigrams(alias))
+                    for gram in grams:
+                        self.ngrams[gram].append(len(self.aliases))
+                    self.aliases.append((alias, food.id, grams))
+
+    def _add_to_trie(self, alias: str, food_id: str):
+        node = self.trie
+        for token in alias.split():
+            node = node.setdefault(token, {})
+        node.setdefault(_END, food_id)
+
+    def _trie_match(self, tokens: List[str]) -> Tuple[Optional[str], int]:
+        """Longest catalog name occurring as a token sequence in `tokens`, searched
+        before the first connector word first. Ties go to the later name, the head
+        of compounds like "jeera rice"."""
+        head = next((i for i, token in enumerate(tokens) if token in CONNECTORS), len(tokens))
+        if head < len(tokens):
+            best_id, best_len = self._trie_match(tokens[:head])
+            if best_id is not None:
+                return best_id, best_len
+        best_id, best_len = None, 0
+        for start in range(len(tokens)):
+            node = self.trie
+            for pos in range(start, len(tokens)):
+                node = node.get(tokens[pos])
+                if node is None:
+                    break
+                length = pos - start + 1
+                if _END in node and length >= best_len:
+                    best_id, best_len = node[_END], length
+        return best_id, best_len
+
+    def _ngram_match(self, text: str, floor: float) -> Tuple[Optional[str], float]:
+        """Catalog name of similar length with the highest trigram Dice similarity
+        to `text`, if at least `floor`"""
+        grams = _trigrams(text)
+        # Dice >= floor needs an overlap of at least len(grams) * floor / (2 - floor),
+        # so a match shares one of the len(grams) - min_overlap + 1 rarest trigrams
+        min_overlap = max(math.ceil(len(grams) * floor / (2.0 - floor) - 1e-9), 1)
+        rarest = sorted(grams, key=lambda gram: len(self.ngrams.get(gram, ())))
+        candidates = set()
+        for gram in rarest[:len(grams) - min_overlap + 1]:
+            candidates.update(self.ngrams.get(gram, ()))
+        best_id, best_score = None, 0.0
+        for alias_idx in candidates:
+            alias, food_id, alias_grams = self.aliases[alias_idx]
+            ratio = len(text) / len(alias)
+            if not 1.0 / NGRAM_MAX_LENGTH_RATIO <= ratio <= NGRAM_MAX_LENGTH_RATIO:
+                continue
+            score = 2.0 * len(grams & alias_grams) / (len(grams) + len(alias_grams))
+            if score >= floor and score > best_score:
+                best_id, best_score = food_id, score
+        return best_id, best_score
+
+    def resolve(self, item: str) -> Resolution:
+        """Catalog food for one generated item (food_id None below min_confidence)"""
+        key = normalize_name(item)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        resolution = UNRESOLVED
+        if key in self.exact:
+            resolution = Resolution(self.exact[key], 1.0, 'exact')
+        elif key:
+            tokens = key.split()
+            food_id, length = self._trie_match(tokens)
+            if food_id is not None:
+                confidence = max(TRIE_MIN_CONFIDENCE, TRIE_CONFIDENCE * length / len(tokens))
+                resolution = Resolution(food_id, round(confidence, 3), 'trie')
+            # The n-gram index can only do better than a partial trie match
+            if resolution.confidence < NGRAM_CONFIDENCE:
+                floor = max(NGRAM_MIN_SIMILARITY, self.min_confidence / NGRAM_CONFIDENCE,
+                            resolution.confidence / NGRAM_CONFIDENCE)
+                ngram_id, similarity = self._ngram_match(key, floor)
+                if ngram_id is not None and NGRAM_CONFIDENCE * similarity > resolution.confidence:
+                    resolution = Resolution(ngram_id, round(NGRAM_CONFIDENCE * similarity, 3), 'ngram')
+            if resolution.confidence < self.min_confidence:
+                resolution = UNRESOLVED
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = resolution
+        return resolution
+
+    def resolve_many(self, items: Sequence[str]) -> List[Resolution]:
+        return [self.resolve(item) for item in items]
+
+    def resolve_meal_plan(self, meal_plan: MealPlan) -> MealPlan:
+        """Fill `meal_plan.resolved` with a Resolution per item of every meal"""
+        meal_plan.resolved = {meal: self.resolve_many(getattr(meal_plan, meal)) for meal in MEAL_TYPES}
+        return meal_plan
+
+    def resolve_weekly_plan(self, weekly_plan) -> None:
+        for meal_plan in weekly_plan.days:
+            self.resolve_meal_plan(meal_plan)
+        for alternative in getattr(weekly_plan, 'alternatives', []):
+            self.resolve_weekly_plan(alternative)
@@ -0,0 +1,192 @@
+"""
+Generation-based evaluation for meal plan models.
+
+Loss alone says little about whether generated plans are usable. This module
+decodes inputs in large padded batches with a cheap decoding profile (greedy,
+bounded length), parses the outputs with the serving parsers and scores them
+slot by slot (day x meal) against the doctor plans. `GenerationEvalCallback`
+runs this at every evaluation during training, caches results per checkpoint
+(global step and a fingerprint of the weights) and adds the scores to the
+evaluation metrics before they are logged, so they appear in the log history
+and can drive best-model selection and early stopping.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import torch
+from transformers import TrainerCallback
+
+from model import HybridNeuralEngine
+
+MEAL_TYPES = ['breakfast', 'lunch', 'dinner', 'snacks']
+
+
+def generate_texts(engine: HybridNeuralEngine, input_texts: List[str], batch_size: int = 32,
+                   max_new_tokens: int = 512, num_beams: int = 1,
+                   max_input_length: int = 512) -> List[str]:
+    """Decode `input_texts` in padded batches with deterministic decoding"""
+    model = engine.planner.model
+    model.eval()
+    outputs: List[str] = []
+    for start in range(0, len(input_texts), batch_size):
+        batch = input_texts[start:start + batch_size]
+        inputs = engine.tokenizer(
+            batch, return_tensors="pt", padding=True, truncation=True, max_length=max_input_length
+        ).to(engine.device)
+        with torch.no_grad():
+            generated = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                num_beams=num_beams,
+                do_sample=False,
+                pad_token_id=engine.tokenizer.pad_token_id,
+                eos_token_id=engine.tokenizer.eos_token_id,
+            )
+        outputs.extend(engine.tokenizer.batch_decode(generated, skip_special_tokens=True))
+    return outputs
+
+
+def plan_parse_success(engine: HybridNeuralEngine, text: str, weekly_mode: bool = True) -> bool:
+    """True when generated text parses into a usable plan without default fill-ins"""
+    if not weekly_mode:
+        return engine._has_valid_content(text)
+    lowered = text.lower()
+    if not all(f"day{day}:" in lowered for day in range(1, 8)):
+        return False
+    weekly = engine.parse_generated_weekly_plan(text, patient_id="eval")
+    return engine._has_valid_weekly_content(weekly)
+
+
+def weights_fingerprint(model: torch.nn.Module) -> str:
+    """Short hash of the model weights (sum and sum of squares of every parameter)"""
+    with torch.no_grad():
+        moments = torch.stack([
+            torch.stack([p.detach().double().sum(), p.detach().double().pow(2).sum()])
+            for p in model.parameters()
+        ])
+    return hashlib.sha256(moments.cpu().numpy().tobytes()).hexdigest()[:16]
+
+
+def _normalize_item(item: str) -> str:
+    return ' '.join(item.strip(' |.,;').split())
+
+
+def extract_slots(engine: HybridNeuralEngine, text: str,
+                  weekly_mode: bool = True) -> Dict[Tuple[int, str], Set[str]]:
+    """Items per (day, meal) slot; days or meals missing from `text` are left out"""
+    slots: Dict[Tuple[int, str], Set[str]] = {}
+    lowered = text.lower()
+    if weekly_mode:
+        weekly = engine.parse_generated_weekly_plan(text, patient_id="eval")
+        days = [(plan.day, plan) for plan in weekly.days if f"day{plan.day}:" in lowered]
+        meals = [(day, {m: getattr(plan, m) for m in MEAL_TYPES}) for day, plan in days]
+    elif engine._has_valid_content(text):
+        meals = [(1, engine.parse_generated_plan(text))]
+    else:
+        meals = []
+    for day, plan in meals:
+        for meal in MEAL_TYPES:
+            if f"{meal}:" not in lowered:
+                continue
+            items = {_normalize_item(item) for item in plan[meal]}
+            items.discard('')
+            slots[(day, meal)] = items
+    return slots
+
+
+def slot_item_scores(engine: HybridNeuralEngine, predictions: List[str], references: List[str],
+                     weekly_mode: bool = True) -> Dict[str, float]:
+    """Micro-averaged item precision/recall/F1 over slots, plus parse success rate"""
+    true_pos = pred_total = gold_total = parsed = 0
+    for pred_text, gold_text in zip(predictions, references):
+        pred = extract_slots(engine, pred_text, weekly_mode)
+        gold = extract_slots(engine, gold_text, weekly_mode)
+        for slot, gold_items in gold.items():
+            true_pos += len(pred.get(slot, set()) & gold_items)
+            gold_total += len(gold_items)
+        pred_total += sum(len(items) for items in pred.values())
+        parsed += plan_parse_success(engine, pred_text, weekly_mode)
+    precision = true_pos / pred_total if pred_total else 0.0
+    recall = true_pos / gold_total if gold_total else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'item_precision': round(precision, 4),
+        'item_recall': round(recall, 4),
+        'item_f1': round(f1, 4),
+        'parse_success_rate': round(parsed / len(predictions), 4) if predictions else 0.0,
+    }
+
+
+class GenerationEvalCallback(TrainerCallback):
+    """Score generated plans on the validation pairs at every evaluation.
+
+    `MealPlanHFTrainer.evaluation_loop` calls `add_metrics`, which adds
+    `eval_item_precision`, `eval_item_recall`, `eval_item_f1` and
+    `eval_parse_success_rate` to the metrics before the Trainer logs them and
+    uses them for `metric_for_best_model` and early stopping. Results are
+    cached in `cache_file` per global step and weights fingerprint, so a run
+    into the same output directory never reuses another run's scores.
+    """
+
+    def __init__(self, engine: HybridNeuralEngine, pairs: List[Tuple[str, str]],
+                 weekly_mode: bool = True, cache_file: Optional[str] = None,
+                 batch_size: int = 32, max_new_tokens: int = 512, max_input_length: int = 512,
+                 max_samples: Optional[int] = None, seed: int = 42):
+        if max_samples is not None and len(pairs) > max_samples:
+            keep = np.random.default_rng(seed).choice(len(pairs), max_samples, replace=False)
+            pairs = [pairs[i] for i in sorted(keep)]
+        self.engine = engine
+        self.inputs = [p[0] for p in pairs]
+        self.references = [p[1] for p in pairs]
+        self.weekly_mode = weekly_mode
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.max_input_length = max_input_length
+        self.pairs_key = hashlib.sha256(
+            json.dumps([self.inputs, self.references, weekly_mode, max_new_tokens, max_input_length]).encode()
+        ).hexdigest()[:16]
+        self.cache: Dict[str, Dict[str, float]] = self._load_cache()
+
+    def _load_cache(self) -> Dict[str, Dict[str, float]]:
+        if self.cache_file is None or not self.cache_file.exists():
+            return {}
+        try:
+            with open(self.cache_file) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cached.get('results', {}) if cached.get('pairs_key') == self.pairs_key else {}
+
+    def _save_cache(self):
+        if self.cache_file is None:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, "w") as f:
+            json.dump({'pairs_key': self.pairs_key, 'results': self.cache}, f, indent=2)
+
+    def evaluate(self, step: int) -> Dict[str, float]:
+        key = f"{step}:{weights_fingerprint(self.engine.planner.model)}"
+        if key not in self.cache:
+            predictions = generate_texts(
+                self.engine, self.inputs, batch_size=self.batch_size,
+                max_new_tokens=self.max_new_tokens, max_input_length=self.max_input_length
+            )
+            self.cache[key] = slot_item_scores(self.engine, predictions, self.references,
+                                               self.weekly_mode)
+            self._save_cache()
+        return self.cache[key]
+
+    def add_metrics(self, state, metrics: Dict[str, float], prefix: str = "eval"):
+        """Add the generation scores of the current weights to `metrics`"""
+        if not self.inputs:
+            return
+        scores = self.evaluate(state.global_step)
+        metrics.update({f"{prefix}_{name}": value for name, value in scores.items()})
+        if state.is_world_process_zero:
+            print(f"📏 Step {state.global_step}: item F1 {scores['item_f1']}, "
+                  f"parse success {scores['parse_success_rate']}")
@@ -8,9 +8,12 @@ import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Optional
 import json
-from dataclasses import dataclass
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
 from enum import Enum
 import os
+import threading
 from pathlib import Path
 import warnings
 warnings.filterwarnings('ignore')
@@ -25,6 +28,15 @@ from transformers import (
 )
 from torch.utils.data import Dataset, DataLoader
 
+from default_plans import DefaultPlans
+from plan_parser import DEFAULT_MEALS, MEAL_TYPES, parse_plan_text, parse_weekly_text
+
+# LoRA adapters are optional; only needed for per-clinic adapter serving/training
+try:
+    from peft import PeftModel
+except ImportError:
+    PeftModel = None
+
 # Data structures for our domain
 @dataclass
 class Food:
@@ -45,6 +57,7 @@ class Food:
     vipaka: str  # post-digestive effect
     health_tags: List[str]
     contraindications: List[str]
+    vernacular_names: List[str] = field(default_factory=list)  # e.g. "Anda (अंडा)"
 
 @dataclass
 class Patient:
@@ -70,12 +83,19 @@ class MealPlan:
     snacks: List[str]
     restrictions: List[str]
     doctor_notes: str
+    # Catalog food per item, by meal: food_resolver.Resolution lists parallel to the items
+    resolved: Dict[str, list] = field(default_factory=dict)
+    safety_notes: List[str] = field(default_factory=list)  # allergy/contraindication filter actions
+    nutrition: Dict[str, float] = field(default_factory=dict)  # day totals (nutrition.NUTRIENTS)
 
 @dataclass
 class WeeklyMealPlan:
     patient_id: str
     days: List[MealPlan]  # 7 days of meal plans
     weekly_notes: str = ""
+    score: Optional[float] = None  # knowledge graph score when reranked
+    nutrition: Dict[str, float] = field(default_factory=dict)  # week totals
+    alternatives: List["WeeklyMealPlan"] = field(default_factory=list)  # lower-ranked candidates
 
 class NodeType(Enum):
     FOOD = "food"
@@ -95,6 +115,12 @@ class AyurvedaKnowledgeGraph:
         self.node_types = {}
         self.node_features = {}
         self.food_names_by_category = {}  # Store food names by category
+        self.foods = {}  # Food records by id, used to score generated plans
+
+    def __setstate__(self, state):
+        """Restore a pickled graph; older pickles have no food records"""
+        self.__dict__.update(state)
+        self.__dict__.setdefault('foods', {})
 
     def add_food_node(self, food: Food):
         """Add a food item and its relationships to the graph"""
@@ -103,6 +129,7 @@ class AyurvedaKnowledgeGraph:
         self.node_types[food_id] = NodeType.FOOD
 
         # Store food name for recommendation
+        self.foods[food.id] = food
         if food.category not in self.food_names_by_category:
             self.food_names_by_category[food.category] = []
         self.food_names_by_category[food.category].append(food.name)
@@ -164,6 +191,18 @@ class AyurvedaKnowledgeGraph:
             self._ensure_node_exists(condition_node, NodeType.CONDITION)
             self.graph.add_edge(patient_id, condition_node, relation="has_condition")
 
+    def add_plan_edges(self, plans: List[MealPlan], foods: List[Food]):
+        """Link patients to the foods their doctor plans prescribe"""
+        food_ids = {food.name.strip().lower(): f"food_{food.id}" for food in foods}
+        for plan in plans:
+            patient_id = f"patient_{plan.patient_id}"
+            if patient_id not in self.graph:
+                continue
+            for item in plan.breakfast + plan.lunch + plan.dinner + plan.snacks:
+                food_id = food_ids.get(item.strip().lower())
+                if food_id is not None:
+                    self.graph.add_edge(patient_id, food_id, relation="prescribed")
+
     def _ensure_node_exists(self, node_id: str, node_type: NodeType):
         if node_id not in self.graph:
             self.graph.add_node(node_id)
@@ -334,13 +373,59 @@ class T5MealPlanner(nn.Module):
             output_text += "snacks: " + ", ".join(meal_plan.snacks)
         return output_text.strip()
 
+class AdapterBaseMismatchError(ValueError):
+    """A LoRA adapter was trained on other base weights than the ones being served"""
+
 # Main Hybrid Neural Engine
 class HybridNeuralEngine:
-    def __init__(self, model_type: str = "t5", model_name: str = None, models_dir: str = "./models"):
+    ENGINE_MODES = ("t5", "solver", "retrieval", "library")
+
+    def __init__(self, model_type: str = "t5", model_name: str = None, models_dir: str = "./models",
+                 adapter_cache_size: int = 8, engine_mode: str = "t5",
+                 max_concurrent_generations: Optional[int] = None,
+                 default_plans_path: Optional[str] = None,
+                 plan_cache_path: Optional[str] = None, plan_cache_max_entries: int = 10000):
+        if engine_mode not in self.ENGINE_MODES:
+            raise ValueError(f"Unknown engine mode: {engine_mode} (expected one of {self.ENGINE_MODES})")
         self.model_type = model_type
+        # "solver" answers from the plan solver and "retrieval" from the doctor plans of
+        # similar patients, without decoding; "library" answers from the archetype plan
+        # library and decodes only for off-grid patients. In "t5" and "library" mode the
+        # solver also takes requests beyond max_concurrent_generations (None = no limit)
+        self.engine_mode = engine_mode
+        self._generation_slots = (threading.BoundedSemaphore(max_concurrent_generations)
+                                  if max_concurrent_generations else None)
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(exist_ok=True)
         self.knowledge_graph = AyurvedaKnowledgeGraph()
+        # Fallback plans, precomputed per prakriti (default_plans.json unless a path is given)
+        self.default_plans = DefaultPlans.load(default_plans_path)
+        self.model_dir: Optional[Path] = None  # directory the current weights came from
+
+        # LoRA adapters loaded on top of the base model, in LRU order
+        self.adapters_dir = self.models_dir / "adapters"
+        self.adapter_cache_size = adapter_cache_size
+        self._adapters: "OrderedDict[str, Path]" = OrderedDict()
+        self._adapter_lock = threading.RLock()
+        self._plan_scorer = None
+        self._plan_scorer_key = None
+        self._food_resolver = None
+        self._food_resolver_key = None
+        self._safety_index = None
+        self._safety_index_key = None
+        self._nutrient_matrix = None
+        self._nutrient_matrix_key = None
+        self._plan_solver = None
+        self._plan_solver_key = None
+        self._plan_retriever = None
+        self._plan_library = None
+        self._food_pairing = None
+        # Decoded plans shared across worker processes (SQLite, off when no path is given)
+        self.plan_cache = None
+        if plan_cache_path:
+            from plan_cache import PlanCache
+            self.plan_cache = PlanCache(plan_cache_path, max_entries=plan_cache_max_entries)
+        self._model_fingerprint = None
 
         # Use smaller models for faster inference
         if model_type == "t5":
@@ -366,11 +451,14 @@ class HybridNeuralEngine:
         # Save model and tokenizer
         self.planner.model.save_pretrained(output_dir)
         self.tokenizer.save_pretrained(output_dir)
+        self.model_dir = output_dir
         
         # Save knowledge graph
         import pickle
         with open(output_dir / "knowledge_graph.pkl", "wb") as f:
             pickle.dump(self.knowledge_graph, f)
+        if self.get_food_pairing() is not None:
+            self._food_pairing.save(output_dir / "food_pairs.npz")
         
         print(f"✓ Model saved to {output_dir}")
         return str(output_dir)
@@ -387,6 +475,9 @@ class HybridNeuralEngine:
         self.tokenizer = T5Tokenizer.from_pretrained(model_dir)
         self.planner.tokenizer = self.tokenizer
         self.planner.model.to(self.device)
+        self.model_dir = model_dir
+        self._adapters.clear()
+        self._model_fingerprint = None
         
         # Load knowledge graph if exists
         kg_path = model_dir / "knowledge_graph.pkl"
@@ -394,9 +485,75 @@ class HybridNeuralEngine:
             import pickle
             with open(kg_path, "rb") as f:
                 self.knowledge_graph = pickle.load(f)
+        pairs_path = model_dir / "food_pairs.npz"
+        if pairs_path.exists():
+            from food_pairing import FoodPairing
+            self._food_pairing = FoodPairing.load(pairs_path)
         
         print(f"✓ Model loaded from {model_dir}")
 
+    def available_adapters(self) -> List[str]:
+        """Names of LoRA adapters saved under models/adapters"""
+        if not self.adapters_dir.exists():
+            return []
+        return sorted(p.name for p in self.adapters_dir.iterdir()
+                      if (p / "adapter_config.json").exists())
+
+    def loaded_adapters(self) -> List[str]:
+        """Adapters currently held in memory, least recently used first"""
+        return list(self._adapters.keys())
+
+    def activate_adapter(self, name: str):
+        """Make a LoRA adapter active, loading it (and evicting the LRU one) if needed"""
+        if PeftModel is None:
+            raise ImportError("LoRA adapters require the 'peft' package (pip install peft)")
+
+        with self._adapter_lock:
+            if name in self._adapters:
+                self._adapters.move_to_end(name)
+                self.planner.model.set_adapter(name)
+                return
+
+            adapter_dir = self.adapters_dir / name
+            if not (adapter_dir / "adapter_config.json").exists():
+                raise FileNotFoundError(f"Adapter not found: {name}")
+
+            meta_path = adapter_dir / "adapter_meta.json"
+            if meta_path.exists():
+                with open(meta_path) as f:
+                    base_model = json.load(f).get('base_model')
+                serving = Path(self.model_dir).resolve() if self.model_dir is not None else None
+                if base_model and Path(base_model).resolve() != serving:
+                    raise AdapterBaseMismatchError(
+                        f"Adapter {name} was trained on {base_model}, serving base is "
+                        f"{self.model_dir or 'the pretrained base model'}"
+                    )
+
+            if isinstance(self.planner.model, PeftModel):
+                self.planner.model.load_adapter(str(adapter_dir), adapter_name=name)
+            else:
+                self.planner.model = PeftModel.from_pretrained(
+                    self.planner.model, str(adapter_dir), adapter_name=name
+                )
+            self.planner.model.to(self.device)
+            self.planner.model.eval()
+            self._adapters[name] = adapter_dir
+
+            # Evict least recently used adapters beyond the cache size
+            while len(self._adapters) > self.adapter_cache_size:
+                evicted, _ = self._adapters.popitem(last=False)
+                self.planner.model.delete_adapter(evicted)
+            self.planner.model.set_adapter(name)
+
+    def _adapter_scope(self, adapter: Optional[str]):
+        """Context for one generation call: the named adapter, or the plain base model"""
+        if adapter:
+            self.activate_adapter(adapter)
+            return nullcontext()
+        if PeftModel is not None and isinstance(self.planner.model, PeftModel):
+            return self.planner.model.disable_adapter()
+        return nullcontext()
+
     def build_knowledge_graph(self, foods: List[Food], patients: List[Patient]):
         """Build the knowledge graph from data"""
         print(f"Building knowledge graph with {len(foods)} foods and {len(patients)} patients...")
@@ -405,6 +562,8 @@ class HybridNeuralEngine:
         for patient in patients:
             self.knowledge_graph.add_patient_node(patient)
         graph_data = self.knowledge_graph.to_pytorch_geometric()
+        # Nutrient matrix for plan totals, built with the graph
+        self.get_nutrient_matrix()
         return graph_data.to(self.device)
 
     def get_food_recommendations(self, patient: Patient) -> Dict[str, List[str]]:
@@ -446,25 +605,165 @@ class HybridNeuralEngine:
 
         return recommendations
 
-    def generate_weekly_meal_plan(self, patient: Patient,
-                                 graph_data: Data = None,
-                                 max_length: int = 512,
-                                 temperature: float = 0.9,
-                                 use_knowledge_graph: bool = True) -> WeeklyMealPlan:
-        """Generate a 7-day meal plan for a patient"""
-        
-        # Ensure graph_data is on the correct device
-        if graph_data is not None and graph_data.x.device != self.device:
-            graph_data = graph_data.to(self.device)
-
-        if use_knowledge_graph and not self.knowledge_graph.food_names_by_category:
-            print("⚠ No foods in knowledge graph, using default recommendations")
-            return self._generate_default_weekly_plan(patient)
-
-        # Format input for weekly plan
-        input_text = self.planner.format_patient_input_weekly(patient)
-
-        # Tokenize and move to device
+    def get_plan_scorer(self):
+        """Knowledge graph plan scorer, rebuilt when the graph's foods change"""
+        from plan_scoring import PlanScorer
+        foods = self.knowledge_graph.foods
+        key = (id(self.knowledge_graph), len(foods))
+        if self._plan_scorer is None or self._plan_scorer_key != key:
+            self._plan_scorer = PlanScorer(list(foods.values()))
+            self._plan_scorer_key = key
+        return self._plan_scorer
+
+    def get_food_resolver(self):
+        """Food name resolver over the knowledge graph's foods, rebuilt when they change"""
+        from food_resolver import FoodResolver
+        foods = self.knowledge_graph.foods
+        key = (id(self.knowledge_graph), len(foods))
+        if self._food_resolver is None or self._food_resolver_key != key:
+            self._food_resolver = FoodResolver(list(foods.values()))
+            self._food_resolver_key = key
+        return self._food_resolver
+
+    def get_safety_index(self):
+        """Allergy/contraindication flags over the knowledge graph's foods"""
+        from plan_safety import SafetyIndex
+        resolver = self.get_food_resolver()
+        if self._safety_index is None or self._safety_index_key != self._food_resolver_key:
+            foods = self.knowledge_graph.foods
+            self._safety_index = SafetyIndex(list(foods.values()), resolver)
+            self._safety_index_key = self._food_resolver_key
+        return self._safety_index
+
+    def get_plan_solver(self):
+        """Catalog plan solver, sharing the safety index"""
+        from plan_solver import PlanSolver
+        safety = self.get_safety_index()
+        if self._plan_solver is None or self._plan_solver_key != self._safety_index_key:
+            self._plan_solver = PlanSolver(safety)
+            self._plan_solver_key = self._safety_index_key
+        return self._plan_solver
+
+    def build_plan_index(self, patients: List[Patient], plans: List[MealPlan]):
+        """Index the weeks of doctor plans by patient features for retrieval mode"""
+        from plan_retrieval import PlanRetriever
+        self._plan_retriever = PlanRetriever(patients, plans)
+        print(f"✓ Indexed {len(self._plan_retriever)} doctor-authored weeks for retrieval")
+        return self._plan_retriever
+
+    def get_plan_retriever(self):
+        """Doctor plan index, or None before build_plan_index"""
+        return self._plan_retriever
+
+    def build_food_pairing(self, plans: List[MealPlan]):
+        """Food co-occurrence (PPMI) matrices from doctor plans, over the knowledge graph's foods"""
+        from food_pairing import FoodPairing
+        foods = self.knowledge_graph.foods
+        self._food_pairing = FoodPairing.build(plans, list(foods.values()), self.get_food_resolver())
+        print(f"✓ Food pairing built with {self._food_pairing.pairs()} food pairs")
+        return self._food_pairing
+
+    def get_food_pairing(self):
+        """Food pairing matrices, or None before build_food_pairing / load_model"""
+        return self._food_pairing
+
+    def suggest_pairings(self, items: List[str], meal: str = 'any', k: int = 10,
+                         patient: Optional[Patient] = None) -> Tuple[List[Tuple[str, str, float]], List[str]]:
+        """Foods that complement a partial meal as (food id, name, score), best first, and
+        the items that could not be resolved. Foods unsafe for `patient` are left out."""
+        pairing = self.get_food_pairing()
+        if pairing is None:
+            return [], list(items)
+        resolutions = self.get_food_resolver().resolve_many(items)
+        unresolved = [item for item, r in zip(items, resolutions) if r.food_id is None]
+        exclude = None
+        if patient is not None:
+            safety = self.get_safety_index()
+            unsafe = safety.unsafe_foods(patient)
+            if unsafe.any():
+                exclude = {safety.foods[i].id for i in np.flatnonzero(unsafe)}
+        foods = self.knowledge_graph.foods
+        suggestions = [
+            (food_id, foods[food_id].name if food_id in foods else food_id, score)
+            for food_id, score in pairing.complements(
+                [r.food_id for r in resolutions if r.food_id is not None], meal, k, exclude
+            )
+        ]
+        return suggestions, unresolved
+
+    def load_plan_library(self, path: str):
+        """Load the archetype plan library written by build_plan_library.py"""
+        from plan_library import PlanLibrary
+        self._plan_library = PlanLibrary.load(path)
+        print(f"✓ Loaded plan library with {len(self._plan_library)} archetypes from {path}")
+        return self._plan_library
+
+    def get_plan_library(self):
+        """Archetype plan library, or None before load_plan_library"""
+        return self._plan_library
+
+    def _plan_cache_key(self, kind: str, patient: Patient, adapter: Optional[str], **params) -> Optional[str]:
+        """Plan cache key of a decode, or None when caching is off"""
+        cache = self.plan_cache
+        if cache is None:
+            return None
+        from plan_cache import model_fingerprint
+        if self._model_fingerprint is None:
+            self._model_fingerprint = model_fingerprint(
+                self.model_dir, getattr(self.planner.model.config, 'name_or_path', '')
+            )
+        fingerprint = self._model_fingerprint
+        if adapter:
+            fingerprint += f"|{adapter}:{model_fingerprint(self.adapters_dir / adapter)}"
+        return cache.key(kind, patient, params, fingerprint)
+
+    @contextmanager
+    def _generation_slot(self):
+        """Yields False when max_concurrent_generations decodes are already running"""
+        slots = self._generation_slots
+        if slots is None:
+            yield True
+            return
+        acquired = slots.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                slots.release()
+
+    def _resolve_engine_mode(self, engine_mode: Optional[str]) -> str:
+        mode = engine_mode or self.engine_mode
+        if mode not in self.ENGINE_MODES:
+            raise ValueError(f"Unknown engine mode: {mode} (expected one of {self.ENGINE_MODES})")
+        return mode
+
+    def get_nutrient_matrix(self):
+        """Dense foods x nutrients matrix over the knowledge graph's foods"""
+        from nutrition import NutrientMatrix
+        resolver = self.get_food_resolver()
+        if self._nutrient_matrix is None or self._nutrient_matrix_key != self._food_resolver_key:
+            foods = self.knowledge_graph.foods
+            self._nutrient_matrix = NutrientMatrix(list(foods.values()), resolver)
+            self._nutrient_matrix_key = self._food_resolver_key
+        return self._nutrient_matrix
+
+    def annotate_nutrition(self, weekly_plan: WeeklyMealPlan):
+        """Set day and week nutrient totals on a weekly plan and its alternatives"""
+        from nutrition import totals_dict
+        for plan in [weekly_plan, *weekly_plan.alternatives]:
+            totals = self.get_nutrient_matrix().annotate(plan.days)
+            plan.nutrition = totals_dict(totals.sum(axis=0))
+
+    def apply_safety_filter(self, patient: Patient, plans: List[MealPlan],
+                            mode: Optional[str] = "remove") -> int:
+        """Flag, remove or replace items unsafe for the patient's allergies and conditions"""
+        if not mode:
+            return 0
+        return self.get_safety_index().filter_plans(patient, plans, mode)
+
+    def _generate_candidates(self, input_text: str, adapter: Optional[str], num_candidates: int,
+                             **generate_kwargs) -> List[str]:
+        """Decode `num_candidates` sequences from a single beam-sample generate call"""
         inputs = self.tokenizer(
             input_text,
             return_tensors="pt",
@@ -472,44 +771,150 @@ class HybridNeuralEngine:
             truncation=True
         ).to(self.device)
 
-        # Generate
-        with torch.no_grad():
+        # Adapter switching is the only shared state; a plain model decodes concurrently
+        uses_adapters = adapter or (PeftModel is not None and isinstance(self.planner.model, PeftModel))
+        with self._adapter_lock if uses_adapters else nullcontext(), self._adapter_scope(adapter), torch.no_grad():
             outputs = self.planner.model.generate(
                 **inputs,
-                max_length=max_length,
-                min_length=50,
-                temperature=temperature,
+                **generate_kwargs,
                 do_sample=True,
                 top_k=50,
                 top_p=0.95,
-                num_beams=3,
+                num_beams=max(3, num_candidates),
+                num_return_sequences=num_candidates,
                 early_stopping=True,
                 pad_token_id=self.tokenizer.pad_token_id,
                 eos_token_id=self.tokenizer.eos_token_id,
             )
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def generate_weekly_meal_plan(self, patient: Patient,
+                                 graph_data: Data = None,
+                                 max_length: int = 512,
+                                 temperature: float = 0.9,
+                                 use_knowledge_graph: bool = True,
+                                 adapter: Optional[str] = None,
+                                 num_candidates: int = 3,
+                                 return_alternatives: bool = False,
+                                 safety_mode: Optional[str] = "remove",
+                                 engine_mode: Optional[str] = None) -> WeeklyMealPlan:
+        """Generate a 7-day meal plan for a patient, optionally with a clinic LoRA adapter.
+
+        `num_candidates` sequences come from the same beam search and are
+        reranked against the knowledge graph (dosha compatibility, allergy
+        violations, category coverage); the best is returned, with the others
+        in `alternatives` when `return_alternatives` is set. Items unsafe for
+        the patient are then handled per `safety_mode` ('flag', 'remove',
+        'replace' or None to skip). `engine_mode` overrides the engine's mode
+        for this request.
+        """
+        mode = self._resolve_engine_mode(engine_mode)
+        
+        # Ensure graph_data is on the correct device
+        if graph_data is not None and graph_data.x.device != self.device:
+            graph_data = graph_data.to(self.device)
+
+        if use_knowledge_graph and not self.knowledge_graph.food_names_by_category:
+            print("⚠ No foods in knowledge graph, using default recommendations")
+            return self._generate_default_weekly_plan(patient)
+
+        weekly_plan = None
+        retriever = self.get_plan_retriever()
+        library = self.get_plan_library()
+        if mode == "retrieval" and retriever is not None:
+            retrieved = retriever.retrieve(patient, num_candidates if return_alternatives else 1)
+            if retrieved:
+                weekly_plan = retrieved[0]
+                weekly_plan.alternatives.extend(retrieved[1:])
+        elif mode == "library" and library is not None:
+            weekly_plan = library.weekly_plan(patient)
+        cache_key = None
+        if weekly_plan is None and mode in ("t5", "library"):
+            cache_key = self._plan_cache_key(
+                "weekly", patient, adapter, max_length=max_length, temperature=temperature,
+                use_knowledge_graph=use_knowledge_graph, num_candidates=num_candidates,
+                return_alternatives=return_alternatives
+            )
+            if cache_key is not None:
+                weekly_plan = self.plan_cache.get_weekly(cache_key, patient.id)
+        if weekly_plan is None and mode in ("t5", "library"):
+            with self._generation_slot() as acquired:
+                if acquired:
+                    weekly_plan = self._generate_weekly_t5(
+                        patient, max_length, temperature, use_knowledge_graph, adapter,
+                        num_candidates, return_alternatives
+                    )
+                    # Cached as decoded, before the post-processing below
+                    if cache_key is not None:
+                        self.plan_cache.put_weekly(cache_key, weekly_plan)
+                else:
+                    print("⚠ All generation slots busy, answering with the plan solver")
+        if weekly_plan is None:
+            weekly_plan = self.get_plan_solver().solve_weekly_plan(patient)
+
+        # Link items to catalog foods, then drop or flag unsafe ones
+        self.get_food_resolver().resolve_weekly_plan(weekly_plan)
+        for plan in [weekly_plan, *weekly_plan.alternatives]:
+            self.apply_safety_filter(patient, plan.days, safety_mode)
+        self.annotate_nutrition(weekly_plan)
+        return weekly_plan
 
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+    def _generate_weekly_t5(self, patient: Patient, max_length: int, temperature: float,
+                            use_knowledge_graph: bool, adapter: Optional[str],
+                            num_candidates: int, return_alternatives: bool) -> WeeklyMealPlan:
+        """Decode and rerank T5 candidates for a weekly plan"""
+        # Format input for weekly plan
+        input_text = self.planner.format_patient_input_weekly(patient)
+
+        generated_texts = self._generate_candidates(
+            input_text, adapter, num_candidates,
+            max_length=max_length, min_length=50, temperature=temperature
+        )
 
-        # Parse the generated text into a weekly plan. If parsing fails to find day-wise
+        # Parse every candidate into a weekly plan. If parsing fails to find day-wise
         # sections, the parser will fall back to patient-specific defaults for each day.
-        weekly_plan = self.parse_generated_weekly_plan(
-            generated_text,
-            patient_id=patient.id,
-            patient=patient,
+        candidates = [
+            self.parse_generated_weekly_plan(text, patient_id=patient.id, patient=patient)
+            for text in generated_texts
+        ]
+        valid = [self._has_valid_weekly_content(plan) for plan in candidates]
+        scores, _ = self.get_plan_scorer().score(
+            patient,
+            [[meal for day in plan.days for meal in (day.breakfast, day.lunch, day.dinner, day.snacks)]
+             for plan in candidates],
+            valid=valid
         )
+        order = np.argsort(-scores, kind='stable')
+        weekly_plan = candidates[order[0]]
+        weekly_plan.score = float(scores[order[0]])
 
         # If generation fails, use knowledge graph recommendations
-        if not self._has_valid_weekly_content(weekly_plan) and use_knowledge_graph:
+        if not valid[order[0]] and use_knowledge_graph:
             weekly_plan = self._generate_default_weekly_plan(patient)
 
+        if return_alternatives:
+            for i in order[1:]:
+                candidates[i].score = float(scores[i])
+                weekly_plan.alternatives.append(candidates[i])
+
         return weekly_plan
 
     def generate_meal_plan(self, patient: Patient, day: int,
                           graph_data: Data = None,
                           max_length: int = 256,
                           temperature: float = 0.9,
-                          use_knowledge_graph: bool = True) -> str:
-        """Generate meal plan for a single day"""
+                          use_knowledge_graph: bool = True,
+                          adapter: Optional[str] = None,
+                          num_candidates: int = 3,
+                          return_alternatives: bool = False,
+                          engine_mode: Optional[str] = None):
+        """Generate meal plan for a single day, optionally with a clinic LoRA adapter.
+
+        Candidates are reranked like in `generate_weekly_meal_plan`. Returns the
+        best plan text, or with `return_alternatives` every candidate as
+        (text, score) pairs, best first.
+        """
+        mode = self._resolve_engine_mode(engine_mode)
 
         # Ensure graph_data is on the correct device
         if graph_data is not None and graph_data.x.device != self.device:
@@ -517,110 +922,235 @@ class HybridNeuralEngine:
 
         if use_knowledge_graph and not self.knowledge_graph.food_names_by_category:
             print("⚠ No foods in knowledge graph, using default recommendations")
-            return self._generate_default_plan(patient, day)
-
+            default_text = self._generate_default_plan(patient, day)
+            return [(default_text, None)] if return_alternatives else default_text
+
+        library = self.get_plan_library()
+        if mode == "library" and library is not None:
+            days = library.days(patient)
+            if days:
+                library_text = self._format_recommendations(days[(day - 1) % len(days)])
+                return [(library_text, None)] if return_alternatives else library_text
+        if mode in ("t5", "library"):
+            cache_key = self._plan_cache_key(
+                "day", patient, adapter, day=day, max_length=max_length, temperature=temperature,
+                use_knowledge_graph=use_knowledge_graph, num_candidates=num_candidates
+            )
+            candidates = self.plan_cache.get(cache_key) if cache_key is not None else None
+            if candidates is None:
+                with self._generation_slot() as acquired:
+                    if acquired:
+                        candidates = self._generate_day_t5(
+                            patient, day, max_length, temperature, use_knowledge_graph, adapter,
+                            num_candidates, return_alternatives=True
+                        )
+                        if cache_key is not None:
+                            self.plan_cache.put(cache_key, candidates)
+            if candidates is not None:
+                candidates = [(text, score) for text, score in candidates]
+                return candidates if return_alternatives else candidates[0][0]
+            print("⚠ All generation slots busy, answering with the plan solver")
+        retriever = self.get_plan_retriever()
+        if mode == "retrieval" and retriever is not None:
+            days = retriever.retrieve_day(patient, day, num_candidates if return_alternatives else 1)
+            if days:
+                texts = [self._format_recommendations(meals) for meals in days]
+                return [(text, None) for text in texts] if return_alternatives else texts[0]
+        solver_text = self._format_recommendations(self.get_plan_solver().solve(patient, num_days=day)[day - 1])
+        return [(solver_text, None)] if return_alternatives else solver_text
+
+    def _generate_day_t5(self, patient: Patient, day: int, max_length: int, temperature: float,
+                         use_knowledge_graph: bool, adapter: Optional[str],
+                         num_candidates: int, return_alternatives: bool):
+        """Decode and rerank T5 candidates for a single day"""
         # Format input
         input_text = self.planner.format_patient_input(patient, day)
 
-        # Tokenize and move to device
-        inputs = self.tokenizer(
-            input_text,
-            return_tensors="pt",
-            max_length=512,
-            truncation=True
-        ).to(self.device)
-
-        # Generate
-        with torch.no_grad():
-            outputs = self.planner.model.generate(
-                **inputs,
-                max_length=max_length,
-                min_length=20,
-                temperature=temperature,
-                do_sample=True,
-                top_k=50,
-                top_p=0.95,
-                num_beams=3,
-                early_stopping=True,
-                pad_token_id=self.tokenizer.pad_token_id,
-                eos_token_id=self.tokenizer.eos_token_id,
-            )
+        generated_texts = self._generate_candidates(
+            input_text, adapter, num_candidates,
+            max_length=max_length, min_length=20, temperature=temperature
+        )
 
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        valid = [self._has_valid_content(text) for text in generated_texts]
+        parsed = [self.parse_generated_plan(text) for text in generated_texts]
+        scores, _ = self.get_plan_scorer().score(
+            patient,
+            [[plan['breakfast'], plan['lunch'], plan['dinner'], plan['snacks']] for plan in parsed],
+            valid=valid
+        )
+        order = np.argsort(-scores, kind='stable')
+        generated_text = generated_texts[order[0]]
+        best_score = float(scores[order[0]])
 
         # If generation fails, use knowledge graph recommendations
-        if not self._has_valid_content(generated_text) and use_knowledge_graph:
+        if not valid[order[0]] and use_knowledge_graph:
             recommendations = self.get_food_recommendations(patient)
             generated_text = self._format_recommendations(recommendations)
+            best_score = None
 
+        if return_alternatives:
+            return [(generated_text, best_score)] + [(generated_texts[i], float(scores[i])) for i in order[1:]]
         return generated_text
 
+    def regenerate_plan_segments(self, patient: Patient, weekly_plan: WeeklyMealPlan,
+                                 targets: Dict[int, Optional[List[str]]],
+                                 max_length: int = 256,
+                                 temperature: float = 0.9,
+                                 adapter: Optional[str] = None,
+                                 num_candidates: int = 3,
+                                 safety_mode: Optional[str] = "remove",
+                                 engine_mode: Optional[str] = None,
+                                 repeat_window: int = 3) -> WeeklyMealPlan:
+        """Replace some days or meals of an existing weekly plan in place.
+
+        `targets` maps day numbers to the meals to replace (None for the whole
+        day). Only the target days are decoded. Items within `repeat_window`
+        days of a target, both the kept ones and the ones being replaced, are
+        blocked during decoding, and the candidates that repeat the fewest of
+        them win. The solver, used in solver mode, when no generation slot is
+        free or for days where no candidate fills every target meal, counts
+        them against its repeat window instead.
+        """
+        mode = self._resolve_engine_mode(engine_mode)
+        days_by_number = {plan.day: plan for plan in weekly_plan.days}
+        for day, meals in targets.items():
+            if day not in days_by_number:
+                raise ValueError(f"Day {day} is not in the plan")
+            unknown = set(meals or ()) - set(MEAL_TYPES)
+            if unknown:
+                raise ValueError(f"Unknown meals: {sorted(unknown)} (expected {MEAL_TYPES})")
+        targets = {day: list(meals or MEAL_TYPES) for day, meals in targets.items()}
+
+        def blocked_items(day: int) -> List[str]:
+            """Items within the repeat window of `day`: the kept ones and the ones being replaced"""
+            return [
+                item
+                for plan in weekly_plan.days if abs(plan.day - day) < repeat_window
+                for meal in MEAL_TYPES
+                for item in getattr(plan, meal)
+            ]
+
+        replacements: Dict[int, Optional[Dict[str, List[str]]]] = {}
+        if mode != "solver":
+            with self._generation_slot() as acquired:
+                if acquired:
+                    replacements = {
+                        day: self._regenerate_day_t5(patient, day, meals, blocked_items(day), max_length,
+                                                     temperature, adapter, num_candidates)
+                        for day, meals in targets.items()
+                    }
+                else:
+                    print("⚠ All generation slots busy, answering with the plan solver")
+        unsolved = [day for day in targets if replacements.get(day) is None]
+        if unsolved:
+            if replacements:
+                print(f"⚠ No usable candidate for day(s) {unsolved}, answering with the plan solver")
+            safety = self.get_safety_index()
+            resolver = self.get_food_resolver()
+            avoid = []
+            for day in range(1, 8):
+                plan = days_by_number.get(day)
+                # Kept and replaced items, and meals already regenerated by T5
+                items = [item for meal in MEAL_TYPES for item in (getattr(plan, meal) if plan else [])]
+                items += [item for meal in targets.get(day, ())
+                          for item in (replacements.get(day) or {}).get(meal, [])]
+                avoid.append([safety.index[r.food_id] for r in resolver.resolve_many(items)
+                              if r.food_id in safety.index])
+            solved = self.get_plan_solver().solve(patient, num_days=7, avoid=avoid)
+            for day in unsolved:
+                replacements[day] = solved[day - 1]
+
+        patched = []
+        for day, meals in targets.items():
+            plan = days_by_number[day]
+            for meal in meals:
+                setattr(plan, meal, list(replacements[day].get(meal, [])))
+            # Notes about replaced meals no longer apply
+            plan.safety_notes = [note for note in plan.safety_notes if note.split(':', 1)[0] not in meals]
+            patched.append(plan)
+
+        resolver = self.get_food_resolver()
+        for plan in weekly_plan.days:
+            resolver.resolve_meal_plan(plan)
+        self.apply_safety_filter(patient, patched, safety_mode)
+        self.annotate_nutrition(weekly_plan)
+        return weekly_plan
+
+    def _regenerate_day_t5(self, patient: Patient, day: int, meals: List[str], blocked_items: List[str],
+                           max_length: int, temperature: float, adapter: Optional[str],
+                           num_candidates: int) -> Optional[Dict[str, List[str]]]:
+        """Decode a day with `blocked_items` blocked; the candidate with the fewest repeats wins.
+
+        Only candidates that name items for every one of `meals` compete; None
+        when there is none (e.g. every candidate parsed to the generic defaults).
+        """
+        from food_resolver import normalize_name
+        blocked_names = {normalize_name(item) for item in blocked_items}
+        # Block both the spelling used in the plan and the normalized name
+        spellings = blocked_names | {' '.join(item.split()) for item in blocked_items}
+        bad_words = [
+            ids for ids in (self.tokenizer(name, add_special_tokens=False).input_ids for name in sorted(spellings))
+            if ids
+        ]
+        generate_kwargs = dict(max_length=max_length, min_length=20, temperature=temperature)
+        if bad_words:
+            generate_kwargs['bad_words_ids'] = bad_words
+        generated_texts = self._generate_candidates(
+            self.planner.format_patient_input(patient, day), adapter, num_candidates, **generate_kwargs
+        )
+        valid = [self._has_valid_content(text) for text in generated_texts]
+        parsed = [self.parse_generated_plan(text) for text in generated_texts]
+        scores, _ = self.get_plan_scorer().score(
+            patient,
+            [[plan['breakfast'], plan['lunch'], plan['dinner'], plan['snacks']] for plan in parsed],
+            valid=valid
+        )
+        repeats = np.array([
+            sum(normalize_name(item) in blocked_names for meal in MEAL_TYPES for item in plan[meal])
+            for plan in parsed
+        ], dtype=np.float32)
+        usable = np.array([
+            is_valid and plan != DEFAULT_MEALS and all(plan[meal] for meal in meals)
+            for is_valid, plan in zip(valid, parsed)
+        ], dtype=bool)
+        if not usable.any():
+            return None
+        return parsed[int(np.argmax(np.where(usable, scores - repeats, -np.inf)))]
+
     def _generate_default_weekly_plan(self, patient: Patient) -> WeeklyMealPlan:
         """Generate a default 7-day meal plan based on patient profile"""
-        weekly_plans = []
-        
-        for day in range(1, 8):
-            # Vary the plan across days
-            default_plan = self._generate_default_plan(patient, day)
-            parsed_plan = self.parse_generated_plan(default_plan)
-            
-            meal_plan = MealPlan(
-                patient_id=patient.id,
-                day=day,
-                breakfast=parsed_plan['breakfast'],
-                lunch=parsed_plan['lunch'],
-                dinner=parsed_plan['dinner'],
-                snacks=parsed_plan['snacks'],
-                restrictions=[],
-                doctor_notes=f"Day {day} - tailored for {patient.prakriti} constitution"
-            )
-            weekly_plans.append(meal_plan)
-        
+        weekly_plans = [
+            self._default_meal_plan(patient.id, day, patient.prakriti,
+                                    f"Day {day} - tailored for {patient.prakriti} constitution")
+            for day in range(1, 8)
+        ]
         return WeeklyMealPlan(
             patient_id=patient.id,
             days=weekly_plans,
             weekly_notes=f"7-day meal plan for {patient.prakriti} constitution"
         )
 
-    def _generate_default_plan(self, patient: Patient, day: int) -> str:
-        """Generate a default meal plan based on patient profile"""
-        # Vary meals based on day and prakriti
-        base_foods = {
-            'vata': {
-                'breakfast': ['oatmeal', 'warm milk', 'almonds', 'dates', 'honey'],
-                'lunch': ['rice', 'moong dal', 'ghee', 'cooked vegetables', 'yogurt'],
-                'dinner': ['khichdi', 'soup', 'bread', 'cooked spinach', 'warm tea'],
-                'snacks': ['banana', 'soaked almonds', 'warm beverages']
-            },
-            'pitta': {
-                'breakfast': ['coconut water', 'sweet fruits', 'milk', 'cereal', 'cooling foods'],
-                'lunch': ['basmati rice', 'green vegetables', 'cucumber', 'yogurt', 'salad'],
-                'dinner': ['quinoa', 'salad', 'sweet potato', 'green beans', 'herbal tea'],
-                'snacks': ['watermelon', 'coconut', 'cooling drinks']
-            },
-            'kapha': {
-                'breakfast': ['honey water', 'light breakfast', 'berries', 'green tea', 'spices'],
-                'lunch': ['millet', 'bitter vegetables', 'spices', 'legumes', 'warm water'],
-                'dinner': ['barley soup', 'steamed vegetables', 'ginger tea', 'light foods'],
-                'snacks': ['apple', 'pear', 'warm beverages']
-            }
-        }
+    def _default_meal_plan(self, patient_id: str, day: int, prakriti: Optional[str],
+                           doctor_notes: str = "") -> MealPlan:
+        """MealPlan from the precomputed defaults (generic ones when prakriti is None)"""
+        meals = self._default_day(prakriti, day)
+        return MealPlan(
+            patient_id=patient_id,
+            day=day,
+            breakfast=list(meals['breakfast']),
+            lunch=list(meals['lunch']),
+            dinner=list(meals['dinner']),
+            snacks=list(meals['snacks']),
+            restrictions=[],
+            doctor_notes=doctor_notes
+        )
 
-        # Select based on prakriti and add day variation
-        prakriti = patient.prakriti.lower()
-        foods = base_foods.get(prakriti, base_foods['vata'])
-        
-        # Add variety based on day
-        day_variation = (day - 1) % 3
-        
-        selected_foods = {
-            'breakfast': foods['breakfast'][day_variation:day_variation+3],
-            'lunch': foods['lunch'][day_variation:day_variation+3],
-            'dinner': foods['dinner'][day_variation:day_variation+3],
-            'snacks': foods['snacks'][day_variation:day_variation+2]
-        }
+    def _default_day(self, prakriti: Optional[str], day: int) -> Dict[str, Tuple[str, ...]]:
+        return self.default_plans.day(prakriti, day)
 
-        return self._format_recommendations(selected_foods)
+    def _generate_default_plan(self, patient: Patient, day: int) -> str:
+        """Generate a default meal plan based on patient profile"""
+        return self._format_recommendations(self._default_day(patient.prakriti, day))
 
     def _format_recommendations(self, recommendations: Dict[str, List[str]]) -> str:
         """Format recommendations into text"""
@@ -655,51 +1185,17 @@ class HybridNeuralEngine:
         a complete and personalized 7-day plan.
         """
         weekly_plans = []
-        text = generated_text.lower()
+        # Day sections found in the text, parsed in a single pass
+        sections = parse_weekly_text(generated_text)
         
-        # Try to parse day by day
         for day_num in range(1, 8):
-            day_plan = MealPlan(
-                patient_id=patient_id,
-                day=day_num,
-                breakfast=[],
-                lunch=[],
-                dinner=[],
-                snacks=[],
-                restrictions=[],
-                doctor_notes=""
-            )
-            
-            # Look for day-specific content
-            day_pattern = f"day{day_num}:"
-            if day_pattern in text:
-                # Find the section for this day
-                start = text.index(day_pattern) + len(day_pattern)
-                end = len(text)
-                
-                # Find the next day or end
-                for next_day in range(day_num + 1, 8):
-                    next_pattern = f"day{next_day}:"
-                    if next_pattern in text[start:]:
-                        next_pos = text.index(next_pattern, start)
-                        if next_pos < end:
-                            end = next_pos
-                
-                day_section = text[start:end]
-                day_plan = self._parse_day_section(day_section, patient_id, day_num)
+            if day_num in sections:
+                day_plan = self._day_plan_from_meals(sections[day_num], patient_id, day_num)
             else:
-                # If no day-specific content, generate a patient-aware default for this day
-                if patient is not None:
-                    default_plan_text = self._generate_default_plan(patient, day_num)
-                    parsed_plan = self.parse_generated_plan(default_plan_text)
-                else:
-                    # Fallback to generic defaults if patient is unavailable
-                    default_plan_text = self._generate_default_plan_for_day(day_num)
-                    parsed_plan = self.parse_generated_plan(default_plan_text)
-                day_plan.breakfast = parsed_plan['breakfast']
-                day_plan.lunch = parsed_plan['lunch']
-                day_plan.dinner = parsed_plan['dinner']
-                day_plan.snacks = parsed_plan['snacks']
+                # If no day-specific content, use the patient-aware default for this day,
+                # or generic defaults if patient is unavailable
+                prakriti = patient.prakriti if patient is not None else None
+                day_plan = self._default_meal_plan(patient_id, day_num, prakriti)
             
             weekly_plans.append(day_plan)
         
@@ -709,9 +1205,8 @@ class HybridNeuralEngine:
             weekly_notes="Generated 7-day meal plan"
         )
 
-    def _parse_day_section(self, day_section: str, patient_id: str, day_num: int) -> MealPlan:
-        """Parse a single day section from generated text"""
-        plan = self.parse_generated_plan(day_section)
+    def _day_plan_from_meals(self, plan: Dict[str, List[str]], patient_id: str, day_num: int) -> MealPlan:
+        """Build the MealPlan of a parsed day section"""
         return MealPlan(
             patient_id=patient_id,
             day=day_num,
@@ -725,66 +1220,8 @@ class HybridNeuralEngine:
 
     def _generate_default_plan_for_day(self, day_num: int) -> str:
         """Generate a simple default plan for a specific day"""
-        base_foods = {
-            'breakfast': ['oatmeal', 'fruits', 'milk', 'nuts'],
-            'lunch': ['rice', 'dal', 'vegetables', 'yogurt'],
-            'dinner': ['soup', 'bread', 'salad'],
-            'snacks': ['fruits', 'nuts']
-        }
-        
-        # Add slight variation based on day
-        variation = (day_num - 1) % 3
-        
-        selected = {
-            'breakfast': base_foods['breakfast'][variation:variation+2],
-            'lunch': base_foods['lunch'][variation:variation+3],
-            'dinner': base_foods['dinner'][variation:variation+2],
-            'snacks': base_foods['snacks'][variation:variation+1]
-        }
-        
-        return self._format_recommendations(selected)
+        return self._format_recommendations(self._default_day(None, day_num))
 
     def parse_generated_plan(self, generated_text: str) -> Dict[str, List[str]]:
         """Parse the generated text into structured meal plan"""
-        plan = {
-            'breakfast': [],
-            'lunch': [],
-            'dinner': [],
-            'snacks': []
-        }
-
-        text = generated_text.lower()
-
-        # Strategy 1: Look for meal keywords followed by colon
-        for meal_type in ['breakfast', 'lunch', 'dinner', 'snacks']:
-            if f'{meal_type}:' in text:
-                start = text.index(f'{meal_type}:') + len(f'{meal_type}:')
-                end = len(text)
-                for next_meal in ['breakfast', 'lunch', 'dinner', 'snacks']:
-                    if next_meal != meal_type and f'{next_meal}:' in text[start:]:
-                        next_pos = text.index(f'{next_meal}:', start)
-                        if next_pos < end:
-                            end = next_pos
-
-                section = text[start:end].strip()
-                section = section.replace('</', ' ').replace('<', ' ')
-                items = [item.strip() for item in section.split(',')]
-                cleaned_items = []
-                for item in items:
-                    item = ' '.join(item.split())
-                    item = item.rstrip('.,;')
-                    if item and len(item) > 1 and not item.startswith('/'):
-                        cleaned_items.append(item)
-
-                plan[meal_type] = cleaned_items[:5]
-
-        # If no meals found, use default plan
-        if not any(plan.values()):
-            plan = {
-                'breakfast': ['oatmeal', 'fruits', 'milk'],
-                'lunch': ['rice', 'dal', 'vegetables', 'yogurt'],
-                'dinner': ['chapati', 'vegetables', 'soup'],
-                'snacks': ['nuts', 'fruits']
-            }
-
-        return plan
\ No newline at end of file
+        return parse_plan_text(generated_text)
\ No newline at end of file
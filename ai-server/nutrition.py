@@ -0,0 +1,89 @@
+"""
+Nutrient totals for meal plans.
+
+The food catalog is turned into a dense nutrient matrix (foods x nutrients)
+when the knowledge graph is built. A batch of plan days is turned into a
+sparse incidence matrix (days x foods, one catalog serving per resolved item),
+so the totals of every day of thousands of plans come from a single sparse
+matrix multiply; weekly totals are sums over the day axis.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from food_resolver import FoodResolver, MEAL_TYPES
+from model import Food, MealPlan
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fats', 'fiber')
+
+
+def totals_dict(values: Sequence[float]) -> Dict[str, float]:
+    return {name: round(float(value), 1) for name, value in zip(NUTRIENTS, values)}
+
+
+class NutrientMatrix:
+    """Dense per-food nutrient matrix over a food catalog"""
+
+    def __init__(self, foods: Sequence[Food], resolver: FoodResolver):
+        self.resolver = resolver
+        self.index = {food.id: i for i, food in enumerate(foods)}
+        self.matrix = np.array(
+            [[getattr(food, name) or 0.0 for name in NUTRIENTS] for food in foods],
+            dtype=np.float32
+        ).reshape(-1, len(NUTRIENTS))
+
+    def day_items(self, day: Dict[str, List[str]]) -> Tuple[List[int], int]:
+        """Catalog rows of a day's items and the number of unresolved items"""
+        rows, unresolved = [], 0
+        for meal in MEAL_TYPES:
+            for resolution in self.resolver.resolve_many(day.get(meal, [])):
+                row = self.index.get(resolution.food_id, -1) if resolution.food_id else -1
+                if row >= 0:
+                    rows.append(row)
+                else:
+                    unresolved += 1
+        return rows, unresolved
+
+    def day_totals(self, days: Sequence[Dict[str, List[str]]]) -> Tuple[np.ndarray, np.ndarray]:
+        """(days x nutrients) totals and unresolved item counts per day"""
+        day_ids, food_ids = [], []
+        unresolved = np.zeros(len(days), dtype=np.int64)
+        for d, day in enumerate(days):
+            rows, unresolved[d] = self.day_items(day)
+            day_ids.extend([d] * len(rows))
+            food_ids.extend(rows)
+        if not day_ids or not len(self.matrix):
+            return np.zeros((len(days), len(NUTRIENTS)), dtype=np.float32), unresolved
+        incidence = torch.sparse_coo_tensor(
+            torch.tensor([day_ids, food_ids], dtype=torch.int64),
+            torch.ones(len(day_ids), dtype=torch.float32),
+            size=(len(days), len(self.matrix))
+        )
+        totals = torch.sparse.mm(incidence, torch.from_numpy(self.matrix))
+        return totals.numpy(), unresolved
+
+    def plan_totals(self, plans: Sequence[Sequence[Dict[str, List[str]]]]) -> List[Dict]:
+        """Per-day and whole-plan totals for many plans in one pass"""
+        flat = [day for plan in plans for day in plan]
+        totals, unresolved = self.day_totals(flat)
+        reports, start = [], 0
+        for plan in plans:
+            end = start + len(plan)
+            reports.append({
+                'days': [totals_dict(row) for row in totals[start:end]],
+                'total': totals_dict(totals[start:end].sum(axis=0)),
+                'daily_average': totals_dict(totals[start:end].mean(axis=0) if len(plan) else np.zeros(len(NUTRIENTS))),
+                'unresolved_items': int(unresolved[start:end].sum()),
+            })
+            start = end
+        return reports
+
+    def annotate(self, meal_plans: Sequence[MealPlan]) -> np.ndarray:
+        """Set `nutrition` on every MealPlan; returns the (days x nutrients) totals"""
+        totals, _ = self.day_totals([{meal: getattr(plan, meal) for meal in MEAL_TYPES}
+                                     for plan in meal_plans])
+        for plan, row in zip(meal_plans, totals):
+            plan.nutrition = totals_dict(row)
+        return totals
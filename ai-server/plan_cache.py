@@ -0,0 +1,210 @@
+"""
+Persistent plan cache shared by every worker process on a host.
+
+Decoded plans are stored in a SQLite database in WAL mode, so any number of
+uvicorn workers can read concurrently while one writes, and the cache
+survives restarts and deploys. A key is the SHA-256 of
+
+    normalized patient signature   age, gender, BMI, lifestyle, prakriti,
+                                   conditions, allergies (not the patient ID)
+    generation parameters          kind, day, temperature, max length,
+                                   candidates, adapter, ...
+    model fingerprint              weights directory, file sizes and mtimes
+
+Plans are cached as decoded, before catalog resolution, safety filtering and
+nutrition totals, which are cheap and run on every request. The table is
+capped at `max_entries` (checked every EVICT_EVERY writes of a process); the
+least recently used rows are evicted. A hit is a read-only query; access
+times and hit counts are queued in the process and written in one batch per
+TOUCH_BATCH_SECONDS, so hits do not contend for the database's single writer
+lock.
+"""
+
+import dataclasses
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from model import MealPlan, Patient, WeeklyMealPlan
+
+EVICT_EVERY = 32  # puts between eviction passes, per process
+TOUCH_BATCH_SECONDS = 30.0  # queued access-time refreshes are written together
+BUSY_TIMEOUT_MS = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS plans_last_access ON plans (last_access);
+"""
+
+
+def _normalized(items: List[str]) -> List[str]:
+    return sorted({str(item).strip().lower() for item in items} - {'', 'none', 'nil', 'no', 'nan'})
+
+
+def patient_signature(patient: Patient) -> Dict[str, Any]:
+    """The patient fields the model input depends on, normalized"""
+    return {
+        'age': int(patient.age),
+        'gender': str(patient.gender).strip().lower(),
+        'bmi': round(float(patient.bmi), 1),
+        'lifestyle': str(patient.lifestyle).strip().lower(),
+        'prakriti': str(patient.prakriti).strip().lower(),
+        'conditions': _normalized(patient.health_conditions),
+        'allergies': _normalized(patient.allergies),
+    }
+
+
+def model_fingerprint(model_dir: Optional[Union[str, Path]], model_name: str = "") -> str:
+    """Identity of the loaded weights: directory plus size and mtime of its files"""
+    if model_dir is None or not Path(model_dir).is_dir():
+        return f"base:{model_name}"
+    files = sorted(p for p in Path(model_dir).iterdir() if p.is_file())
+    stats = [(p.name, p.stat().st_size, int(p.stat().st_mtime)) for p in files]
+    digest = hashlib.sha256(json.dumps(stats).encode()).hexdigest()[:16]
+    return f"{Path(model_dir).resolve()}:{digest}"
+
+
+def weekly_plan_from_dict(data: Dict) -> WeeklyMealPlan:
+    days = [MealPlan(**day) for day in data['days']]
+    alternatives = [weekly_plan_from_dict(alt) for alt in data.get('alternatives', [])]
+    return WeeklyMealPlan(**{**data, 'days': days, 'alternatives': alternatives})
+
+
+class PlanCache:
+    """SQLite (WAL) cache of decoded plans with LRU eviction"""
+
+    def __init__(self, path: Union[str, Path], max_entries: int = 10000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._touch_lock = threading.Lock()
+        self._pending: Dict[str, int] = {}  # key -> hits since the last flush
+        self._last_flush = time.time()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit, WAL journal"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(kind: str, patient: Patient, params: Dict[str, Any], fingerprint: str) -> str:
+        payload = json.dumps(
+            {'kind': kind, 'patient': patient_signature(patient), 'params': params, 'model': fingerprint},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached JSON value, or None (also when the database stays locked)"""
+        try:
+            row = self._connection().execute("SELECT value FROM plans WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠ Plan cache read failed: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(key)
+        return json.loads(row[0])
+
+    def _touch(self, key: str):
+        """Queue an access-time refresh; flush the queue in batches"""
+        now = time.time()
+        with self._touch_lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+            if now - self._last_flush < TOUCH_BATCH_SECONDS:
+                return
+            pending, self._pending, self._last_flush = self._pending, {}, now
+        self._flush(pending, now)
+
+    def _flush(self, pending: Dict[str, int], now: float):
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "UPDATE plans SET last_access = ?, hits = hits + ? WHERE key = ?",
+                    [(now, hits, key) for key, hits in pending.items()]
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            # Access times are advisory; a lost refresh only ages the rows
+            print(f"⚠ Plan cache touch failed: {e}")
+
+    def put(self, key: str, value: Any):
+        now = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO plans (key, value, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+        except sqlite3.Error as e:
+            print(f"⚠ Plan cache write failed: {e}")
+            return
+        self._puts += 1
+        if self._puts % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop the least recently used rows beyond max_entries; returns the number removed"""
+        with self._touch_lock:
+            pending, self._pending, self._last_flush = self._pending, {}, time.time()
+        if pending:
+            self._flush(pending, time.time())
+        cursor = self._connection().execute(
+            "DELETE FROM plans WHERE key IN "
+            "(SELECT key FROM plans ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        return cursor.rowcount
+
+    def get_weekly(self, key: str, patient_id: str) -> Optional[WeeklyMealPlan]:
+        data = self.get(key)
+        if data is None:
+            return None
+        weekly_plan = weekly_plan_from_dict(data)
+        for plan in [weekly_plan, *weekly_plan.alternatives]:
+            plan.patient_id = patient_id
+            for day in plan.days:
+                day.patient_id = patient_id
+        return weekly_plan
+
+    def put_weekly(self, key: str, weekly_plan: WeeklyMealPlan):
+        self.put(key, dataclasses.asdict(weekly_plan))
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._connection().execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'path': str(self.path),
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
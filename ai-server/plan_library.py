@@ -0,0 +1,154 @@
+"""
+On-disk library of weekly plans for patient archetypes.
+
+An archetype is prakriti x lifestyle x major condition x BMI band, e.g.
+`kapha|sedentary|diabetes|overweight` (4 x 3 x 6 x 4 = 288 archetypes).
+`build_plan_library.py` generates and validates one plan per archetype offline
+and writes them to `plan_library.json`, keyed by archetype. In
+`engine_mode="library"` the engine answers from this table and only generates
+for off-grid patients (e.g. Vata-Pitta prakriti or several conditions).
+Allergies are not part of the archetype; the serving-time safety filter
+adapts library plans to them.
+"""
+
+import json
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from model import MealPlan, Patient, WeeklyMealPlan
+from plan_parser import MEAL_TYPES
+
+PRAKRITIS = ('vata', 'pitta', 'kapha', 'mixed')
+LIFESTYLES = ('sedentary', 'moderate', 'active')
+CONDITIONS = ('none', 'hypertension', 'obesity', 'diabetes', 'pcos', 'kidney issues')
+CONDITION_NAMES = {'pcos': 'PCOS'}  # spelling in patients.csv when not title case
+# (upper bound, band name, representative BMI)
+BMI_BANDS = (
+    (18.5, 'underweight', 17.5),
+    (25.0, 'normal', 22.0),
+    (30.0, 'overweight', 27.5),
+    (math.inf, 'obese', 32.5),
+)
+NONE_VALUES = ('', 'none', 'nil', 'no', 'nan')
+LIBRARY_VERSION = 1
+
+
+def bmi_band(bmi: float) -> str:
+    return next(name for upper, name, _ in BMI_BANDS if bmi < upper)
+
+
+def archetype_key(patient: Patient) -> Optional[str]:
+    """Archetype of `patient`, or None when the patient is off the grid"""
+    prakriti = str(patient.prakriti).strip().lower()
+    lifestyle = str(patient.lifestyle).strip().lower()
+    conditions = [c for c in (str(c).strip().lower() for c in patient.health_conditions) if c not in NONE_VALUES]
+    condition = conditions[0] if len(conditions) == 1 else 'none' if not conditions else None
+    if prakriti not in PRAKRITIS or lifestyle not in LIFESTYLES or condition not in CONDITIONS or patient.bmi <= 0:
+        return None
+    return '|'.join((prakriti, lifestyle, condition, bmi_band(patient.bmi)))
+
+
+def archetype_grid() -> List[str]:
+    return [
+        '|'.join((prakriti, lifestyle, condition, band))
+        for prakriti in PRAKRITIS
+        for lifestyle in LIFESTYLES
+        for condition in CONDITIONS
+        for _, band, _ in BMI_BANDS
+    ]
+
+
+def archetype_patients(key: str, genders=('M', 'F'), age: int = 40, height: float = 165.0) -> List[Patient]:
+    """Representative patients of an archetype (one per gender, at the band's typical BMI)"""
+    prakriti, lifestyle, condition, band = key.split('|')
+    bmi = next(value for _, name, value in BMI_BANDS if name == band)
+    return [
+        Patient(
+            id=f"archetype:{key}:{gender}",
+            age=age,
+            gender=gender,
+            weight=round(bmi * (height / 100.0) ** 2, 1),
+            height=height,
+            bmi=bmi,
+            lifestyle=lifestyle,
+            prakriti=prakriti.capitalize(),
+            health_conditions=[] if condition == 'none' else [CONDITION_NAMES.get(condition, condition.title())],
+            allergies=[],
+            preferred_cuisine=[]
+        )
+        for gender in genders
+    ]
+
+
+class PlanLibrary:
+    """Weekly plans by archetype, loaded from plan_library.json"""
+
+    def __init__(self, plans: Optional[Dict[str, Dict]] = None, metadata: Optional[Dict] = None):
+        self.plans: Dict[str, Dict] = plans or {}
+        self.metadata: Dict = metadata or {}
+
+    def __len__(self) -> int:
+        return len(self.plans)
+
+    def add(self, key: str, weekly_plan: WeeklyMealPlan, source: str, score: Optional[float] = None):
+        self.plans[key] = {
+            'source': source,
+            'score': score,
+            'days': [{meal: list(getattr(day, meal)) for meal in MEAL_TYPES} for day in weekly_plan.days],
+        }
+
+    def save(self, path: Union[str, Path]):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': LIBRARY_VERSION,
+                'created': datetime.now().isoformat(),
+                **self.metadata,
+                'plans': self.plans,
+            }, f, indent=1, ensure_ascii=False)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "PlanLibrary":
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != LIBRARY_VERSION:
+            raise ValueError(f"Unsupported plan library version: {data.get('version')}")
+        plans = data.pop('plans', {})
+        return cls(plans, data)
+
+    def days(self, patient: Patient) -> Optional[List[Dict[str, List[str]]]]:
+        """Meals of each day of the patient's archetype plan (None when off-grid or missing)"""
+        key = archetype_key(patient)
+        entry = self.plans.get(key) if key else None
+        return entry['days'] if entry else None
+
+    def weekly_plan(self, patient: Patient) -> Optional[WeeklyMealPlan]:
+        """Copy of the patient's archetype plan, addressed to the patient"""
+        key = archetype_key(patient)
+        entry = self.plans.get(key) if key else None
+        if entry is None:
+            return None
+        days = [
+            MealPlan(
+                patient_id=patient.id,
+                day=day,
+                breakfast=list(meals.get('breakfast', [])),
+                lunch=list(meals.get('lunch', [])),
+                dinner=list(meals.get('dinner', [])),
+                snacks=list(meals.get('snacks', [])),
+                restrictions=[],
+                doctor_notes=f"Day {day} plan"
+            )
+            for day, meals in enumerate(entry['days'], 1)
+        ]
+        return WeeklyMealPlan(
+            patient_id=patient.id,
+            days=days,
+            weekly_notes=f"Library plan for archetype {key}",
+            score=entry.get('score')
+        )
@@ -0,0 +1,203 @@
+"""
+Single-pass parser for generated meal plan text.
+
+Generated plans look like
+
+    day1: breakfast: oatmeal, dates | lunch: rice, moong dal | ... | day2: ...
+
+The parser tokenizes the (lowercased) text once with a regex for the day and
+meal markers, then derives every day and meal-slot span from the marker
+positions, without re-scanning the text per day and per meal. The spans follow
+the original substring-search rules exactly:
+
+    - a day section starts after the first 'dayN:' and ends at the first
+      later 'dayM:' with M > N (or at the end of the text)
+    - within a section, a meal starts after the first '<meal>:' and ends at
+      the next marker of a different meal (day markers are plain text there)
+
+`StreamingPlanParser` applies the same rules to a growing token buffer, so
+decoding can report finished days before generation ends.
+"""
+
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner', 'snacks')
+MAX_ITEMS_PER_MEAL = 5
+
+# Fallback when a section names no meals at all
+DEFAULT_MEALS = {
+    'breakfast': ['oatmeal', 'fruits', 'milk'],
+    'lunch': ['rice', 'dal', 'vegetables', 'yogurt'],
+    'dinner': ['chapati', 'vegetables', 'soup'],
+    'snacks': ['nuts', 'fruits']
+}
+
+# Plain literal alternatives (no groups) let the regex engine skip ahead on the first character
+_MARKER = re.compile(r'day[1-7]:|breakfast:|lunch:|dinner:|snacks:')
+_MAX_MARKER_LENGTH = max(len(m) for m in MEAL_TYPES) + 1
+# Marker text -> day number (> 0) or -(meal id + 1)
+_MARKER_CODES = {
+    **{f"day{day}:": day for day in range(1, 8)},
+    **{f"{meal}:": -(i + 1) for i, meal in enumerate(MEAL_TYPES)},
+}
+
+
+class PlanMarkers:
+    """Positions of the day and meal markers of one text, in text order"""
+
+    def __init__(self):
+        # Day markers: (day, start, end)
+        self.days: List[Tuple[int, int, int]] = []
+        # Meal markers: parallel lists of start, end and meal id
+        self.meal_starts: List[int] = []
+        self.meal_ends: List[int] = []
+        self.meal_ids: List[int] = []
+
+    def scan(self, text: str, pos: int = 0) -> 'PlanMarkers':
+        """Add the markers found in `text` from `pos` on"""
+        days, meal_starts, meal_ends, meal_ids = self.days, self.meal_starts, self.meal_ends, self.meal_ids
+        for match in _MARKER.finditer(text, pos):
+            code = _MARKER_CODES[match.group()]
+            start, end = match.span()
+            if code > 0:
+                days.append((code, start, end))
+            else:
+                meal_starts.append(start)
+                meal_ends.append(end)
+                meal_ids.append(-code - 1)
+        return self
+
+    def next_other_meal(self) -> List[int]:
+        """For every meal marker, the index of the next marker of a different meal"""
+        count = len(self.meal_ids)
+        following = [count] * count
+        for k in range(count - 2, -1, -1):
+            if self.meal_ids[k + 1] != self.meal_ids[k]:
+                following[k] = k + 1
+            else:
+                following[k] = following[k + 1]
+        return following
+
+    def day_spans(self) -> Dict[int, Tuple[int, int]]:
+        """Section (start, end) per day present, ending at the first later higher day"""
+        spans: Dict[int, Tuple[int, int]] = {}
+        pending: List[Tuple[int, int]] = []  # (day, start) of sections still open
+        for day, start, end in self.days:
+            still_open = []
+            for open_day, open_start in pending:
+                if day > open_day:
+                    spans[open_day] = (open_start, start)
+                else:
+                    still_open.append((open_day, open_start))
+            pending = still_open
+            if day not in spans and all(day != d for d, _ in pending):
+                pending.append((day, end))
+        for open_day, open_start in pending:
+            spans[open_day] = (open_start, None)
+        return spans
+
+
+def split_items(section: str) -> List[str]:
+    """Clean, comma-separated items of one meal section (at most MAX_ITEMS_PER_MEAL)"""
+    if '<' in section:
+        section = section.replace('</', ' ').replace('<', ' ')
+    items = []
+    for item in section.split(','):
+        item = ' '.join(item.split()).rstrip('.,;')
+        if len(item) > 1 and item[0] != '/':
+            items.append(item)
+            if len(items) == MAX_ITEMS_PER_MEAL:
+                break
+    return items
+
+
+def _meals_in_span(text: str, markers: PlanMarkers, following: List[int],
+                   start: int, end: int) -> Dict[str, List[str]]:
+    plan: Dict[str, List[str]] = {meal: [] for meal in MEAL_TYPES}
+    first = bisect_left(markers.meal_starts, start)
+    seen = 0
+    k = first
+    # Walk the meal markers of the span until the first of every meal is found
+    while k < len(markers.meal_starts) and markers.meal_ends[k] <= end and seen != 0b1111:
+        meal_id = markers.meal_ids[k]
+        if not seen & (1 << meal_id):
+            seen |= 1 << meal_id
+            nxt = following[k]
+            section_end = end
+            if nxt < len(markers.meal_starts) and markers.meal_ends[nxt] <= end:
+                section_end = markers.meal_starts[nxt]
+            plan[MEAL_TYPES[meal_id]] = split_items(text[markers.meal_ends[k]:section_end])
+        k += 1
+    if not any(plan.values()):
+        plan = {meal: list(items) for meal, items in DEFAULT_MEALS.items()}
+    return plan
+
+
+def parse_plan_text(text: str) -> Dict[str, List[str]]:
+    """Meal items of a single-day plan (defaults when no meal is named)"""
+    text = text.lower()
+    markers = PlanMarkers().scan(text)
+    return _meals_in_span(text, markers, markers.next_other_meal(), 0, len(text))
+
+
+def _parse_weekly(text: str, markers: PlanMarkers) -> Dict[int, Dict[str, List[str]]]:
+    following = markers.next_other_meal()
+    return {
+        day: _meals_in_span(text, markers, following, start, len(text) if end is None else end)
+        for day, (start, end) in sorted(markers.day_spans().items())
+    }
+
+
+def parse_weekly_text(text: str) -> Dict[int, Dict[str, List[str]]]:
+    """Meal items per day for the days that have a 'dayN:' section"""
+    text = text.lower()
+    return _parse_weekly(text, PlanMarkers().scan(text))
+
+
+class StreamingPlanParser:
+    """Incremental parser over a growing buffer of decoded text.
+
+    `feed` only scans the new text (plus a marker-length overlap for markers
+    split across chunks). Days whose section is already closed by a later,
+    higher day marker are final and available from `completed_days`.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.markers = PlanMarkers()
+        self._scanned = 0
+
+    def feed(self, chunk: str) -> List[int]:
+        """Append decoded text; returns the days that became final"""
+        before = set(self.completed_days())
+        self.text += chunk.lower()
+        scan_from = max(self._scanned - (_MAX_MARKER_LENGTH - 1), self._last_marker_end())
+        self.markers.scan(self.text, scan_from)
+        self._scanned = len(self.text)
+        return [day for day in self.completed_days() if day not in before]
+
+    def _last_marker_end(self) -> int:
+        last_day = self.markers.days[-1][2] if self.markers.days else 0
+        last_meal = self.markers.meal_ends[-1] if self.markers.meal_ends else 0
+        return max(last_day, last_meal)
+
+    def completed_days(self) -> List[int]:
+        return sorted(day for day, (_, end) in self.markers.day_spans().items() if end is not None)
+
+    def day(self, day: int) -> Optional[Dict[str, List[str]]]:
+        """Meal items of one day, or None while the day has no section yet"""
+        span = self.markers.day_spans().get(day)
+        if span is None:
+            return None
+        start, end = span
+        return _meals_in_span(self.text, self.markers, self.markers.next_other_meal(),
+                              start, len(self.text) if end is None else end)
+
+    def weekly(self) -> Dict[int, Dict[str, List[str]]]:
+        return _parse_weekly(self.text, self.markers)
+
+    def daily(self) -> Dict[str, List[str]]:
+        return _meals_in_span(self.text, self.markers, self.markers.next_other_meal(),
+                              0, len(self.text))
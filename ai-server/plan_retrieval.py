@@ -0,0 +1,159 @@
+"""
+Nearest-neighbour retrieval of doctor-authored weekly plans.
+
+`doctor_plans.csv` holds weeks of plans written by doctors for the patients
+of `patients.csv`. Every week is indexed under its patient's feature vector:
+
+    age, BMI            scaled so a step of AGE_SCALE years / BMI_SCALE points
+                        counts like one category mismatch
+    gender, lifestyle   one-hot
+    prakriti            dosha weights (Vata-Pitta -> 0.5 vata + 0.5 pitta)
+    conditions,         multi-hot over the values seen in the indexed patients
+    allergies
+
+A new patient is answered with copies of the weeks of the closest patients
+(brute-force squared distance, one matrix operation for a few thousand weeks).
+The engine then adapts them with the usual allergy/contraindication filter.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from model import MealPlan, Patient, WeeklyMealPlan
+from plan_scoring import patient_dosha_vector
+
+AGE_SCALE = 10.0
+BMI_SCALE = 4.0
+GENDERS = ('m', 'f')
+LIFESTYLES = ('sedentary', 'moderate', 'active')
+NONE_VALUES = ('', 'none', 'nil', 'no', 'nan')
+
+# Relative weight of each feature group in the distance
+FEATURE_WEIGHTS = {
+    'age': 1.0,
+    'bmi': 1.0,
+    'gender': 0.5,
+    'lifestyle': 0.75,
+    'prakriti': 2.0,
+    'conditions': 2.0,
+    'allergies': 1.5,
+}
+
+
+def _values(items: Sequence[str]) -> List[str]:
+    values = (str(item).strip().lower() for item in items)
+    return [value for value in values if value not in NONE_VALUES]
+
+
+def _gender(gender: str) -> str:
+    gender = str(gender).strip().lower()
+    return gender[:1] if gender in ('m', 'f', 'male', 'female') else ''
+
+
+class PatientVectorizer:
+    """Weighted patient feature vectors over a fixed vocabulary"""
+
+    def __init__(self, patients: Sequence[Patient]):
+        self.conditions = sorted({c for p in patients for c in _values(p.health_conditions)})
+        self.allergies = sorted({a for p in patients for a in _values(p.allergies)})
+        self.condition_ids = {c: i for i, c in enumerate(self.conditions)}
+        self.allergy_ids = {a: i for i, a in enumerate(self.allergies)}
+
+    def vector(self, patient: Patient) -> np.ndarray:
+        lifestyle = str(patient.lifestyle).lower()
+        conditions = np.zeros(len(self.conditions), dtype=np.float32)
+        for condition in _values(patient.health_conditions):
+            if condition in self.condition_ids:
+                conditions[self.condition_ids[condition]] = 1.0
+        allergies = np.zeros(len(self.allergies), dtype=np.float32)
+        for allergy in _values(patient.allergies):
+            if allergy in self.allergy_ids:
+                allergies[self.allergy_ids[allergy]] = 1.0
+        parts = {
+            'age': np.array([patient.age / AGE_SCALE], dtype=np.float32),
+            'bmi': np.array([patient.bmi / BMI_SCALE], dtype=np.float32),
+            'gender': np.array([_gender(patient.gender) == g for g in GENDERS], dtype=np.float32),
+            'lifestyle': np.array([key in lifestyle for key in LIFESTYLES], dtype=np.float32),
+            'prakriti': patient_dosha_vector(patient),
+            'conditions': conditions,
+            'allergies': allergies,
+        }
+        return np.concatenate([FEATURE_WEIGHTS[name] * part for name, part in parts.items()])
+
+
+def group_weeks(plans: Sequence[MealPlan]) -> List[List[MealPlan]]:
+    """Windows of 7 consecutive days per patient, in file order (incomplete windows are dropped)"""
+    weeks, patient_id, window = [], None, []
+    for plan in plans:
+        if plan.patient_id != patient_id:
+            patient_id, window = plan.patient_id, []
+        window.append(plan)
+        if len(window) == 7:
+            weeks.append(window)
+            window = []
+    return weeks
+
+
+class PlanRetriever:
+    """kNN index of doctor-authored weeks over patient features"""
+
+    def __init__(self, patients: Sequence[Patient], plans: Sequence[MealPlan]):
+        by_id = {patient.id: patient for patient in patients}
+        self.vectorizer = PatientVectorizer(patients)
+        self.weeks: List[List[MealPlan]] = []
+        self.sources: List[str] = []
+        vectors = []
+        for week in group_weeks(plans):
+            source = by_id.get(week[0].patient_id)
+            if source is None:
+                continue
+            self.weeks.append(week)
+            self.sources.append(source.id)
+            vectors.append(self.vectorizer.vector(source))
+        self.matrix = np.array(vectors, dtype=np.float32).reshape(len(vectors), -1)
+
+    def __len__(self) -> int:
+        return len(self.weeks)
+
+    def nearest(self, patient: Patient, k: int = 1) -> List[Tuple[int, float]]:
+        """(week index, distance) of the k closest weeks, closest first"""
+        if not self.weeks:
+            return []
+        distances = ((self.matrix - self.vectorizer.vector(patient)) ** 2).sum(axis=1)
+        k = min(k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind='stable')]
+        return [(int(i), float(np.sqrt(distances[i]))) for i in top]
+
+    def retrieve(self, patient: Patient, k: int = 1) -> List[WeeklyMealPlan]:
+        """Copies of the k closest weeks, addressed to `patient`"""
+        plans = []
+        for i, distance in self.nearest(patient, k):
+            days = [
+                MealPlan(
+                    patient_id=patient.id,
+                    day=day,
+                    breakfast=list(plan.breakfast),
+                    lunch=list(plan.lunch),
+                    dinner=list(plan.dinner),
+                    snacks=list(plan.snacks),
+                    restrictions=list(plan.restrictions),
+                    doctor_notes=plan.doctor_notes
+                )
+                for day, plan in enumerate(self.weeks[i], 1)
+            ]
+            plans.append(WeeklyMealPlan(
+                patient_id=patient.id,
+                days=days,
+                weekly_notes=f"Doctor plan of similar patient {self.sources[i]} (distance {distance:.2f})"
+            ))
+        return plans
+
+    def retrieve_day(self, patient: Patient, day: int, k: int = 1) -> List[Dict[str, List[str]]]:
+        """Meals of day `day` of the k closest weeks"""
+        return [
+            {meal: list(getattr(self.weeks[i][(day - 1) % 7], meal))
+             for meal in ('breakfast', 'lunch', 'dinner', 'snacks')}
+            for i, _ in self.nearest(patient, k)
+        ]
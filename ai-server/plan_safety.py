@@ -0,0 +1,231 @@
+"""
+Allergy and contraindication post-filter for generated meal plans.
+
+Every catalog food gets a bitset of safety flags, precomputed once:
+
+    allergen flags       keyword match on the food's names and category
+                         (milk, gluten, peanut, ... see ALLERGEN_KEYWORDS)
+    contraindication     keyword match on the food's contraindications
+    flags                (pregnancy, kidney, blood sugar, ...)
+
+A request builds one patient mask from `Patient.allergies` and
+`Patient.health_conditions`. A weekly plan is laid out as a
+(days x meals x items) array of catalog indices (via `FoodResolver`), so all
+violations are found with one `flags[idx] & mask` pass. Flags beyond the 64
+bits (rare allergy strings sent by clients) get a boolean column computed for
+the request instead of a bit. Items the resolver cannot link exactly (dishes
+like "rice with cashews") are also checked by keyword. Violating items are flagged, removed, or
+replaced by the best safe food of the same category for the patient's doshas.
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from food_resolver import FoodResolver, MEAL_TYPES
+from model import Food, MealPlan, Patient
+from plan_scoring import (ALLERGEN_KEYWORDS, DOSHAS, allergen_entry, effect_sign, keyword_pattern,
+                          patient_dosha_vector)
+
+# Patient condition (substring of Patient.health_conditions) -> contraindication keywords
+CONDITION_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    'pregnan': ('pregnancy', 'uterine', 'miscarriage'),
+    'diabet': ('hypoglycemia', 'blood sugar'),
+    'kidney': ('kidney', 'oxalate'),
+    'ulcer': ('gastric ulcer', 'hot spices'),
+    'acidity': ('gastric ulcer', 'hot spices'),
+    'g6pd': ('g6pd', 'favism'),
+}
+
+SAFETY_MODES = ('flag', 'remove', 'replace')
+MAX_FLAGS = 64  # flags are stored in one uint64 per food
+
+
+def patient_flags(patient: Patient) -> Dict[str, Tuple[str, Tuple[str, ...]]]:
+    """Flag name -> (text field to match, keywords) for the patient's allergies and conditions"""
+    flags: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+    for allergy in patient.allergies:
+        entry = allergen_entry(allergy)
+        if entry is not None:
+            key, keywords = entry
+            flags[f"allergy:{key}"] = ('names', keywords)
+    for condition in patient.health_conditions:
+        lowered = str(condition).strip().lower()
+        for marker, keywords in CONDITION_KEYWORDS.items():
+            if marker in lowered:
+                flags[f"condition:{marker}"] = ('contraindications', keywords)
+    return flags
+
+
+class SafetyIndex:
+    """Per-food safety flag bitsets over a food catalog"""
+
+    def __init__(self, foods: Sequence[Food], resolver: FoodResolver):
+        self.foods = list(foods)
+        self.resolver = resolver
+        self.index = {food.id: i for i, food in enumerate(self.foods)}
+        self.texts = {
+            'names': [
+                ' '.join([food.name, *getattr(food, 'vernacular_names', []), food.category]).lower()
+                for food in self.foods
+            ],
+            'contraindications': [' '.join(food.contraindications).lower() for food in self.foods],
+        }
+        self.categories = np.array([food.category.lower() for food in self.foods], dtype=object)
+        self.dosha_effects = np.array(
+            [[effect_sign(food.dosha_effects.get(d, food.dosha_effects.get(d.capitalize())))
+              for d in DOSHAS] for food in self.foods],
+            dtype=np.float32
+        ).reshape(-1, len(DOSHAS))
+        self.flags = np.zeros(len(self.foods), dtype=np.uint64)
+        self.flag_bits: Dict[str, int] = {}
+        self.patterns: Dict[str, 're.Pattern'] = {}
+        self._lock = threading.Lock()
+        # Precompute the known allergens and conditions
+        for allergen, keywords in ALLERGEN_KEYWORDS.items():
+            self.ensure_flag(f"allergy:{allergen}", 'names', keywords)
+        for marker, keywords in CONDITION_KEYWORDS.items():
+            self.ensure_flag(f"condition:{marker}", 'contraindications', keywords)
+
+    def _column(self, field: str, keywords: Sequence[str]) -> Tuple['re.Pattern', np.ndarray]:
+        """Keyword pattern and per-food matches of a flag"""
+        pattern = keyword_pattern(keywords)
+        return pattern, np.array([bool(pattern.search(text)) for text in self.texts[field]], dtype=bool)
+
+    def ensure_flag(self, name: str, field: str, keywords: Sequence[str]) -> Optional[int]:
+        """Bit of flag `name`, computing its column on first use (None when out of bits)"""
+        bit = self.flag_bits.get(name)
+        if bit is not None:
+            return bit
+        with self._lock:
+            if name in self.flag_bits:
+                return self.flag_bits[name]
+            if len(self.flag_bits) >= MAX_FLAGS:
+                return None
+            bit = len(self.flag_bits)
+            pattern, hits = self._column(field, keywords)
+            self.flags[hits] |= np.uint64(1 << bit)
+            self.patterns[name] = pattern
+            self.flag_bits[name] = bit
+        return bit
+
+    def patient_mask(self, patient: Patient
+                     ) -> Tuple[np.uint64, Dict[int, str], Dict[str, Tuple['re.Pattern', np.ndarray]]]:
+        """Bitmask of the flags unsafe for `patient`, bit -> flag name, and the
+        (pattern, per-food matches) of the patient's flags that got no bit"""
+        mask = 0
+        names: Dict[int, str] = {}
+        extra: Dict[str, Tuple['re.Pattern', np.ndarray]] = {}
+        for name, (field, keywords) in patient_flags(patient).items():
+            bit = self.ensure_flag(name, field, keywords)
+            if bit is not None:
+                mask |= 1 << bit
+                names[bit] = name
+            else:
+                extra[name] = self._column(field, keywords)
+        return np.uint64(mask), names, extra
+
+    def _unsafe(self, mask: np.uint64, extra: Dict[str, Tuple['re.Pattern', np.ndarray]]) -> np.ndarray:
+        unsafe = (self.flags & mask) != 0
+        for _, hits in extra.values():
+            unsafe |= hits
+        return unsafe
+
+    def unsafe_foods(self, patient: Patient) -> np.ndarray:
+        """Boolean per catalog food, True when it is unsafe for `patient`"""
+        mask, _, extra = self.patient_mask(patient)
+        return self._unsafe(mask, extra)
+
+    def _reasons(self, flags: int, names: Dict[int, str], extra_names: Sequence[str] = ()) -> str:
+        flagged = [names[bit] for bit in sorted(names) if flags >> bit & 1] + list(extra_names)
+        return ', '.join(name.split(':', 1)[1] for name in flagged)
+
+    def best_alternatives(self, patient: Patient, safe: np.ndarray) -> Dict[str, int]:
+        """Most dosha-compatible food per category among the `safe` ones"""
+        compatibility = -(self.dosha_effects @ patient_dosha_vector(patient))
+        best: Dict[str, int] = {}
+        for i in np.argsort(-compatibility, kind='stable'):
+            if safe[i]:
+                best.setdefault(self.categories[i], int(i))
+        return best
+
+    def filter_plans(self, patient: Patient, plans: List[MealPlan], mode: str = 'remove') -> int:
+        """Flag, remove or replace unsafe items of `plans` in place; returns the number of violations.
+
+        Notes on every violation are appended to the plan's `safety_notes`.
+        """
+        if mode not in SAFETY_MODES:
+            raise ValueError(f"Unknown safety mode: {mode} (expected one of {SAFETY_MODES})")
+        mask, names, extra = self.patient_mask(patient)
+        if not (mask or extra) or not plans:
+            return 0
+
+        # Lay the plans out as (plans, meals, items) catalog indices, -1 when unresolved
+        width = max(len(getattr(plan, meal)) for plan in plans for meal in MEAL_TYPES) or 1
+        idx = np.full((len(plans), len(MEAL_TYPES), width), -1, dtype=np.int64)
+        inexact = np.zeros(idx.shape, dtype=bool)
+        for p, plan in enumerate(plans):
+            for m, meal in enumerate(MEAL_TYPES):
+                for k, resolution in enumerate(self.resolver.resolve_many(getattr(plan, meal))):
+                    inexact[p, m, k] = resolution.method != 'exact'
+                    if resolution.food_id is not None:
+                        idx[p, m, k] = self.index.get(resolution.food_id, -1)
+
+        resolved = idx >= 0
+        item_flags = np.zeros(idx.shape, dtype=np.uint64)
+        if len(self.foods):
+            item_flags = np.where(resolved, self.flags[np.where(resolved, idx, 0)], item_flags) & mask
+        # Flags without a bit: one boolean layer each
+        extra_hits = {
+            name: resolved & hits[np.where(resolved, idx, 0)] if len(self.foods) else np.zeros(idx.shape, dtype=bool)
+            for name, (_, hits) in extra.items()
+        }
+        # Unresolved items and partial matches: keyword check on the item text
+        for p, m, k in zip(*np.nonzero(inexact)):
+            text = getattr(plans[p], MEAL_TYPES[m])[k].lower()
+            for bit, name in names.items():
+                if self.patterns[name].search(text):
+                    item_flags[p, m, k] |= np.uint64(1 << bit)
+            for name, (pattern, _) in extra.items():
+                if pattern.search(text):
+                    extra_hits[name][p, m, k] = True
+        violations = item_flags != 0
+        for hits in extra_hits.values():
+            violations |= hits
+        if not violations.any():
+            return 0
+
+        alternatives = self.best_alternatives(patient, ~self._unsafe(mask, extra)) if mode == 'replace' else {}
+        for p, plan in enumerate(plans):
+            if not violations[p].any():
+                continue
+            for m, meal in enumerate(MEAL_TYPES):
+                if not violations[p, m].any():
+                    continue
+                kept = []
+                for k, item in enumerate(getattr(plan, meal)):
+                    if not violations[p, m, k]:
+                        kept.append(item)
+                        continue
+                    reason = self._reasons(int(item_flags[p, m, k]), names,
+                                           [name for name, hits in extra_hits.items() if hits[p, m, k]])
+                    if mode == 'flag':
+                        kept.append(item)
+                        plan.safety_notes.append(f"{meal}: {item} ({reason})")
+                        continue
+                    replacement = None
+                    if mode == 'replace' and resolved[p, m, k]:
+                        alt = alternatives.get(self.categories[idx[p, m, k]])
+                        if alt is not None and self.foods[alt].name not in kept:
+                            replacement = self.foods[alt].name
+                    if replacement is not None:
+                        kept.append(replacement)
+                        plan.safety_notes.append(f"{meal}: replaced {item} with {replacement} ({reason})")
+                    else:
+                        plan.safety_notes.append(f"{meal}: removed {item} ({reason})")
+                setattr(plan, meal, kept)
+            if plan.resolved:
+                self.resolver.resolve_meal_plan(plan)
+        return int(violations.sum())
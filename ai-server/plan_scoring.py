@@ -0,0 +1,185 @@
+"""
+Knowledge-graph scoring of candidate meal plans.
+
+The engine decodes several candidates per request; `PlanScorer` ranks them in
+one vectorized pass over per-food arrays built from the knowledge graph's food
+catalog:
+
+    dosha     mean effect of the matched foods on the patient's doshas
+              (foods that decrease an aggravated dosha score positively)
+    coverage  share of distinct food categories, and of filled meal slots
+    allergy   items that match one of the patient's allergens (penalized)
+
+Items are matched to foods by normalized name; unmatched items only take part
+in the allergy check, by whole-word keyword (the same match as plan_safety).
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from model import Food, Patient
+
+DOSHAS = ('vata', 'pitta', 'kapha')
+
+# Keywords that identify an allergen in food names, categories and notes,
+# keyed by the singular allergen name (see allergen_entry)
+ALLERGEN_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    'milk': ('milk', 'dairy', 'paneer', 'curd', 'ghee', 'butter', 'cheese', 'yogurt',
+             'yoghurt', 'khoa', 'lassi', 'buttermilk', 'cream', 'dahi'),
+    'gluten': ('gluten', 'wheat', 'barley', 'rye', 'maida', 'semolina', 'sooji', 'suji',
+               'atta', 'dalia', 'seitan', 'chapati', 'roti'),
+    'peanut': ('peanut', 'groundnut', 'moongphali'),
+    'nut': ('nut', 'almond', 'cashew', 'walnut', 'pistachio', 'badam', 'kaju'),
+    'soy': ('soy', 'tofu'),
+    'egg': ('egg', 'anda'),
+    'shellfish': ('prawn', 'shrimp', 'crab', 'lobster'),
+    'fish': ('fish', 'machli'),
+}
+
+SCORE_WEIGHTS = {'dosha': 1.0, 'category_coverage': 0.5, 'slot_fill': 0.5,
+                 'allergy_violations': -2.0}
+INVALID_PLAN_PENALTY = -5.0
+
+
+def effect_sign(effect: Optional[str]) -> float:
+    """+1 for foods that increase a dosha, -1 for foods that decrease it"""
+    value = str(effect or '').strip().lower()
+    if value in ('+', 'increase', 'increases', 'aggravate', 'aggravates') or value.startswith('+'):
+        return 1.0
+    if value in ('-', 'decrease', 'decreases', 'reduce', 'reduces', 'pacify', 'pacifies') or value.startswith('-'):
+        return -1.0
+    return 0.0
+
+
+def allergen_entry(allergy: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    """Singular allergen name and its keywords ('Peanuts' -> 'peanut'); None for
+    'None' and empty entries. Unknown allergens are their own keyword."""
+    key = ' '.join(str(allergy).strip().lower().split())
+    if key in ('', 'none', 'nil', 'no', 'nan'):
+        return None
+    if key.endswith('s') and not key.endswith('ss'):
+        key = key[:-1]
+    return key, ALLERGEN_KEYWORDS.get(key, (key,))
+
+
+def allergen_keywords(allergies: Sequence[str]) -> List[str]:
+    """Keywords for a patient's allergies ('None' and empty entries ignored)"""
+    keywords: List[str] = []
+    for allergy in allergies:
+        entry = allergen_entry(allergy)
+        if entry is not None:
+            keywords.extend(entry[1])
+    return keywords
+
+
+def keyword_pattern(keywords: Sequence[str]) -> 're.Pattern':
+    """Whole-word match of any keyword, allowing plurals ('nut' matches 'nuts', not 'coconut')"""
+    words = '|'.join(re.escape(k) for k in sorted(set(keywords), key=len, reverse=True))
+    return re.compile(rf"\b(?:{words})(?:s|es)?\b")
+
+
+def patient_dosha_vector(patient: Patient) -> np.ndarray:
+    """Weights of the doshas to pacify (all three for mixed or unknown prakriti)"""
+    prakriti = str(patient.prakriti).lower()
+    vector = np.array([1.0 if dosha in prakriti else 0.0 for dosha in DOSHAS], dtype=np.float32)
+    if not vector.any():
+        vector[:] = 1.0
+    return vector / vector.sum()
+
+
+class PlanScorer:
+    """Vectorized scoring of candidate plans against a food catalog"""
+
+    def __init__(self, foods: Sequence[Food]):
+        self.foods = list(foods)
+        self.index: Dict[str, int] = {}
+        for i, food in enumerate(self.foods):
+            self.index.setdefault(food.name.strip().lower(), i)
+        self.dosha_effects = np.array(
+            [[effect_sign(food.dosha_effects.get(d, food.dosha_effects.get(d.capitalize())))
+              for d in DOSHAS] for food in self.foods],
+            dtype=np.float32
+        ).reshape(-1, len(DOSHAS))
+        categories = sorted({food.category.lower() for food in self.foods})
+        category_ids = {c: i for i, c in enumerate(categories)}
+        self.category_ids = np.array([category_ids[f.category.lower()] for f in self.foods], dtype=np.int64)
+        self.num_categories = len(categories)
+        self.search_text = [
+            ' '.join([food.name, *getattr(food, 'vernacular_names', []), food.category]).lower()
+            for food in self.foods
+        ]
+        self._allergy_cache: Dict[Tuple[str, ...], np.ndarray] = {}
+
+    def lookup(self, item: str) -> int:
+        """Catalog index of an item (-1 when unmatched)"""
+        return self.index.get(' '.join(item.strip().lower().split()), -1)
+
+    def _allergy_mask(self, keywords: List[str]) -> np.ndarray:
+        key = tuple(keywords)
+        if key not in self._allergy_cache:
+            pattern = keyword_pattern(keywords)
+            self._allergy_cache[key] = np.array(
+                [bool(pattern.search(text)) for text in self.search_text], dtype=bool
+            )
+        return self._allergy_cache[key]
+
+    def score(self, patient: Patient, candidates: List[List[List[str]]],
+              valid: Optional[Sequence[bool]] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Score candidates given as lists of meal slots (lists of items).
+
+        Returns the total scores and the per-component arrays.
+        """
+        num = len(candidates)
+        items = [[item for slot in slots for item in slot] for slots in candidates]
+        width = max((len(c) for c in items), default=0) or 1
+        idx = np.full((num, width), -1, dtype=np.int64)
+        for row, candidate in enumerate(items):
+            idx[row, :len(candidate)] = [self.lookup(item) for item in candidate]
+        matched = idx >= 0
+        safe_idx = np.where(matched, idx, 0)
+
+        # Dosha compatibility: decreasing the patient's doshas is good
+        if len(self.foods):
+            effects = -(self.dosha_effects[safe_idx] @ patient_dosha_vector(patient))
+            dosha = np.where(matched, effects, 0.0).sum(axis=1) / np.maximum(matched.sum(axis=1), 1)
+        else:
+            dosha = np.zeros(num, dtype=np.float32)
+
+        # Category coverage and filled slots
+        coverage = np.zeros(num, dtype=np.float32)
+        if self.num_categories:
+            one_hot = np.zeros((num, self.num_categories), dtype=bool)
+            rows = np.repeat(np.arange(num), width)[matched.ravel()]
+            one_hot[rows, self.category_ids[safe_idx.ravel()[matched.ravel()]]] = True
+            coverage = one_hot.sum(axis=1) / min(self.num_categories, 5)
+            coverage = np.minimum(coverage, 1.0)
+        slot_fill = np.array(
+            [sum(1 for slot in slots if slot) / max(len(slots), 1) for slots in candidates],
+            dtype=np.float32
+        )
+
+        # Allergy violations: matched foods by catalog text, unmatched items by keyword
+        keywords = allergen_keywords(patient.allergies)
+        violations = np.zeros(num, dtype=np.float32)
+        if keywords:
+            pattern = keyword_pattern(keywords)
+            if len(self.foods):
+                violations += (self._allergy_mask(keywords)[safe_idx] & matched).sum(axis=1)
+            for row, candidate in enumerate(items):
+                violations[row] += sum(
+                    1 for col, item in enumerate(candidate)
+                    if not matched[row, col] and pattern.search(item.lower())
+                )
+
+        components = {
+            'dosha': dosha.astype(np.float32),
+            'category_coverage': coverage.astype(np.float32),
+            'slot_fill': slot_fill,
+            'allergy_violations': violations,
+        }
+        total = sum(SCORE_WEIGHTS[name] * values for name, values in components.items())
+        if valid is not None:
+            total = total + np.where(np.asarray(valid, dtype=bool), 0.0, INVALID_PLAN_PENALTY)
+        return total.astype(np.float32), components
@@ -0,0 +1,231 @@
+"""
+Deterministic weekly plan solver over the food catalog.
+
+An alternative to T5 decoding (`engine_mode="solver"`) and the engine's
+overload fallback. Every meal slot has a template of category positions
+(e.g. lunch = grain + legume + vegetable), some of them optional. Every item
+is one catalog serving, so the calorie target is met by choosing between
+groups (a prepared dish instead of a grain) and by leaving optional
+positions empty. The solver fills the week greedily, then improves it with
+coordinate-descent local search: each position is re-chosen given the rest
+of the week until nothing changes. A candidate's score is computed for the
+whole candidate set of a position at once:
+
+    + dosha compatibility with the patient's prakriti
+    - deviation of the slot's calories from its share of the daily target
+    - a small penalty for the position's less preferred groups
+    excluded: foods unsafe for the patient (SafetyIndex mask), foods already
+              in the day, and foods used within `repeat_window` days
+
+Catalog rows with the same normalized name ("Kodo Millet" and
+"Kodo Millet (161)") are one food, served under its name without the
+numeric suffix. Cooking fats and ingredients ("Mustard Oil", "Dosa Batter")
+are never served as items.
+
+A full week is a few hundred small numpy operations (milliseconds on CPU).
+"""
+
+import json
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from food_resolver import normalize_name
+from model import Food, MealPlan, Patient, WeeklyMealPlan
+from plan_cache import patient_signature
+from plan_safety import SafetyIndex
+from plan_scoring import keyword_pattern, patient_dosha_vector
+
+# Catalog category keywords for each group ("Grains & Millets" -> grain)
+CATEGORY_GROUPS: Dict[str, Tuple[str, ...]] = {
+    'grain': ('grain', 'millet', 'cereal'),
+    'legume': ('legume', 'pulse', 'pulsle'),
+    'vegetable': ('vegetable',),
+    'fruit': ('fruit',),
+    'dairy': ('dairy',),
+    'nut': ('nut',),
+    'prepared': ('prepared', 'fermented'),
+}
+# Names of cooking fats and ingredients sharing a category with servable foods
+INGREDIENT_KEYWORDS = ('oil', 'ghee', 'butter', 'batter', 'flour', 'pickle')
+
+# Positions per slot: (acceptable groups in order of preference, optional)
+SLOT_TEMPLATES: Dict[str, Tuple[Tuple[Tuple[str, ...], bool], ...]] = {
+    'breakfast': ((('grain', 'prepared'), False), (('fruit',), False), (('dairy', 'nut'), True)),
+    'lunch': ((('grain',), False), (('legume',), False), (('vegetable',), False),
+              (('dairy', 'vegetable'), True), (('grain', 'prepared'), True)),
+    'dinner': ((('grain', 'prepared'), False), (('legume',), False), (('vegetable',), False),
+               (('prepared', 'dairy'), True)),
+    'snacks': ((('fruit',), False), (('nut', 'dairy'), True)),
+}
+SLOT_CALORIE_SHARE = {'breakfast': 0.25, 'lunch': 0.35, 'dinner': 0.3, 'snacks': 0.1}
+ACTIVITY_FACTORS = {'sedentary': 1.2, 'moderate': 1.55, 'active': 1.725}
+
+DOSHA_WEIGHT = 1.0
+CALORIE_WEIGHT = 4.0
+GROUP_RANK_PENALTY = 0.1  # per step down a position's group list
+JITTER = 1e-3  # per-profile tie-breaking, so similar patients do not all get the same week
+SKIP = -1  # choice of an empty optional position
+
+_NUMERIC_SUFFIX = re.compile(r'\(\s*\d+\s*\)')
+_INGREDIENT = keyword_pattern(INGREDIENT_KEYWORDS)
+
+
+def daily_calorie_target(patient: Patient) -> float:
+    """Mifflin-St Jeor energy need, scaled by lifestyle and nudged by BMI"""
+    male = str(patient.gender).strip().lower() in ('m', 'male')
+    bmr = 10 * patient.weight + 6.25 * patient.height - 5 * patient.age + (5 if male else -161)
+    factor = next((f for key, f in ACTIVITY_FACTORS.items() if key in str(patient.lifestyle).lower()), 1.4)
+    target = bmr * factor
+    if patient.bmi >= 25:
+        target *= 0.85
+    elif 0 < patient.bmi < 18.5:
+        target *= 1.1
+    return float(max(target, 1200.0))
+
+
+def food_group(food: Food) -> Optional[str]:
+    """Template group of a catalog food (None for ingredients and other categories)"""
+    if _INGREDIENT.search(food.name.lower()):
+        return None
+    category = food.category.lower()
+    for group, keywords in CATEGORY_GROUPS.items():
+        if any(k in category for k in keywords):
+            return group
+    return None
+
+
+def display_name(name: str) -> str:
+    """Catalog name without its numeric suffix and stray whitespace"""
+    return ' '.join(_NUMERIC_SUFFIX.sub(' ', name).split())
+
+
+class PlanSolver:
+    """Local-search weekly planner over the foods of a SafetyIndex"""
+
+    def __init__(self, safety: SafetyIndex, repeat_window: int = 3, max_passes: int = 3):
+        self.safety = safety
+        self.repeat_window = repeat_window
+        self.max_passes = max_passes
+        self.calories = np.array([food.calories for food in safety.foods], dtype=np.float32)
+        self.names = [display_name(food.name) for food in safety.foods]
+        # Duplicate catalog rows map to the first row with their normalized name
+        first: Dict[str, int] = {}
+        self.representative = np.array(
+            [first.setdefault(normalize_name(food.name), i) for i, food in enumerate(safety.foods)],
+            dtype=np.int64
+        )
+        servable = self.representative == np.arange(len(safety.foods))
+        groups = np.array([food_group(food) or '' for food in safety.foods], dtype=object)
+        self.group_members = {group: np.flatnonzero((groups == group) & servable) for group in CATEGORY_GROUPS}
+
+    def _positions(self, safe: np.ndarray) -> List[Tuple[str, np.ndarray, np.ndarray, bool]]:
+        """(slot, candidate food indices, group penalties, optional) for every
+        template position with safe candidates"""
+        positions = []
+        for slot, template in SLOT_TEMPLATES.items():
+            for groups, optional in template:
+                members = [self.group_members[group] for group in groups]
+                members = [m[safe[m]] for m in members]
+                candidates = np.concatenate(members)
+                if len(candidates):
+                    penalty = np.concatenate([np.full(len(m), GROUP_RANK_PENALTY * rank, dtype=np.float32)
+                                              for rank, m in enumerate(members)])
+                    positions.append((slot, candidates, penalty, optional))
+        return positions
+
+    def solve(self, patient: Patient, num_days: int = 7,
+              avoid: Optional[Sequence[Sequence[int]]] = None) -> List[Dict[str, List[str]]]:
+        """Food names per slot for each day.
+
+        `avoid[d]` lists foods (indices into `safety.foods`) already served on
+        day d; they count against the repeat window like the solver's own picks.
+        """
+        # A food is safe only when every catalog row with its name is
+        safe = np.ones(len(self.calories), dtype=bool)
+        np.logical_and.at(safe, self.representative, ~self.safety.unsafe_foods(patient))
+        # Seeded by the normalized profile: API requests all share one patient id
+        rng = np.random.default_rng(zlib.crc32(json.dumps(patient_signature(patient), sort_keys=True).encode()))
+        preference = DOSHA_WEIGHT * -(self.safety.dosha_effects @ patient_dosha_vector(patient))
+        preference = preference + JITTER * rng.random(len(preference))
+        positions = self._positions(safe)
+        if not positions:
+            return [{slot: [] for slot in SLOT_TEMPLATES} for _ in range(num_days)]
+
+        daily_target = daily_calorie_target(patient)
+        slot_targets = {slot: daily_target * share for slot, share in SLOT_CALORIE_SHARE.items()}
+        slot_of = [position[0] for position in positions]
+        # choice[d, p]: chosen food for position p on day d (SKIP when empty or not yet chosen)
+        choice = np.full((num_days, len(positions)), SKIP, dtype=np.int64)
+        used = np.zeros((num_days, len(self.calories)), dtype=np.int32)
+        for day, foods in enumerate((avoid or [])[:num_days]):
+            np.add.at(used[day], self.representative[np.asarray(list(foods), dtype=np.int64)], 1)
+
+        def best_for(day: int, p: int) -> int:
+            _, candidates, penalty, optional = positions[p]
+            current = choice[day, p]
+            if current >= 0:
+                used[day, current] -= 1
+            window = used[max(0, day - self.repeat_window + 1):day + self.repeat_window].sum(axis=0)
+            allowed = window[candidates] == 0
+            if not allowed.any():
+                # Relax the repeat window before repeating within the day
+                allowed = used[day, candidates] == 0
+            if not allowed.any():
+                allowed = np.ones(len(candidates), dtype=bool)
+            slot = slot_of[p]
+            others = sum(self.calories[choice[day, q]] for q in range(len(positions))
+                         if q != p and slot_of[q] == slot and choice[day, q] >= 0)
+            target = slot_targets[slot]
+            deviation = np.abs(others + self.calories[candidates] - target) / target
+            scores = np.where(allowed, preference[candidates] - penalty - CALORIE_WEIGHT * deviation, -np.inf)
+            chosen = int(candidates[int(np.argmax(scores))])
+            # An optional position stays empty unless its food brings the slot closer to its target
+            if optional and abs(others - target) <= abs(others + self.calories[chosen] - target):
+                return SKIP
+            used[day, chosen] += 1
+            return chosen
+
+        # Greedy construction, then coordinate descent until stable
+        for day in range(num_days):
+            for p in range(len(positions)):
+                choice[day, p] = best_for(day, p)
+        for _ in range(self.max_passes):
+            before = choice.copy()
+            for day in range(num_days):
+                for p in range(len(positions)):
+                    choice[day, p] = best_for(day, p)
+            if np.array_equal(before, choice):
+                break
+
+        days = []
+        for day in range(num_days):
+            meals: Dict[str, List[str]] = {slot: [] for slot in SLOT_TEMPLATES}
+            for p, slot in enumerate(slot_of):
+                if choice[day, p] != SKIP:
+                    meals[slot].append(self.names[choice[day, p]])
+            days.append(meals)
+        return days
+
+    def solve_weekly_plan(self, patient: Patient) -> WeeklyMealPlan:
+        target = daily_calorie_target(patient)
+        days = [
+            MealPlan(
+                patient_id=patient.id,
+                day=day,
+                breakfast=meals['breakfast'],
+                lunch=meals['lunch'],
+                dinner=meals['dinner'],
+                snacks=meals['snacks'],
+                restrictions=[],
+                doctor_notes=f"Day {day} - solver plan for {patient.prakriti} constitution"
+            )
+            for day, meals in enumerate(self.solve(patient), 1)
+        ]
+        return WeeklyMealPlan(
+            patient_id=patient.id,
+            days=days,
+            weekly_notes=f"7-day solver plan for {patient.prakriti} constitution, ~{target:.0f} kcal/day target"
+        )
@@ -0,0 +1,207 @@
+"""
+Parallel hyperparameter sweep for the meal plan trainer.
+
+A sweep spec (JSON) describes the search space over epochs, learning rate,
+batch size and model name:
+
+    {
+        "method": "random",            # or "grid"
+        "num_trials": 12,              # random search only
+        "metric": "eval_loss",         # or "eval_item_f1" with generation_eval
+        "parameters": {
+            "epochs": [2, 3, 5],
+            "learning_rate": {"min": 1e-4, "max": 1e-3, "log": true},
+            "batch_size": [2, 4],
+            "model_name": ["t5-small"]
+        },
+        "fixed": {"max_input_length": 128, "generation_eval": false}
+    }
+
+Trials run concurrently in a process pool sized to the available cores, each
+limited to `threads_per_trial` intra-op threads. The datasets are parsed once
+in the parent and handed to the workers (shared copy-on-write when forked),
+and trials with the same model share the token cache. Results are written to
+`leaderboard.json` / `leaderboard.csv` in the sweep directory.
+"""
+
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from model import Food, MealPlan, Patient
+
+SWEEP_PARAMETERS = ('epochs', 'learning_rate', 'batch_size', 'model_name')
+LOWER_IS_BETTER = ('eval_loss',)
+# Metrics only reported with generation_eval enabled
+GENERATION_METRICS = ('eval_item_precision', 'eval_item_recall', 'eval_item_f1', 'eval_parse_success_rate')
+
+# Datasets shared with worker processes (set by _init_worker)
+_SHARED: Dict[str, Any] = {}
+
+
+def load_sweep_spec(path: str) -> Dict[str, Any]:
+    """Load and validate a sweep spec file"""
+    with open(path) as f:
+        spec = json.load(f)
+    method = spec.get('method', 'grid')
+    if method not in ('grid', 'random'):
+        raise ValueError(f"Unknown sweep method: {method}")
+    unknown = set(spec.get('parameters', {})) - set(SWEEP_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unsupported sweep parameters: {sorted(unknown)}")
+    if method == 'grid':
+        for name, values in spec.get('parameters', {}).items():
+            if not isinstance(values, list):
+                raise ValueError(f"Grid search needs a list of values for {name}")
+    return spec
+
+
+def _sample_value(values, rng: np.random.Generator):
+    if isinstance(values, list):
+        return values[int(rng.integers(len(values)))]
+    low, high = float(values['min']), float(values['max'])
+    if values.get('log'):
+        return float(math.exp(rng.uniform(math.log(low), math.log(high))))
+    value = float(rng.uniform(low, high))
+    return int(round(value)) if values.get('type') == 'int' else value
+
+
+def expand_trials(spec: Dict[str, Any], seed: int = 42) -> List[Dict[str, Any]]:
+    """Concrete trial configurations for a grid or random search spec"""
+    parameters = spec.get('parameters', {})
+    if spec.get('method', 'grid') == 'grid':
+        names = list(parameters)
+        return [dict(zip(names, combo)) for combo in itertools.product(*(parameters[n] for n in names))]
+    rng = np.random.default_rng(seed)
+    return [
+        {name: _sample_value(values, rng) for name, values in parameters.items()}
+        for _ in range(int(spec.get('num_trials', 10)))
+    ]
+
+
+def _init_worker(foods: List[Food], patients: List[Patient], plans: List[MealPlan],
+                 threads_per_trial: int):
+    """Runs once per worker process: keep the datasets and cap CPU threads"""
+    import torch
+    threads = str(threads_per_trial)
+    os.environ.update({"OMP_NUM_THREADS": threads, "MKL_NUM_THREADS": threads,
+                       "TOKENIZERS_PARALLELISM": "false"})
+    torch.set_num_threads(threads_per_trial)
+    _SHARED.update(foods=foods, patients=patients, plans=plans)
+
+
+def _run_trial(trial_id: int, params: Dict[str, Any], fixed: Dict[str, Any],
+               sweep_dir: str, models_dir: str, metric: str) -> Dict[str, Any]:
+    """Train one configuration and summarize its evaluation results"""
+    from train import MealPlanTrainer
+    from training_callbacks import ThroughputCallback
+
+    trial_dir = Path(sweep_dir) / f"trial_{trial_id:03d}"
+    config = {'model_name': 't5-small', 'epochs': 3, 'batch_size': 2, 'learning_rate': 3e-4,
+              **fixed, **params}
+    result = {'trial': trial_id, 'output_dir': str(trial_dir), **params}
+    start = time.time()
+    try:
+        trainer = MealPlanTrainer(model_name=config.pop('model_name'), models_dir=models_dir)
+        throughput = ThroughputCallback(str(trial_dir / "training_metrics.json"))
+        trainer.train(
+            foods=_SHARED['foods'], patients=_SHARED['patients'], plans=_SHARED['plans'],
+            output_dir=str(trial_dir),
+            num_epochs=config.pop('epochs'),
+            batch_size=config.pop('batch_size'),
+            learning_rate=config.pop('learning_rate'),
+            callbacks=[throughput],
+            **config
+        )
+        evals = [entry for entry in trainer.eval_history if metric in entry]
+        if evals:
+            values = [entry[metric] for entry in evals]
+            best = min(values) if metric in LOWER_IS_BETTER else max(values)
+            result.update({metric: best, f"final_{metric}": values[-1]})
+        else:
+            result['error'] = f"No {metric} in the evaluation history"
+        result.update(status='completed',
+                      samples_per_second=throughput.summary()['samples_per_second'])
+    except Exception as e:
+        result.update(status='failed', error=f"{e}\n{traceback.format_exc(limit=3)}")
+    result['train_seconds'] = round(time.time() - start, 1)
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    with open(trial_dir / "trial.json", "w") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def write_leaderboard(results: List[Dict[str, Any]], sweep_dir: Path, metric: str) -> List[Dict[str, Any]]:
+    """Rank trials by `metric` (failed or unscored trials last)"""
+    lower_is_better = metric in LOWER_IS_BETTER
+
+    def sort_key(result):
+        value = result.get(metric)
+        if value is None:
+            return (1, 0.0)
+        return (0, value if lower_is_better else -value)
+
+    ranked = sorted(results, key=sort_key)
+    for rank, result in enumerate(ranked, start=1):
+        result['rank'] = rank
+    with open(sweep_dir / "leaderboard.json", "w") as f:
+        json.dump({'metric': metric, 'trials': ranked}, f, indent=2)
+    pd.DataFrame([{k: v for k, v in r.items() if k != 'error'} for r in ranked]).to_csv(
+        sweep_dir / "leaderboard.csv", index=False
+    )
+    return ranked
+
+
+def run_sweep(spec: Dict[str, Any], foods: List[Food], patients: List[Patient],
+              plans: List[MealPlan], sweep_dir: str, models_dir: str,
+              threads_per_trial: int = 2, max_workers: Optional[int] = None,
+              seed: int = 42, fixed: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Run all trials of `spec` in parallel and return the ranked leaderboard"""
+    sweep_dir = Path(sweep_dir)
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    metric = spec.get('metric', 'eval_loss')
+    fixed = {'seed': seed, **(fixed or {}), **spec.get('fixed', {})}
+    if metric in GENERATION_METRICS and not fixed.get('generation_eval'):
+        raise ValueError(f"Sweep metric {metric} requires generation_eval")
+    trials = expand_trials(spec, seed=seed)
+
+    cores = os.cpu_count() or 1
+    workers = max_workers or max(1, cores // threads_per_trial)
+    workers = min(workers, len(trials)) or 1
+    print(f"🔍 Sweep: {len(trials)} trials, {workers} parallel workers x {threads_per_trial} threads")
+    with open(sweep_dir / "sweep_spec.json", "w") as f:
+        json.dump({**spec, 'trials': trials, 'fixed': fixed}, f, indent=2)
+
+    # Fork shares the parsed datasets copy-on-write; spawn pickles them once per worker
+    context = multiprocessing.get_context("fork" if os.name == "posix" else "spawn")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(foods, patients, plans, threads_per_trial)) as pool:
+        futures = [
+            pool.submit(_run_trial, i, params, fixed, str(sweep_dir), models_dir, metric)
+            for i, params in enumerate(trials)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"  trial {result['trial']:03d} {result['status']}: "
+                  f"{metric}={result.get(metric)} ({result['train_seconds']}s)")
+            # Keep a partial leaderboard on disk while the sweep runs
+            write_leaderboard(list(results), sweep_dir, metric)
+
+    ranked = write_leaderboard(results, sweep_dir, metric)
+    print(f"✓ Leaderboard saved to {sweep_dir / 'leaderboard.json'}")
+    if not any(result.get(metric) is not None for result in results):
+        raise RuntimeError(f"No trial reported {metric}; see {sweep_dir / 'leaderboard.json'}")
+    return ranked
@@ -0,0 +1,180 @@
+"""
+Pre-tokenized, memory-mapped cache for meal plan training data.
+
+Tokenizing every sample on every epoch keeps the training loop busy in Python.
+`build_token_cache` tokenizes a dataset once and writes flat token arrays plus
+offsets to disk; `MemmapTokenDataset` serves samples as views into those
+memory-mapped arrays, so DataLoader workers share pages through the OS cache
+and later training runs reuse the same files.
+
+Layout of a cache entry (``<cache_dir>/<key>/``):
+    input_ids.bin      int32, all input token ids concatenated
+    labels.bin         int32, all target token ids concatenated
+    input_offsets.npy  int64, n + 1 offsets into input_ids.bin
+    label_offsets.npy  int64, n + 1 offsets into labels.bin
+    meta.json          key, sample count, tokenizer and config fingerprints
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+from torch.utils.data import Dataset
+
+CACHE_VERSION = 1
+TOKEN_DTYPE = np.int32
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash the tokenizer class and vocabulary (including added special tokens)"""
+    h = hashlib.sha256()
+    h.update(type(tokenizer).__name__.encode())
+    h.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode())
+    return h.hexdigest()[:16]
+
+
+def dataset_cache_key(dataset, tokenizer) -> str:
+    """Key a dataset by tokenizer, tokenization config and sample contents"""
+    h = hashlib.sha256()
+    h.update(f"v{CACHE_VERSION}".encode())
+    h.update(tokenizer_fingerprint(tokenizer).encode())
+    config = {
+        'weekly_mode': dataset.weekly_mode,
+        'model_type': dataset.model_type,
+        'max_input_length': dataset.max_input_length,
+        'max_target_length': dataset.max_target_length,
+    }
+    h.update(json.dumps(config, sort_keys=True).encode())
+    for idx in range(len(dataset)):
+        input_text, target_text = dataset.get_text_pair(idx)
+        h.update(input_text.encode())
+        h.update(b"\0")
+        h.update(target_text.encode())
+        h.update(b"\1")
+    return h.hexdigest()[:24]
+
+
+def _write_flat(sequences, path: Path) -> np.ndarray:
+    """Write token sequences back to back and return their offsets"""
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    np.cumsum([len(seq) for seq in sequences], out=offsets[1:])
+    flat = np.memmap(path, dtype=TOKEN_DTYPE, mode='w+', shape=(max(int(offsets[-1]), 1),))
+    for i, seq in enumerate(sequences):
+        flat[offsets[i]:offsets[i + 1]] = seq
+    flat.flush()
+    del flat
+    return offsets
+
+
+def build_token_cache(dataset, cache_dir: str, batch_size: int = 256) -> Path:
+    """Tokenize `dataset` once and store it under `cache_dir`.
+
+    Returns the cache entry directory. An existing entry with the same key is
+    reused as is, so repeated training runs skip tokenization entirely.
+    """
+    tokenizer = dataset.tokenizer
+    key = dataset_cache_key(dataset, tokenizer)
+    cache_root = Path(cache_dir)
+    entry = cache_root / key
+    if (entry / "meta.json").exists():
+        print(f"✓ Reusing token cache {entry}")
+        return entry
+
+    cache_root.mkdir(parents=True, exist_ok=True)
+    print(f"🔤 Pre-tokenizing {len(dataset)} samples into {entry}...")
+
+    input_ids, labels = [], []
+    for start in range(0, len(dataset), batch_size):
+        pairs = [dataset.get_text_pair(i) for i in range(start, min(start + batch_size, len(dataset)))]
+        inputs = tokenizer([p[0] for p in pairs], max_length=dataset.max_input_length, truncation=True)
+        targets = tokenizer([p[1] for p in pairs], max_length=dataset.max_target_length, truncation=True)
+        input_ids.extend(inputs['input_ids'])
+        labels.extend(targets['input_ids'])
+
+    # Build in a temporary directory and rename, so concurrent runs never see
+    # a partially written entry
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=cache_root))
+    try:
+        input_offsets = _write_flat(input_ids, tmp_dir / "input_ids.bin")
+        label_offsets = _write_flat(labels, tmp_dir / "labels.bin")
+        np.save(tmp_dir / "input_offsets.npy", input_offsets)
+        np.save(tmp_dir / "label_offsets.npy", label_offsets)
+        meta = {
+            'key': key,
+            'version': CACHE_VERSION,
+            'num_samples': len(input_ids),
+            'num_input_tokens': int(input_offsets[-1]),
+            'num_label_tokens': int(label_offsets[-1]),
+            'tokenizer': tokenizer_fingerprint(tokenizer),
+            'weekly_mode': dataset.weekly_mode,
+            'max_input_length': dataset.max_input_length,
+            'max_target_length': dataset.max_target_length,
+        }
+        with open(tmp_dir / "meta.json", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_dir, entry)
+    except OSError:
+        # Another process finished the same entry first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not (entry / "meta.json").exists():
+            raise
+
+    print(f"✓ Token cache written: {len(input_ids)} samples")
+    return entry
+
+
+class MemmapTokenDataset(Dataset):
+    """Dataset reading pre-tokenized samples from a token cache entry.
+
+    Samples are returned as read-only views into the memory-mapped arrays.
+    The maps are opened lazily in each process, so the dataset pickles
+    cheaply into DataLoader workers.
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = Path(cache_path)
+        with open(self.cache_path / "meta.json") as f:
+            self.meta = json.load(f)
+        self.input_offsets = np.load(self.cache_path / "input_offsets.npy")
+        self.label_offsets = np.load(self.cache_path / "label_offsets.npy")
+        self._input_ids: Optional[np.memmap] = None
+        self._labels: Optional[np.memmap] = None
+
+    def _open(self):
+        self._input_ids = np.memmap(self.cache_path / "input_ids.bin", dtype=TOKEN_DTYPE, mode='r')
+        self._labels = np.memmap(self.cache_path / "labels.bin", dtype=TOKEN_DTYPE, mode='r')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_input_ids'] = None
+        state['_labels'] = None
+        return state
+
+    @property
+    def input_lengths(self) -> np.ndarray:
+        return np.diff(self.input_offsets)
+
+    def __len__(self):
+        return int(self.meta['num_samples'])
+
+    def __getitem__(self, idx) -> Dict[str, np.ndarray]:
+        if self._input_ids is None:
+            self._open()
+        s, e = self.input_offsets[idx], self.input_offsets[idx + 1]
+        ls, le = self.label_offsets[idx], self.label_offsets[idx + 1]
+        input_ids = self._input_ids[s:e]
+        return {
+            'input_ids': input_ids,
+            'attention_mask': np.ones(len(input_ids), dtype=np.int64),
+            'labels': self._labels[ls:le],
+        }
+
+
+def load_or_build_token_cache(dataset, cache_dir: str) -> MemmapTokenDataset:
+    """Return a memory-mapped view of `dataset`, tokenizing it only on a cache miss"""
+    return MemmapTokenDataset(build_token_cache(dataset, cache_dir))
@@ -2,33 +2,92 @@ import torch
 import torch.nn as nn
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
 import json
 from pathlib import Path
 import os
+import random
+import time
 import warnings
 warnings.filterwarnings('ignore')
 
 from transformers import (
-    Trainer, TrainingArguments, EvalPrediction
+    Trainer, TrainingArguments, EvalPrediction, EarlyStoppingCallback, DataCollatorForSeq2Seq,
+    TrainerCallback, set_seed
 )
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, IterableDataset, get_worker_info
 from huggingface_hub import login as hf_login
 
+# LoRA training is optional
+try:
+    from peft import LoraConfig, TaskType, get_peft_model
+except ImportError:
+    LoraConfig = TaskType = get_peft_model = None
+
 from model import (
     Food, Patient, MealPlan, WeeklyMealPlan,
     HybridNeuralEngine, AyurvedaKnowledgeGraph
 )
+from token_cache import build_token_cache, load_or_build_token_cache
+from generation_eval import GenerationEvalCallback
+from dataset_compaction import WeightedDataset, compact_dataset
+
+# Input formats used for training (shared with distillation and evaluation)
+def format_weekly_training_input(patient: Patient) -> str:
+    """Format the model input for a weekly plan training sample"""
+    input_text = f"generate weekly meal plan: age {patient.age} {patient.gender} "
+    input_text += f"bmi {patient.bmi:.1f} {patient.prakriti} generate 7 days"
+    return input_text
+
+def format_daily_training_input(patient: Patient, day: int) -> str:
+    """Format the model input for a single day training sample"""
+    input_text = f"generate meal plan: age {patient.age} {patient.gender} "
+    input_text += f"bmi {patient.bmi:.1f} {patient.prakriti} day {day}"
+    return input_text
+
+def format_daily_training_target(meal_plan: MealPlan) -> str:
+    """Format the target text for a single day, filling empty meals with defaults"""
+    breakfast_items = meal_plan.breakfast if meal_plan.breakfast else ["oatmeal", "fruits"]
+    lunch_items = meal_plan.lunch if meal_plan.lunch else ["rice", "dal", "vegetables"]
+    dinner_items = meal_plan.dinner if meal_plan.dinner else ["chapati", "curry"]
+    snack_items = meal_plan.snacks if meal_plan.snacks else ["fruits"]
+    
+    target_text = f"breakfast: {', '.join(breakfast_items[:3])} | "
+    target_text += f"lunch: {', '.join(lunch_items[:3])} | "
+    target_text += f"dinner: {', '.join(dinner_items[:3])} | "
+    target_text += f"snacks: {', '.join(snack_items[:2])}"
+    return target_text
+
+def format_weekly_training_target(weekly_plan: WeeklyMealPlan) -> str:
+    """Format the target text for a week as 'day1: ... | day2: ...'"""
+    target_text = ""
+    for i, day_plan in enumerate(weekly_plan.days, 1):
+        target_text += f"day{i}: {format_daily_training_target(day_plan)} | "
+    return target_text.strip(" | ")
+
+def _placeholder_patient(patient_id: str) -> Patient:
+    """Stand-in for plans whose patient is missing from patients.csv"""
+    return Patient(
+        id=patient_id,
+        age=30, gender="unknown", weight=70, height=170, bmi=24,
+        lifestyle="moderate", prakriti="vata",
+        health_conditions=[], allergies=[], preferred_cuisine=[]
+    )
 
 # Dataset class for training
 class AyurvedaMealPlanDataset(Dataset):
     def __init__(self, patients: List[Patient], meal_plans: List[MealPlan],
                  tokenizer, max_length: int = 512, model_type: str = "t5", 
-                 weekly_mode: bool = False):
+                 weekly_mode: bool = False, max_input_length: Optional[int] = None,
+                 max_target_length: Optional[int] = None):
         self.patients = {p.id: p for p in patients}
         self.meal_plans = meal_plans
         self.tokenizer = tokenizer
         self.max_length = max_length
+        # Inputs are short patient descriptions while weekly targets are long,
+        # so each side gets its own truncation limit
+        self.max_input_length = max_input_length or max_length
+        self.max_target_length = max_target_length or max_length
         self.model_type = model_type
         self.weekly_mode = weekly_mode
         
@@ -71,111 +130,183 @@ class AyurvedaMealPlanDataset(Dataset):
             return len(self.meal_plans)
 
     def __getitem__(self, idx):
+        return self._tokenize_pair(*self.get_text_pair(idx))
+
+    def get_text_pair(self, idx) -> Tuple[str, str]:
+        """Build the (input_text, target_text) pair for a sample without tokenizing"""
         if self.weekly_mode:
             return self._get_weekly_item(idx)
         else:
             return self._get_daily_item(idx)
 
     def _get_weekly_item(self, idx):
-        """Get a weekly meal plan training item"""
+        """Get the text pair for a weekly meal plan training item"""
         if not self.weekly_plans:
             raise IndexError("No weekly plans available")
         
         weekly_plan = self.weekly_plans[idx]
-        patient = self.patients.get(weekly_plan.patient_id)
-
-        if not patient:
-            # Create a dummy patient if not found
-            patient = Patient(
-                id=weekly_plan.patient_id,
-                age=30, gender="unknown", weight=70, height=170, bmi=24,
-                lifestyle="moderate", prakriti="vata",
-                health_conditions=[], allergies=[], preferred_cuisine=[]
-            )
-
-        # Format input for weekly plan
-        input_text = f"generate weekly meal plan: age {patient.age} {patient.gender} "
-        input_text += f"bmi {patient.bmi:.1f} {patient.prakriti} generate 7 days"
-
-        # Format output for weekly plan with better structure
-        target_text = ""
-        for i, day_plan in enumerate(weekly_plan.days, 1):
-            target_text += f"day{i}: "
-            
-            # Ensure each meal type has content
-            breakfast_items = day_plan.breakfast if day_plan.breakfast else ["oatmeal", "fruits"]
-            lunch_items = day_plan.lunch if day_plan.lunch else ["rice", "dal", "vegetables"]
-            dinner_items = day_plan.dinner if day_plan.dinner else ["chapati", "curry"]
-            snack_items = day_plan.snacks if day_plan.snacks else ["fruits"]
-            
-            target_text += f"breakfast: {', '.join(breakfast_items[:3])} | "
-            target_text += f"lunch: {', '.join(lunch_items[:3])} | "
-            target_text += f"dinner: {', '.join(dinner_items[:3])} | "
-            target_text += f"snacks: {', '.join(snack_items[:2])} | "
-        
-        target_text = target_text.strip(" | ")
+        patient = self.patients.get(weekly_plan.patient_id) or _placeholder_patient(weekly_plan.patient_id)
 
-        return self._tokenize_pair(input_text, target_text)
+        input_text = format_weekly_training_input(patient)
+        target_text = format_weekly_training_target(weekly_plan)
+        return input_text, target_text
 
     def _get_daily_item(self, idx):
-        """Get a single day meal plan training item"""
+        """Get the text pair for a single day meal plan training item"""
         meal_plan = self.meal_plans[idx]
-        patient = self.patients.get(meal_plan.patient_id)
-
-        if not patient:
-            # Create a dummy patient if not found
-            patient = Patient(
-                id=meal_plan.patient_id,
-                age=30, gender="unknown", weight=70, height=170, bmi=24,
-                lifestyle="moderate", prakriti="vata",
-                health_conditions=[], allergies=[], preferred_cuisine=[]
-            )
+        patient = self.patients.get(meal_plan.patient_id) or _placeholder_patient(meal_plan.patient_id)
 
-        # Simplified format for better training
-        input_text = f"generate meal plan: age {patient.age} {patient.gender} "
-        input_text += f"bmi {patient.bmi:.1f} {patient.prakriti} day {meal_plan.day}"
-
-        # Improved output format with consistent structure
-        breakfast_items = meal_plan.breakfast if meal_plan.breakfast else ["oatmeal", "fruits"]
-        lunch_items = meal_plan.lunch if meal_plan.lunch else ["rice", "dal", "vegetables"]
-        dinner_items = meal_plan.dinner if meal_plan.dinner else ["chapati", "curry"]
-        snack_items = meal_plan.snacks if meal_plan.snacks else ["fruits"]
-        
-        target_text = f"breakfast: {', '.join(breakfast_items[:3])} | "
-        target_text += f"lunch: {', '.join(lunch_items[:3])} | "
-        target_text += f"dinner: {', '.join(dinner_items[:3])} | "
-        target_text += f"snacks: {', '.join(snack_items[:2])}"
-
-        return self._tokenize_pair(input_text, target_text)
+        input_text = format_daily_training_input(patient, meal_plan.day)
+        target_text = format_daily_training_target(meal_plan)
+        return input_text, target_text
 
     def _tokenize_pair(self, input_text: str, target_text: str):
-        """Tokenize input and target text pair"""
-        # Tokenize
+        """Tokenize input and target text pair.
+
+        Sequences are truncated but not padded; padding happens per batch in
+        DataCollatorForSeq2Seq, which also masks padded labels with -100.
+        """
         inputs = self.tokenizer(
             input_text,
-            max_length=self.max_length,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt'
+            max_length=self.max_input_length,
+            truncation=True
         )
 
         targets = self.tokenizer(
             target_text,
-            max_length=self.max_length,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt'
+            max_length=self.max_target_length,
+            truncation=True
         )
 
-        # Replace padding token id with -100 for loss calculation
-        targets['input_ids'][targets['input_ids'] == self.tokenizer.pad_token_id] = -100
-
         return {
-            'input_ids': inputs['input_ids'].squeeze(),
-            'attention_mask': inputs['attention_mask'].squeeze(),
-            'labels': targets['input_ids'].squeeze()
+            'input_ids': inputs['input_ids'],
+            'attention_mask': inputs['attention_mask'],
+            'labels': targets['input_ids']
         }
 
+class TextPairDataset(AyurvedaMealPlanDataset):
+    """Dataset over precomputed (input_text, target_text) pairs, e.g. teacher pseudo-labels"""
+
+    def __init__(self, pairs: List[Tuple[str, str]], tokenizer, max_input_length: int = 512,
+                 max_target_length: int = 512, model_type: str = "t5", weekly_mode: bool = True):
+        self.pairs = pairs
+        self.patients = {}
+        self.meal_plans = []
+        self.weekly_plans = None
+        self.tokenizer = tokenizer
+        self.max_length = max(max_input_length, max_target_length)
+        self.max_input_length = max_input_length
+        self.max_target_length = max_target_length
+        self.model_type = model_type
+        self.weekly_mode = weekly_mode
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def get_text_pair(self, idx) -> Tuple[str, str]:
+        return self.pairs[idx]
+
+class StreamingMealPlanDataset(IterableDataset):
+    """Iterable dataset streaming doctor plans from CSV shards for out-of-core training.
+
+    Plan rows are read lazily in chunks, consecutive rows of one patient are
+    grouped into 7-day windows on the fly (weekly mode), and samples pass
+    through a bounded shuffle buffer. Work is split across DDP ranks and
+    DataLoader workers: by file when there are at least as many shards as
+    consumers, otherwise by sample index. Only the patients are held in memory.
+    """
+
+    _tokenize_pair = AyurvedaMealPlanDataset._tokenize_pair
+
+    def __init__(self, plan_files: List[str], patients: List[Patient], tokenizer,
+                 weekly_mode: bool = True, max_input_length: int = 512,
+                 max_target_length: int = 512, model_type: str = "t5",
+                 chunk_size: int = 10000, shuffle_buffer: int = 1024, seed: int = 42):
+        self.plan_files = [str(path) for path in plan_files]
+        self.patients = {p.id: p for p in patients}
+        self.tokenizer = tokenizer
+        self.weekly_mode = weekly_mode
+        self.max_input_length = max_input_length
+        self.max_target_length = max_target_length
+        self.model_type = model_type
+        self.chunk_size = chunk_size
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        """Reshuffle differently on every epoch"""
+        self.epoch = epoch
+
+    def _shard(self) -> Tuple[int, int]:
+        """(shard id, number of shards) over DDP ranks x DataLoader workers"""
+        rank = int(os.environ.get("RANK", 0))
+        world_size = int(os.environ.get("WORLD_SIZE", 1))
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+        return rank * num_workers + worker_id, world_size * num_workers
+
+    def _iter_groups(self, files: List[str]):
+        """Yield the (index, row) lists that make up one sample each"""
+        patient_id, window = None, []
+        for path in files:
+            for chunk in pd.read_csv(path, chunksize=self.chunk_size):
+                for idx, row in chunk.iterrows():
+                    if not self.weekly_mode:
+                        yield [(idx, row)]
+                        continue
+                    # Incomplete windows are dropped when the patient changes
+                    row_patient = str(row.get('patient_id', row.get('id', idx)))
+                    if row_patient != patient_id:
+                        patient_id, window = row_patient, []
+                    window.append((idx, row))
+                    if len(window) == 7:
+                        yield window
+                        window = []
+
+    def iter_text_pairs(self):
+        """Yield this shard's (input_text, target_text) pairs in file order"""
+        shard, num_shards = self._shard()
+        files = list(self.plan_files)
+        random.Random(self.seed + self.epoch).shuffle(files)
+        if len(files) >= num_shards:
+            files, shard, num_shards = files[shard::num_shards], 0, 1
+        for i, group in enumerate(self._iter_groups(files)):
+            if i % num_shards != shard:
+                continue
+            plans = [_meal_plan_from_row(row, idx) for idx, row in group]
+            patient = self.patients.get(plans[0].patient_id) or _placeholder_patient(plans[0].patient_id)
+            if self.weekly_mode:
+                plans.sort(key=lambda x: x.day)
+                weekly_plan = WeeklyMealPlan(patient_id=patient.id, days=plans, weekly_notes="Training data")
+                yield format_weekly_training_input(patient), format_weekly_training_target(weekly_plan)
+            else:
+                yield format_daily_training_input(patient, plans[0].day), format_daily_training_target(plans[0])
+
+    def __iter__(self):
+        shard, _ = self._shard()
+        rng = random.Random(self.seed + 1000003 * self.epoch + shard)
+        buffer: List[Tuple[str, str]] = []
+        for pair in self.iter_text_pairs():
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(pair)
+                continue
+            j = rng.randrange(len(buffer))
+            yield self._tokenize_pair(*buffer[j])
+            buffer[j] = pair
+        rng.shuffle(buffer)
+        for pair in buffer:
+            yield self._tokenize_pair(*pair)
+
+class StreamingEpochCallback(TrainerCallback):
+    """Tell a streaming dataset which epoch starts, so each epoch is shuffled differently"""
+
+    def __init__(self, dataset: StreamingMealPlanDataset):
+        self.dataset = dataset
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.dataset.set_epoch(int(state.epoch or 0))
+
 # Data loading utilities
 def _split_list(val: Optional[str]) -> List[str]:
     if val is None or (isinstance(val, float) and np.isnan(val)):
@@ -228,6 +359,23 @@ def _parse_dict(val) -> Dict[str, str]:
             out[k.strip()] = v.strip()
     return out
 
+def _first(row, *keys, default=None):
+    """Value of the first column present in `row` (handles both CSV schemas)"""
+    for key in keys:
+        if key in row and not (isinstance(row[key], float) and np.isnan(row[key])):
+            return row[key]
+    return default
+
+def _dosha_effects(row) -> Dict[str, str]:
+    """dosha_effects column, or the per-dosha ayurveda_dosha_* columns of foods.csv"""
+    effects = _parse_dict(row.get('dosha_effects', {}))
+    if not effects:
+        for dosha in ('vata', 'pitta', 'kapha'):
+            value = _first(row, f'ayurveda_dosha_{dosha}')
+            if value is not None:
+                effects[dosha] = str(value).strip()
+    return effects
+
 def load_foods_csv(path: str) -> List[Food]:
     """Load foods from CSV file"""
     df = pd.read_csv(path)
@@ -235,23 +383,24 @@ def load_foods_csv(path: str) -> List[Food]:
     for idx, row in df.iterrows():
         foods.append(
             Food(
-                id=str(row.get('id', row.get('food_id', idx))),
-                name=str(row.get('name', row.get('food_name', 'Unknown'))),
-                category=str(row.get('category', 'unknown')),
-                calories=_parse_float(row.get('calories', 0)),
-                protein=_parse_float(row.get('protein', 0)),
-                carbs=_parse_float(row.get('carbs', row.get('carbohydrates', 0))),
-                fats=_parse_float(row.get('fats', row.get('fat', 0))),
-                fiber=_parse_float(row.get('fiber', 0)),
+                id=str(_first(row, 'id', 'food_id', default=idx)),
+                name=str(_first(row, 'name', 'food_name', 'name_en', default='Unknown')),
+                category=str(_first(row, 'category', default='unknown')),
+                calories=_parse_float(_first(row, 'calories', 'calories(kcal)', default=0)),
+                protein=_parse_float(_first(row, 'protein', 'protein(g)', default=0)),
+                carbs=_parse_float(_first(row, 'carbs', 'carbohydrates', 'carbs(g)', default=0)),
+                fats=_parse_float(_first(row, 'fats', 'fat', 'fats(g)', default=0)),
+                fiber=_parse_float(_first(row, 'fiber', 'fiber(g)', default=0)),
                 vitamins=_parse_dict(row.get('vitamins', {})),
                 minerals=_parse_dict(row.get('minerals', {})),
-                dosha_effects=_parse_dict(row.get('dosha_effects', {})),
-                rasa=str(row.get('rasa', 'sweet')),
-                guna=_split_list(row.get('guna', row.get('qualities', ''))),
-                virya=str(row.get('virya', 'neutral')),
-                vipaka=str(row.get('vipaka', 'sweet')),
-                health_tags=_split_list(row.get('health_tags', row.get('tags', ''))),
-                contraindications=_split_list(row.get('contraindications', '')),
+                dosha_effects=_dosha_effects(row),
+                rasa=str(_first(row, 'rasa', 'ayurveda_rasa', default='sweet')),
+                guna=_split_list(_first(row, 'guna', 'qualities', 'ayurveda_guna', default='')),
+                virya=str(_first(row, 'virya', 'ayurveda_virya', default='neutral')),
+                vipaka=str(_first(row, 'vipaka', 'ayurveda_vipaka', default='sweet')),
+                health_tags=_split_list(_first(row, 'health_tags', 'tags', default='')),
+                contraindications=_split_list(_first(row, 'contraindications', default='')),
+                vernacular_names=_split_list(_first(row, 'vernacular_names', default='')),
             )
         )
     return foods
@@ -261,9 +410,9 @@ def load_patients_csv(path: str) -> List[Patient]:
     df = pd.read_csv(path)
     patients = []
     for idx, row in df.iterrows():
-        height = _parse_float(row.get('height', 170))
-        weight = _parse_float(row.get('weight', 70))
-        bmi = _parse_float(row.get('bmi', 0))
+        height = _parse_float(_first(row, 'height', 'height_cm', default=170))
+        weight = _parse_float(_first(row, 'weight', 'weight_kg', default=70))
+        bmi = _parse_float(_first(row, 'bmi', 'BMI', default=0))
         if not bmi and height and weight:
             try:
                 h_m = height / 100.0 if height > 3 else height
@@ -287,25 +436,58 @@ def load_patients_csv(path: str) -> List[Patient]:
         )
     return patients
 
+def _meal_plan_from_row(row, idx) -> MealPlan:
+    return MealPlan(
+        patient_id=str(row.get('patient_id', row.get('id', idx))),
+        day=int(_parse_float(row.get('day', 1))),
+        breakfast=_split_list(row.get('breakfast', '')),
+        lunch=_split_list(row.get('lunch', '')),
+        dinner=_split_list(row.get('dinner', '')),
+        snacks=_split_list(row.get('snacks', '')),
+        restrictions=_split_list(row.get('restrictions', '')),
+        doctor_notes=str(row.get('doctor_notes', row.get('notes', ''))),
+    )
+
 def load_doctor_plans_csv(path: str) -> List[MealPlan]:
     """Load meal plans from CSV file"""
     df = pd.read_csv(path)
     plans = []
     for idx, row in df.iterrows():
-        plans.append(
-            MealPlan(
-                patient_id=str(row.get('patient_id', row.get('id', idx))),
-                day=int(_parse_float(row.get('day', 1))),
-                breakfast=_split_list(row.get('breakfast', '')),
-                lunch=_split_list(row.get('lunch', '')),
-                dinner=_split_list(row.get('dinner', '')),
-                snacks=_split_list(row.get('snacks', '')),
-                restrictions=_split_list(row.get('restrictions', '')),
-                doctor_notes=str(row.get('doctor_notes', row.get('notes', ''))),
-            )
-        )
+        plans.append(_meal_plan_from_row(row, idx))
     return plans
 
+def select_incremental_plans(plans: List[MealPlan], watermark: int,
+                             replay_ratio: float = 0.1, seed: int = 42) -> Tuple[List[MealPlan], Dict[str, int]]:
+    """Select plans added after `watermark` plus a small replay sample of older plans.
+
+    `doctor_plans.csv` is append-only, so the watermark is the number of plan
+    rows already trained on. Replay samples whole patients from the older rows
+    so weekly grouping still sees complete weeks.
+    """
+    watermark = max(0, min(watermark, len(plans)))
+    new_plans = plans[watermark:]
+    old_plans = plans[:watermark]
+
+    replay_plans: List[MealPlan] = []
+    target = int(round(len(new_plans) * replay_ratio))
+    if target > 0 and old_plans:
+        by_patient: Dict[str, List[MealPlan]] = {}
+        for plan in old_plans:
+            by_patient.setdefault(plan.patient_id, []).append(plan)
+        rng = np.random.default_rng(seed)
+        patient_ids = list(by_patient.keys())
+        for i in rng.permutation(len(patient_ids)):
+            replay_plans.extend(by_patient[patient_ids[i]])
+            if len(replay_plans) >= target:
+                break
+
+    stats = {
+        'num_new_plans': len(new_plans),
+        'num_replay_plans': len(replay_plans),
+        'previous_watermark': watermark,
+    }
+    return new_plans + replay_plans, stats
+
 def create_sample_data(foods_path: str, patients_path: str, plans_path: str):
     """Create sample CSV files if they don't exist"""
 
@@ -485,9 +667,86 @@ def huggingface_login(token: Optional[str] = None):
 def compute_metrics(p: EvalPrediction) -> Dict[str, float]:
     """Compute metrics for evaluation"""
     # EvalPrediction has predictions and label_ids, not metrics
-    # For now, just return empty dict since loss is computed automatically
+    # Loss is computed automatically; plan quality metrics (item F1, parse
+    # success) are added in MealPlanHFTrainer.evaluation_loop by
+    # GenerationEvalCallback, which decodes the validation set in batches
+    # instead of scoring teacher-forced logits
     return {}
 
+class MealPlanHFTrainer(Trainer):
+    """Hugging Face Trainer for meal plans.
+
+    Reports every training batch to callbacks with `record_batch` and the time
+    spent on evaluation and checkpoints with `record_pause`, and weights the
+    per-sample loss by `sample_weight` when batches carry one (compacted
+    datasets).
+    """
+
+    def training_step(self, model, inputs, *args, **kwargs):
+        for callback in self.callback_handler.callbacks:
+            if hasattr(callback, 'record_batch'):
+                callback.record_batch(inputs)
+        return super().training_step(model, inputs, *args, **kwargs)
+
+    def _record_pause(self, start: float):
+        for callback in self.callback_handler.callbacks:
+            if hasattr(callback, 'record_pause'):
+                callback.record_pause(time.perf_counter() - start)
+
+    def evaluate(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().evaluate(*args, **kwargs)
+        finally:
+            self._record_pause(start)
+
+    def evaluation_loop(self, dataloader, description, prediction_loss_only=None, ignore_keys=None,
+                        metric_key_prefix="eval"):
+        output = super().evaluation_loop(dataloader, description, prediction_loss_only=prediction_loss_only,
+                                         ignore_keys=ignore_keys, metric_key_prefix=metric_key_prefix)
+        # Generation scores join the metrics before evaluate() logs them
+        if metric_key_prefix.startswith("eval"):
+            for callback in self.callback_handler.callbacks:
+                if hasattr(callback, 'add_metrics'):
+                    callback.add_metrics(self.state, output.metrics, metric_key_prefix)
+        return output
+
+    def _save_checkpoint(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super()._save_checkpoint(*args, **kwargs)
+        finally:
+            self._record_pause(start)
+
+    def get_train_dataloader(self):
+        if not isinstance(self.train_dataset, StreamingMealPlanDataset):
+            return super().get_train_dataloader()
+        # The dataset shards itself across ranks and workers, so the loader is
+        # not handed to accelerate, which would split or dispatch the stream again
+        return DataLoader(
+            self.train_dataset,
+            batch_size=self._train_batch_size,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+        )
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        weights = inputs.pop('sample_weight', None)
+        if weights is None:
+            return super().compute_loss(model, inputs, return_outputs=return_outputs, **kwargs)
+        labels = inputs['labels']
+        outputs = model(**inputs)
+        token_loss = torch.nn.functional.cross_entropy(
+            outputs.logits.view(-1, outputs.logits.size(-1)).float(), labels.view(-1),
+            ignore_index=-100, reduction='none'
+        ).view(labels.shape)
+        mask = (labels != -100).float()
+        sample_loss = (token_loss * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+        weights = weights.to(sample_loss.dtype)
+        loss = (sample_loss * weights).sum() / weights.sum()
+        return (loss, outputs) if return_outputs else loss
+
 class MealPlanTrainer:
     """Trainer class for meal planning models"""
     
@@ -498,6 +757,11 @@ class MealPlanTrainer:
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(exist_ok=True)
         self.engine = None
+        self.lora_base_dir: Optional[Path] = None
+        # Evaluation results of the last train() call
+        self.eval_history: List[Dict[str, float]] = []
+        self.best_metric: Optional[float] = None
+        self.compaction_stats: Optional[Dict[str, Any]] = None
         
     def initialize_engine(self):
         """Initialize the hybrid neural engine"""
@@ -528,14 +792,139 @@ class MealPlanTrainer:
         
         return foods, patients, plans
     
+    def load_checkpoint(self, model_dir: str):
+        """Resume from a trained checkpoint instead of the base pretrained model"""
+        if self.engine is None:
+            self.initialize_engine()
+        self.engine.load_model(model_dir)
+        return self.engine
+    
+    def _prepare_lora(self, lora: Dict[str, Any]) -> Path:
+        """Freeze the base model and wrap it with trainable LoRA adapters.
+
+        Adapters are only valid on top of the exact base weights (including
+        the resized special-token embeddings). Without a loaded checkpoint, a
+        freshly initialized base is persisted once under
+        models/adapters/_base/<model_name> (outside the server's model scan)
+        and reused.
+        """
+        if get_peft_model is None:
+            raise ImportError("LoRA training requires the 'peft' package (pip install peft)")
+        
+        if self.engine.model_dir is None:
+            base_dir = self.models_dir / "adapters" / "_base" / self.model_name
+            if (base_dir / "config.json").exists():
+                self.engine.load_model(str(base_dir))
+            else:
+                self.engine.save_model(base_dir)
+        self.lora_base_dir = Path(self.engine.model_dir)
+        
+        config = LoraConfig(
+            task_type=TaskType.SEQ_2_SEQ_LM,
+            r=lora.get('r', 8),
+            lora_alpha=lora.get('alpha', 16),
+            lora_dropout=lora.get('dropout', 0.05),
+            target_modules=lora.get('target_modules', ["q", "v"]),
+        )
+        self.engine.planner.model = get_peft_model(self.engine.planner.model, config)
+        self.engine.planner.model.print_trainable_parameters()
+        return self.lora_base_dir
+    
+    def _save_adapter(self, output_dir: Path) -> str:
+        """Save only the LoRA adapter weights plus a pointer to their base model"""
+        self.engine.planner.model.save_pretrained(output_dir)
+        with open(output_dir / "adapter_meta.json", "w") as f:
+            json.dump({
+                'base_model': str(self.lora_base_dir),
+                'model_name': self.model_name,
+            }, f, indent=2)
+        print(f"✓ Adapter saved to {output_dir}")
+        return str(output_dir)
+    
+    def build_dataset(self, patients: List[Patient], plans: List[MealPlan],
+                      weekly_mode: bool = True, max_input_length: int = 512,
+                      max_target_length: int = 512) -> AyurvedaMealPlanDataset:
+        """Build the text dataset used for training"""
+        if self.engine is None:
+            self.initialize_engine()
+        return AyurvedaMealPlanDataset(
+            patients, plans, self.engine.tokenizer, 
+            model_type=self.model_type, weekly_mode=weekly_mode,
+            max_input_length=max_input_length,
+            max_target_length=max_target_length
+        )
+    
+    def build_streaming_dataset(self, plan_files: List[str], patients: List[Patient],
+                                weekly_mode: bool = True, max_input_length: int = 512,
+                                max_target_length: int = 512, shuffle_buffer: int = 1024,
+                                seed: int = 42) -> StreamingMealPlanDataset:
+        """Build a dataset that streams plans from CSV shards instead of memory"""
+        if self.engine is None:
+            self.initialize_engine()
+        return StreamingMealPlanDataset(
+            plan_files, patients, self.engine.tokenizer,
+            weekly_mode=weekly_mode, max_input_length=max_input_length,
+            max_target_length=max_target_length, model_type=self.model_type,
+            shuffle_buffer=shuffle_buffer, seed=seed
+        )
+    
+    def pretokenize(self, patients: List[Patient], plans: List[MealPlan],
+                    token_cache_dir: str, weekly_mode: bool = True,
+                    max_input_length: int = 512, max_target_length: int = 512) -> str:
+        """Tokenize the training data once into a memory-mapped token cache"""
+        dataset = self.build_dataset(patients, plans, weekly_mode,
+                                     max_input_length, max_target_length)
+        return str(build_token_cache(dataset, token_cache_dir))
+    
     def train(self, foods: List[Food], patients: List[Patient], plans: List[MealPlan],
              output_dir: str = None, num_epochs: int = 3, batch_size: int = 2,
              learning_rate: float = 3e-4, weekly_mode: bool = True, 
-             val_split: float = 0.1, save_model: bool = True):
-        """Train the meal planning model"""
+             val_split: float = 0.1, save_model: bool = True,
+             max_input_length: int = 512, max_target_length: int = 512,
+             token_cache_dir: Optional[str] = None, dataloader_num_workers: int = 0,
+             seed: int = 42, ddp_backend: Optional[str] = None,
+             callbacks: Optional[List] = None, lora: Optional[Dict[str, Any]] = None,
+             dataset: Optional[AyurvedaMealPlanDataset] = None,
+             generation_eval: bool = False, generation_eval_samples: Optional[int] = None,
+             early_stopping_patience: Optional[int] = None,
+             compact: bool = False, dedup_threshold: float = 0.9, max_steps: int = -1,
+             pairing_plans: Optional[List[MealPlan]] = None):
+        """Train the meal planning model.
+
+        When launched under torchrun (one process per rank), the Trainer wraps
+        the model in DistributedDataParallel using `ddp_backend` ("gloo" for
+        CPU-only machines) and shards batches across ranks.
+
+        With `lora` (r, alpha, dropout, target_modules) only low-rank adapters
+        are trained and `output_dir` receives the adapter instead of full weights.
+
+        A prebuilt `dataset` (e.g. a TextPairDataset of pseudo-labels) replaces
+        the one normally built from `patients` and `plans`.
+
+        With `generation_eval`, every evaluation also decodes the validation set
+        (or `generation_eval_samples` of it) and scores slot-level item F1
+        against the doctor plans; the best checkpoint and early stopping
+        (`early_stopping_patience` evaluations) then use item F1 instead of loss.
+        Generation eval is skipped under distributed training.
+
+        With `compact`, exact and near-duplicate samples (MinHash similarity of
+        both input and target >= `dedup_threshold`) are collapsed into one
+        representative whose loss is weighted by its cluster size; the report
+        is kept in `self.compaction_stats` and `compaction_report.json`.
+
+        A StreamingMealPlanDataset trains for `max_steps` without a validation
+        split; samples are never materialized in memory.
+
+        The food pairing saved with the model is built from `pairing_plans`
+        (default `plans`), so a run on a subset of plans can still ship
+        statistics of the full history.
+        """
         
+        set_seed(seed)
         if self.engine is None:
             self.initialize_engine()
+        if lora is not None:
+            self._prepare_lora(lora)
         
         if output_dir is None:
             output_dir = self.models_dir / "ayurveda_meal_planner"
@@ -548,76 +937,156 @@ class MealPlanTrainer:
         graph_data = self.engine.build_knowledge_graph(foods, patients)
         print(f"✓ Graph built with {graph_data.x.shape[0]} nodes")
         
+        # Food co-occurrence statistics of the doctor plans, saved with the model
+        pairing_plans = plans if pairing_plans is None else pairing_plans
+        if pairing_plans:
+            self.engine.build_food_pairing(pairing_plans)
+        
         # Prepare dataset
         print(f"📚 Preparing {'weekly' if weekly_mode else 'daily'} training dataset...")
-        dataset = AyurvedaMealPlanDataset(
-            patients, plans, self.engine.tokenizer, 
-            model_type=self.model_type, weekly_mode=weekly_mode
-        )
-        
-        if len(dataset) == 0:
-            raise ValueError("No training data available. Check your data files.")
+        if dataset is None:
+            dataset = self.build_dataset(patients, plans, weekly_mode,
+                                         max_input_length, max_target_length)
         
-        # Split into train and validation
-        train_size = int((1 - val_split) * len(dataset))
-        val_size = len(dataset) - train_size
-        
-        if train_size > 0:
-            train_dataset, val_dataset = torch.utils.data.random_split(
-                dataset, [train_size, val_size]
-            )
+        callbacks = list(callbacks or [])
+        streaming = isinstance(dataset, IterableDataset)
+        if streaming:
+            # The stream has no length: no split, compaction or token cache, and
+            # training length is set by `max_steps`
+            if max_steps <= 0:
+                raise ValueError("Streaming datasets need max_steps > 0")
+            train_dataset, val_dataset, text_dataset = dataset, None, None
+            train_size, val_size = max_steps * batch_size, 0
+            callbacks.append(StreamingEpochCallback(dataset))
+        else:
+            if len(dataset) == 0:
+                raise ValueError("No training data available. Check your data files.")
             
-            print(f"✓ Train set: {len(train_dataset)} samples")
-            print(f"✓ Validation set: {len(val_dataset)} samples")
+            # Collapse duplicate samples into weighted representatives
+            weights = None
+            if compact:
+                print("🧹 Compacting dataset (exact + near-duplicate removal)...")
+                keep, weights, self.compaction_stats = compact_dataset(dataset, threshold=dedup_threshold, seed=seed)
+                dataset = TextPairDataset(
+                    [dataset.get_text_pair(i) for i in keep], self.engine.tokenizer,
+                    max_input_length=dataset.max_input_length, max_target_length=dataset.max_target_length,
+                    model_type=dataset.model_type, weekly_mode=weekly_mode
+                )
+                with open(output_dir / "compaction_report.json", "w") as f:
+                    json.dump(self.compaction_stats, f, indent=2)
+                print(f"✓ Removed {self.compaction_stats['num_removed']} of {self.compaction_stats['num_samples']} samples "
+                      f"({self.compaction_stats['num_exact_duplicates']} exact, "
+                      f"{self.compaction_stats['num_near_duplicates']} near duplicates)")
+            text_dataset = dataset
             
-            # Training arguments
-            training_args = TrainingArguments(
-                output_dir=str(output_dir),
-                num_train_epochs=num_epochs,
-                per_device_train_batch_size=batch_size,
-                per_device_eval_batch_size=batch_size,
-                learning_rate=learning_rate,
-                warmup_steps=min(50, len(train_dataset) // 4),
-                logging_dir=f"{output_dir}/logs",
-                logging_steps=max(1, len(train_dataset) // (batch_size * 4)),
-                save_steps=max(10, len(train_dataset) // (batch_size * 2)),
-                eval_steps=max(10, len(train_dataset) // (batch_size * 2)) if val_size > 0 else None,
-                eval_strategy="steps" if val_size > 0 else "no",
-                save_total_limit=2,
-                load_best_model_at_end=True if val_size > 0 else False,
-                metric_for_best_model="eval_loss" if val_size > 0 else None,
-                greater_is_better=False,
-                fp16=torch.cuda.is_available(),
-                dataloader_pin_memory=False,
-                report_to="none",
-                prediction_loss_only=False,
-                remove_unused_columns=False,
-            )
+            # Serve pre-tokenized samples from the memory-mapped cache when enabled
+            if token_cache_dir:
+                dataset = load_or_build_token_cache(dataset, token_cache_dir)
+            if weights is not None:
+                dataset = WeightedDataset(dataset, weights)
             
-            # Initialize trainer
-            trainer = Trainer(
-                model=self.engine.planner.model,
-                args=training_args,
-                train_dataset=train_dataset,
-                eval_dataset=val_dataset if val_size > 0 else None,
-                tokenizer=self.engine.tokenizer,
-                compute_metrics=compute_metrics if val_size > 0 else None,
+            # Split into train and validation
+            train_size = int((1 - val_split) * len(dataset))
+            val_size = len(dataset) - train_size
+            if train_size <= 0:
+                raise ValueError("Not enough data for training")
+            
+            # Seeded split so every rank agrees on the same train/validation sets
+            train_dataset, val_dataset = torch.utils.data.random_split(
+                dataset, [train_size, val_size],
+                generator=torch.Generator().manual_seed(seed)
             )
             
-            # Train the model
+            print(f"✓ Train set: {len(train_dataset)} samples")
+            print(f"✓ Validation set: {len(val_dataset)} samples")
+        
+        use_generation_eval = generation_eval and val_size > 0 and ddp_backend is None
+        if use_generation_eval:
+            val_pairs = [text_dataset.get_text_pair(i) for i in val_dataset.indices]
+            callbacks.append(GenerationEvalCallback(
+                self.engine, val_pairs, weekly_mode=weekly_mode,
+                cache_file=str(output_dir / "generation_eval.json"),
+                max_new_tokens=max_target_length, max_input_length=max_input_length,
+                max_samples=generation_eval_samples, seed=seed
+            ))
+        if early_stopping_patience and val_size > 0:
+            callbacks.append(EarlyStoppingCallback(early_stopping_patience=early_stopping_patience))
+        
+        # Training arguments
+        training_args = TrainingArguments(
+            output_dir=str(output_dir),
+            num_train_epochs=num_epochs,
+            per_device_train_batch_size=batch_size,
+            per_device_eval_batch_size=batch_size,
+            learning_rate=learning_rate,
+            warmup_steps=min(50, train_size // 4),
+            logging_dir=f"{output_dir}/logs",
+            logging_steps=max(1, train_size // (batch_size * 4)),
+            save_steps=max(10, train_size // (batch_size * 2)),
+            eval_steps=max(10, train_size // (batch_size * 2)) if val_size > 0 else None,
+            eval_strategy="steps" if val_size > 0 else "no",
+            save_total_limit=2,
+            load_best_model_at_end=True if val_size > 0 else False,
+            metric_for_best_model=("eval_item_f1" if use_generation_eval else "eval_loss") if val_size > 0 else None,
+            greater_is_better=use_generation_eval,
+            fp16=torch.cuda.is_available() and ddp_backend != "gloo",
+            use_cpu=ddp_backend == "gloo",
+            ddp_backend=ddp_backend,
+            ddp_find_unused_parameters=False if ddp_backend else None,
+            seed=seed,
+            data_seed=seed,
+            dataloader_pin_memory=False,
+            dataloader_num_workers=dataloader_num_workers,
+            max_steps=max_steps,
+            group_by_length=not streaming,  # batch similar lengths to minimise padding
+            report_to="none",
+            prediction_loss_only=False,
+            remove_unused_columns=False,
+        )
+        
+        # Pad each batch only to its longest sequence
+        data_collator = DataCollatorForSeq2Seq(
+            self.engine.tokenizer,
+            model=self.engine.planner.model,
+            label_pad_token_id=-100,
+            pad_to_multiple_of=8 if torch.cuda.is_available() else None,
+        )
+        
+        # Initialize trainer
+        trainer = MealPlanHFTrainer(
+            model=self.engine.planner.model,
+            args=training_args,
+            train_dataset=train_dataset,
+            eval_dataset=val_dataset if val_size > 0 else None,
+            tokenizer=self.engine.tokenizer,
+            data_collator=data_collator,
+            compute_metrics=compute_metrics if val_size > 0 else None,
+            callbacks=callbacks,
+        )
+        
+        # Train the model
+        if streaming:
+            print(f"🎯 Starting streaming training for {max_steps} steps...")
+        else:
             print(f"🎯 Starting training for {num_epochs} epochs...")
-            trainer.train()
-            
-            # Save the model
-            if save_model:
-                print("💾 Saving model...")
-                model_path = self.engine.save_model(output_dir)
-                print(f"✓ Model saved to {model_path}")
-                return model_path
-            else:
-                return str(output_dir)
+        trainer.train()
+        self.eval_history = [
+            entry for entry in trainer.state.log_history
+            if any(key.startswith('eval_') for key in entry)
+        ]
+        self.best_metric = trainer.state.best_metric
+        
+        # Save the model (only once, from the main process)
+        if save_model and trainer.is_world_process_zero() and lora is not None:
+            print("💾 Saving adapter...")
+            return self._save_adapter(output_dir)
+        elif save_model and trainer.is_world_process_zero():
+            print("💾 Saving model...")
+            model_path = self.engine.save_model(output_dir)
+            print(f"✓ Model saved to {model_path}")
+            return model_path
         else:
-            raise ValueError("Not enough data for training")
+            return str(output_dir)
 
 def main():
     """Main training function"""
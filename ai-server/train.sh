@@ -30,6 +30,7 @@ LEARNING_RATE=3e-4
 MODEL_NAME="t5-small"
 OUTPUT_NAME="ayurveda_meal_planner"
 WEEKLY_MODE="--weekly-mode"
+NPROC=1
 
 # Parse command line arguments
 while [[ $# -gt 0 ]]; do
@@ -58,6 +59,10 @@ while [[ $# -gt 0 ]]; do
             WEEKLY_MODE="--daily-mode"
             shift
             ;;
+        --nproc)
+            NPROC="$2"
+            shift 2
+            ;;
         --force)
             FORCE="--force"
             shift
@@ -72,6 +77,7 @@ while [[ $# -gt 0 ]]; do
             echo "  --model-name NAME    Base model (t5-small, t5-base, t5-large) (default: t5-small)"
             echo "  --output-name NAME   Output model name (default: ayurveda_meal_planner)"
             echo "  --daily-mode         Train for daily plans instead of weekly"
+            echo "  --nproc NUM          CPU data-parallel training processes (default: 1)"
             echo "  --force              Overwrite existing model"
             echo "  --help               Show this help"
             echo ""
@@ -80,6 +86,7 @@ while [[ $# -gt 0 ]]; do
             echo "  $0 --epochs 10 --batch-size 4        # Custom training"
             echo "  $0 --model-name t5-base --force       # Use larger model"
             echo "  $0 --daily-mode --output-name daily   # Train daily model"
+            echo "  $0 --nproc 4                          # 4-process CPU training"
             exit 0
             ;;
         *)
@@ -97,6 +104,7 @@ echo "   Learning Rate: $LEARNING_RATE"
 echo "   Model: $MODEL_NAME"
 echo "   Output: $OUTPUT_NAME"
 echo "   Mode: $(echo $WEEKLY_MODE | sed 's/--//' | sed 's/-mode//')"
+echo "   Processes: $NPROC"
 echo ""
 
 # Run the training script
@@ -107,6 +115,7 @@ python train_model.py \
     --learning-rate $LEARNING_RATE \
     --model-name $MODEL_NAME \
     --output-name $OUTPUT_NAME \
+    --nproc $NPROC \
     $WEEKLY_MODE \
     $FORCE
 
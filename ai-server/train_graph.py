@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Graph Encoder Training for the Ayurveda Knowledge Graph
+
+Trains the `GraphNeuralNetwork` food/patient encoder with a link prediction
+objective on neighbor-sampled mini-batches, so training cost depends on the
+batch size and fan-out rather than on the size of the graph. Supervision
+edges are food-condition ("beneficial_for") and patient-food edges taken from
+the doctor plans; every other knowledge graph edge is used for message
+passing only.
+
+The encoder checkpoint (`graph_encoder.pt`) and a report
+(`graph_training.json`, including throughput in edges/s) are written next to
+the T5 model.
+
+Usage:
+    python train_graph.py [options]
+
+Options:
+    --epochs INT        Number of training epochs (default: 10)
+    --batch-size INT    Supervision edges per mini-batch (default: 512)
+    --learning-rate FLOAT Learning rate (default: 1e-3)
+    --hidden-dim INT    Hidden size of the GCN layers (default: 128)
+    --embedding-dim INT Output embedding size (default: 64)
+    --num-neighbors STR Neighbors sampled per layer, comma separated (default: 15,10,5)
+    --num-workers INT   Neighbor sampling loader workers (default: 0)
+    --val-split FLOAT   Fraction of supervision edges held out (default: 0.1)
+    --threads INT       CPU threads for training (default: all)
+    --dataset-dir STR   Directory containing the training CSVs (default: ../docs/datasets)
+    --models-dir STR    Directory where trained models are stored (default: ./models next to this script)
+    --model-dir STR     T5 model directory to save the encoder into (default: models/ayurveda_meal_planner)
+    --seed INT          Random seed (default: 42)
+"""
+
+import os
+import sys
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Add the current directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+import torch.nn.functional as F
+from torch_geometric.data import Data
+from torch_geometric.loader import LinkNeighborLoader
+from torch_geometric.utils import to_undirected
+
+from model import AyurvedaKnowledgeGraph, Food, GraphNeuralNetwork, MealPlan, Patient
+from train_model import load_datasets, setup_directories
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SUPERVISION_RELATIONS = ("beneficial_for", "prescribed")
+
+
+def build_training_graph(foods: List[Food], patients: List[Patient],
+                         plans: List[MealPlan]) -> Tuple[AyurvedaKnowledgeGraph, Data, torch.Tensor]:
+    """Knowledge graph with patient-food plan edges.
+
+    Returns the graph, its PyG data with message passing edges only, and the
+    supervision edges (2 x E) to predict.
+    """
+    kg = AyurvedaKnowledgeGraph()
+    for food in foods:
+        kg.add_food_node(food)
+    for patient in patients:
+        kg.add_patient_node(patient)
+    kg.add_plan_edges(plans, foods)
+
+    data = kg.to_pytorch_geometric()
+    supervision, message = [], []
+    for u, v, attrs in kg.graph.edges(data=True):
+        edge = (kg.node_to_idx[u], kg.node_to_idx[v])
+        (supervision if attrs.get('relation') in SUPERVISION_RELATIONS else message).append(edge)
+    data.edge_index = torch.tensor(message, dtype=torch.long).t().reshape(2, -1)
+    return kg, data, torch.tensor(supervision, dtype=torch.long).t().reshape(2, -1)
+
+
+def link_logits(encoder: GraphNeuralNetwork, batch: Data) -> torch.Tensor:
+    """Dot-product decoder over the batch's labelled node pairs"""
+    z = encoder(batch.x, batch.edge_index)
+    src, dst = batch.edge_label_index
+    return (z[src] * z[dst]).sum(dim=-1)
+
+
+def _auc(scores: torch.Tensor, labels: torch.Tensor) -> float:
+    """ROC AUC via the rank-sum statistic"""
+    pos, neg = int(labels.sum()), int((1 - labels).sum())
+    if pos == 0 or neg == 0:
+        return float('nan')
+    ranks = torch.empty_like(scores)
+    ranks[scores.argsort()] = torch.arange(1, len(scores) + 1, dtype=scores.dtype)
+    return float((ranks[labels == 1].sum() - pos * (pos + 1) / 2) / (pos * neg))
+
+
+@torch.no_grad()
+def evaluate(encoder: GraphNeuralNetwork, loader: LinkNeighborLoader) -> Dict[str, float]:
+    encoder.eval()
+    scores, labels, loss_sum = [], [], 0.0
+    for batch in loader:
+        logits = link_logits(encoder, batch)
+        loss_sum += float(F.binary_cross_entropy_with_logits(logits, batch.edge_label, reduction='sum'))
+        scores.append(logits)
+        labels.append(batch.edge_label)
+    scores, labels = torch.cat(scores), torch.cat(labels)
+    return {
+        'val_loss': round(loss_sum / len(labels), 4),
+        'val_auc': round(_auc(scores, labels), 4),
+        'val_accuracy': round(float(((scores > 0).float() == labels).float().mean()), 4),
+    }
+
+
+def train_graph_encoder(foods: List[Food], patients: List[Patient], plans: List[MealPlan],
+                        output_dir: str, epochs: int = 10, batch_size: int = 512,
+                        learning_rate: float = 1e-3, hidden_dim: int = 128,
+                        embedding_dim: int = 64, num_neighbors: Tuple[int, ...] = (15, 10, 5),
+                        num_workers: int = 0, val_split: float = 0.1, seed: int = 42) -> Dict:
+    """Train the graph encoder with neighbor-sampled link prediction on CPU"""
+    torch.manual_seed(seed)
+    kg, data, supervision = build_training_graph(foods, patients, plans)
+    num_edges = supervision.size(1)
+    if num_edges < 2:
+        raise ValueError("No food-condition or patient-food edges to train on")
+    logger.info(f"✓ Graph: {data.num_nodes} nodes, {data.edge_index.size(1)} message edges, "
+                f"{num_edges} supervision edges")
+
+    # Hold out supervision edges; they are never used for message passing
+    perm = torch.randperm(num_edges, generator=torch.Generator().manual_seed(seed))
+    num_val = max(1, int(num_edges * val_split))
+    val_edges, train_edges = supervision[:, perm[:num_val]], supervision[:, perm[num_val:]]
+    data.edge_index = to_undirected(torch.cat([data.edge_index, train_edges], dim=1),
+                                    num_nodes=data.num_nodes)
+
+    loader_kwargs = dict(
+        num_neighbors=list(num_neighbors),
+        neg_sampling_ratio=1.0,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0,
+    )
+    # Without an explicit edge_label, binary negative sampling labels
+    # positives 1 and sampled negatives 0
+    train_loader = LinkNeighborLoader(data, edge_label_index=train_edges, shuffle=True, **loader_kwargs)
+    val_loader = LinkNeighborLoader(data, edge_label_index=val_edges, shuffle=False, **loader_kwargs)
+
+    encoder = GraphNeuralNetwork(data.num_features, hidden_dim, embedding_dim)
+    optimizer = torch.optim.Adam(encoder.parameters(), lr=learning_rate)
+
+    history = []
+    total_edges, total_seconds = 0, 0.0
+    for epoch in range(1, epochs + 1):
+        encoder.train()
+        epoch_loss, epoch_edges = 0.0, 0
+        start = time.perf_counter()
+        for batch in train_loader:
+            optimizer.zero_grad()
+            logits = link_logits(encoder, batch)
+            loss = F.binary_cross_entropy_with_logits(logits, batch.edge_label)
+            loss.backward()
+            optimizer.step()
+            epoch_loss += float(loss) * logits.numel()
+            epoch_edges += logits.numel()
+        seconds = time.perf_counter() - start
+        total_edges += epoch_edges
+        total_seconds += seconds
+        metrics = {
+            'epoch': epoch,
+            'train_loss': round(epoch_loss / max(epoch_edges, 1), 4),
+            'edges_per_second': round(epoch_edges / seconds, 1) if seconds else None,
+            **evaluate(encoder, val_loader),
+        }
+        history.append(metrics)
+        logger.info(f"  epoch {epoch}: loss {metrics['train_loss']}, val AUC {metrics['val_auc']}, "
+                    f"{metrics['edges_per_second']} edges/s")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    torch.save({
+        'state_dict': encoder.state_dict(),
+        'input_dim': data.num_features,
+        'hidden_dim': hidden_dim,
+        'output_dim': embedding_dim,
+        'node_to_idx': kg.node_to_idx,
+    }, output_dir / "graph_encoder.pt")
+
+    report = {
+        'num_nodes': data.num_nodes,
+        'num_message_edges': int(data.edge_index.size(1)),
+        'num_train_edges': int(train_edges.size(1)),
+        'num_val_edges': int(val_edges.size(1)),
+        'num_neighbors': list(num_neighbors),
+        'batch_size': batch_size,
+        'num_workers': num_workers,
+        'threads': torch.get_num_threads(),
+        'edges_per_second': round(total_edges / total_seconds, 1) if total_seconds else None,
+        'train_seconds': round(total_seconds, 2),
+        'history': history,
+    }
+    with open(output_dir / "graph_training.json", "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Train the Ayurveda knowledge graph encoder (link prediction)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+    # Train the encoder next to the default T5 model
+    python train_graph.py
+
+    # Larger fan-out with 4 sampling workers
+    python train_graph.py --num-neighbors 25,15,10 --num-workers 4
+        """
+    )
+    parser.add_argument('--epochs', type=int, default=10, help='Number of training epochs (default: 10)')
+    parser.add_argument('--batch-size', type=int, default=512, help='Supervision edges per mini-batch (default: 512)')
+    parser.add_argument('--learning-rate', type=float, default=1e-3, help='Learning rate (default: 1e-3)')
+    parser.add_argument('--hidden-dim', type=int, default=128, help='Hidden size of the GCN layers (default: 128)')
+    parser.add_argument('--embedding-dim', type=int, default=64, help='Output embedding size (default: 64)')
+    parser.add_argument('--num-neighbors', type=str, default='15,10,5',
+                        help='Neighbors sampled per layer, comma separated (default: 15,10,5)')
+    parser.add_argument('--num-workers', type=int, default=0, help='Neighbor sampling loader workers (default: 0)')
+    parser.add_argument('--val-split', type=float, default=0.1, help='Fraction of supervision edges held out (default: 0.1)')
+    parser.add_argument('--threads', type=int, default=None, help='CPU threads for training (default: all)')
+    parser.add_argument('--dataset-dir', type=str, default=None, help='Directory containing the training CSVs')
+    parser.add_argument('--models-dir', type=str, default=None, help='Directory where trained models are stored')
+    parser.add_argument('--model-dir', type=str, default=None,
+                        help='T5 model directory to save the encoder into (default: models/ayurveda_meal_planner)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    return parser.parse_args()
+
+
+def main():
+    """Main graph training function"""
+    logger.info("=" * 60)
+    logger.info("🕸️  Ayurveda Knowledge Graph Encoder Training")
+    logger.info("=" * 60)
+
+    args = parse_arguments()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    dataset_dir, models_dir = setup_directories(args.dataset_dir, args.models_dir)
+    output_dir = Path(args.model_dir) if args.model_dir else models_dir / "ayurveda_meal_planner"
+
+    try:
+        foods, patients, plans = load_datasets(dataset_dir)
+    except Exception as e:
+        logger.error(f"Failed to load datasets: {e}")
+        return 1
+
+    try:
+        report = train_graph_encoder(
+            foods, patients, plans,
+            output_dir=str(output_dir),
+            epochs=args.epochs,
+            batch_size=args.batch_size,
+            learning_rate=args.learning_rate,
+            hidden_dim=args.hidden_dim,
+            embedding_dim=args.embedding_dim,
+            num_neighbors=tuple(int(n) for n in args.num_neighbors.split(',')),
+            num_workers=args.num_workers,
+            val_split=args.val_split,
+            seed=args.seed
+        )
+    except Exception as e:
+        logger.error(f"❌ Graph training failed: {e}")
+        return 1
+
+    final = report['history'][-1] if report['history'] else {}
+    logger.info("=" * 60)
+    logger.info("✅ Graph encoder training completed!")
+    logger.info(f"📁 Encoder saved to: {output_dir / 'graph_encoder.pt'}")
+    logger.info(f"📈 Throughput: {report['edges_per_second']} edges/s, final val AUC {final.get('val_auc')}")
+    logger.info("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
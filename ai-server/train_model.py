@@ -15,6 +15,41 @@ Options:
     --model-name STR    Base model name (default: t5-small)
     --weekly-mode       Train for weekly plans (default: True)
     --output-name STR   Output model directory name (default: ayurveda_meal_planner)
+    --max-input-length INT  Truncation limit for patient inputs (default: 128)
+    --max-target-length INT Truncation limit for meal plan targets (default: 512)
+    --token-cache-dir STR   Directory for the pre-tokenized token cache (default: models/token_cache)
+    --no-token-cache        Tokenize on the fly instead of using the token cache
+    --pretokenize-only      Build the token cache and exit
+    --dataloader-workers INT Number of DataLoader worker processes (default: 0)
+    --nproc INT         Number of CPU data-parallel training processes (default: 1)
+    --dataset-dir STR   Directory containing the training CSVs (default: ../docs/datasets)
+    --models-dir STR    Directory where trained models are stored (default: ./models next to this script)
+    --progress-file STR Write training progress JSON to this file (used by the job manager)
+    --incremental       Resume from the deployed model and train only on plans added since the last run
+    --base-model STR    Checkpoint to resume from in incremental mode (default: the output model),
+                        or to train a --lora adapter on (default: models/ayurveda_meal_planner)
+    --replay-ratio FLOAT Fraction of older plans mixed into incremental runs (default: 0.1)
+    --lora              Train a LoRA adapter (saved to models/adapters/<output-name>) on the served model
+    --lora-r INT        LoRA rank (default: 8)
+    --lora-alpha INT    LoRA scaling alpha (default: 16)
+    --lora-dropout FLOAT LoRA dropout (default: 0.05)
+    --sweep PATH        Run a parallel hyperparameter sweep from a JSON spec
+    --sweep-threads-per-trial INT CPU threads per sweep trial (default: 2)
+    --sweep-workers INT Concurrent sweep trials (default: cores / threads per trial)
+    --distill           Train a teacher, pseudo-label the cohort and train --model-name as the student
+    --teacher-model-name STR Teacher base model for --distill (default: t5-base)
+    --teacher-dir STR   Reuse an already trained teacher instead of training one
+    --distill-eval-size INT Held-out patients for the teacher/student report (default: 20)
+    --profile-steps INT Trace N training steps with torch.profiler (default: 0, off)
+    --streaming         Stream plan shards from disk instead of loading them (needs --max-steps)
+    --max-steps INT     Training steps for --streaming (default: -1, epochs)
+    --plan-shards GLOB  Plan CSV shards to stream, relative to the dataset dir (default: doctor_plans*.csv)
+    --shuffle-buffer INT Samples held in the streaming shuffle buffer (default: 1024)
+    --compact           Collapse exact/near-duplicate samples into weighted representatives
+    --dedup-threshold FLOAT MinHash similarity treated as a near duplicate (default: 0.9)
+    --generation-eval   Score generated plans (item F1, parse success) at each evaluation
+    --generation-eval-samples INT Validation samples decoded per evaluation (default: all)
+    --early-stopping-patience INT Stop after N evaluations without improvement
     --force             Overwrite existing model
     --help              Show this help message
 """
@@ -30,13 +65,19 @@ import json
 # Add the current directory to Python path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from transformers import set_seed
+
 from model import HybridNeuralEngine
+from training_callbacks import ProgressCallback, ThroughputCallback
+from distill import run_distillation
+from sweep import load_sweep_spec, run_sweep
 from train import (
     MealPlanTrainer, 
     load_foods_csv, 
     load_patients_csv, 
     load_doctor_plans_csv,
-    create_sample_data
+    create_sample_data,
+    select_incremental_plans
 )
 
 # Configure logging
@@ -68,6 +109,18 @@ Examples:
     
     # Force overwrite existing model
     python train_model.py --force --output-name my_model
+    
+    # Daily update: fine-tune the deployed model on newly added doctor plans
+    python train_model.py --incremental --epochs 1
+    
+    # Distill a t5-large teacher into a t5-small student
+    python train_model.py --distill --teacher-model-name t5-large --output-name distilled
+    
+    # Per-clinic LoRA adapter served with {"adapter": "clinic_a"}
+    python train_model.py --lora --output-name clinic_a
+    
+    # Data-parallel training on a many-core CPU box (gloo backend)
+    python train_model.py --nproc 4
         """
     )
     
@@ -133,6 +186,238 @@ Examples:
         help='Validation split ratio (default: 0.1)'
     )
     
+    parser.add_argument(
+        '--max-input-length', 
+        type=int, 
+        default=128,
+        help='Truncation limit for patient inputs in tokens (default: 128)'
+    )
+    
+    parser.add_argument(
+        '--max-target-length', 
+        type=int, 
+        default=512,
+        help='Truncation limit for meal plan targets in tokens (default: 512)'
+    )
+    
+    parser.add_argument(
+        '--token-cache-dir', 
+        type=str, 
+        default=None,
+        help='Directory for the pre-tokenized token cache (default: models/token_cache)'
+    )
+    
+    parser.add_argument(
+        '--no-token-cache', 
+        action='store_true',
+        help='Tokenize on the fly instead of using the token cache'
+    )
+    
+    parser.add_argument(
+        '--pretokenize-only', 
+        action='store_true',
+        help='Build the token cache and exit without training'
+    )
+    
+    parser.add_argument(
+        '--dataloader-workers', 
+        type=int, 
+        default=0,
+        help='Number of DataLoader worker processes (default: 0)'
+    )
+    
+    parser.add_argument(
+        '--nproc', 
+        type=int, 
+        default=1,
+        help='Number of CPU data-parallel training processes (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--dataset-dir', 
+        type=str, 
+        default=None,
+        help='Directory containing foods.csv, patients.csv and doctor_plans.csv (default: ../docs/datasets)'
+    )
+    
+    parser.add_argument(
+        '--models-dir', 
+        type=str, 
+        default=None,
+        help='Directory where trained models are stored (default: models/ next to this script)'
+    )
+    
+    parser.add_argument(
+        '--progress-file', 
+        type=str, 
+        default=None,
+        help='Write training progress (step, loss, steps/s, ETA) to this JSON file'
+    )
+    
+    parser.add_argument(
+        '--incremental', 
+        action='store_true',
+        help='Resume from the deployed model and train only on plans added since the last run'
+    )
+    
+    parser.add_argument(
+        '--base-model', 
+        type=str, 
+        default=None,
+        help='Checkpoint directory to resume from in incremental mode (default: the output model), '
+             'or to train a --lora adapter on (default: models/ayurveda_meal_planner)'
+    )
+    
+    parser.add_argument(
+        '--replay-ratio', 
+        type=float, 
+        default=0.1,
+        help='Older plans mixed into incremental runs, relative to the new plans (default: 0.1)'
+    )
+    
+    parser.add_argument(
+        '--lora', 
+        action='store_true',
+        help='Train a LoRA adapter (saved to models/adapters/<output-name>) on the served model'
+    )
+    
+    parser.add_argument(
+        '--lora-r', 
+        type=int, 
+        default=8,
+        help='LoRA rank (default: 8)'
+    )
+    
+    parser.add_argument(
+        '--lora-alpha', 
+        type=int, 
+        default=16,
+        help='LoRA scaling alpha (default: 16)'
+    )
+    
+    parser.add_argument(
+        '--lora-dropout', 
+        type=float, 
+        default=0.05,
+        help='LoRA dropout (default: 0.05)'
+    )
+    
+    parser.add_argument(
+        '--sweep', 
+        type=str, 
+        default=None,
+        help='JSON sweep spec (grid or random search); trials are written to models/<output-name>'
+    )
+    
+    parser.add_argument(
+        '--sweep-threads-per-trial', 
+        type=int, 
+        default=2,
+        help='CPU threads per sweep trial (default: 2)'
+    )
+    
+    parser.add_argument(
+        '--sweep-workers', 
+        type=int, 
+        default=None,
+        help='Concurrent sweep trials (default: cores / threads per trial)'
+    )
+    
+    parser.add_argument(
+        '--distill', 
+        action='store_true',
+        help='Distill a larger teacher into --model-name using teacher pseudo-labels'
+    )
+    
+    parser.add_argument(
+        '--teacher-model-name', 
+        type=str, 
+        default='t5-base',
+        choices=['t5-base', 't5-large'],
+        help='Teacher base model for --distill (default: t5-base)'
+    )
+    
+    parser.add_argument(
+        '--teacher-dir', 
+        type=str, 
+        default=None,
+        help='Directory of an already trained teacher to reuse for --distill'
+    )
+    
+    parser.add_argument(
+        '--distill-eval-size', 
+        type=int, 
+        default=20,
+        help='Held-out patients used to compare teacher and student (default: 20)'
+    )
+    
+    parser.add_argument(
+        '--profile-steps', 
+        type=int, 
+        default=0,
+        help='Trace N training steps with torch.profiler into <output>/profiler (default: 0, off)'
+    )
+    
+    parser.add_argument(
+        '--streaming', 
+        action='store_true',
+        help='Stream plan CSV shards lazily instead of loading all plans into memory'
+    )
+    
+    parser.add_argument(
+        '--max-steps', 
+        type=int, 
+        default=-1,
+        help='Number of training steps; required with --streaming (default: -1, use epochs)'
+    )
+    
+    parser.add_argument(
+        '--plan-shards', 
+        type=str, 
+        default='doctor_plans*.csv',
+        help='Glob of plan CSV shards to stream, relative to the dataset dir (default: doctor_plans*.csv)'
+    )
+    
+    parser.add_argument(
+        '--shuffle-buffer', 
+        type=int, 
+        default=1024,
+        help='Samples held in the streaming shuffle buffer (default: 1024)'
+    )
+    
+    parser.add_argument(
+        '--compact', 
+        action='store_true',
+        help='Remove exact and near-duplicate samples, weighting the kept ones by cluster size'
+    )
+    
+    parser.add_argument(
+        '--dedup-threshold', 
+        type=float, 
+        default=0.9,
+        help='Input and target MinHash similarity treated as a near duplicate (default: 0.9)'
+    )
+    
+    parser.add_argument(
+        '--generation-eval', 
+        action='store_true',
+        help='Decode the validation set at each evaluation and select the best checkpoint by item F1'
+    )
+    
+    parser.add_argument(
+        '--generation-eval-samples', 
+        type=int, 
+        default=None,
+        help='Validation samples decoded per evaluation (default: all)'
+    )
+    
+    parser.add_argument(
+        '--early-stopping-patience', 
+        type=int, 
+        default=None,
+        help='Stop after N evaluations without improvement (default: off)'
+    )
+    
     parser.add_argument(
         '--seed', 
         type=int, 
@@ -142,14 +427,46 @@ Examples:
     
     return parser.parse_args()
 
-def setup_directories():
+def is_distributed_worker() -> bool:
+    """True when running as a rank spawned by torchrun"""
+    return "LOCAL_RANK" in os.environ
+
+def is_main_process() -> bool:
+    """True on rank 0, or when not running distributed"""
+    return int(os.environ.get("RANK", "0")) == 0
+
+def launch_distributed(nproc: int) -> int:
+    """Re-launch this script under torchrun with `nproc` CPU worker processes"""
+    from torch.distributed.run import main as torchrun_main
+    
+    # Split the cores between ranks so processes don't oversubscribe threads
+    threads_per_proc = max(1, (os.cpu_count() or 1) // nproc)
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_proc)
+    logger.info(f"🚀 Launching {nproc} training processes ({threads_per_proc} threads each, gloo backend)")
+    
+    try:
+        torchrun_main([
+            "--standalone",
+            f"--nproc-per-node={nproc}",
+            os.path.abspath(__file__),
+            *sys.argv[1:],
+        ])
+    except Exception as e:
+        logger.error(f"❌ Distributed training failed: {e}")
+        return 1
+    return 0
+
+def setup_directories(dataset_dir: str = None, models_dir: str = None):
     """Setup required directories"""
-    # Dataset directory (relative to script location)
-    dataset_dir = Path(__file__).parent.parent / "docs" / "datasets"
-    models_dir = Path(__file__).parent / "models"
+    # Dataset directory (relative to script location unless given)
+    if dataset_dir:
+        dataset_dir = Path(dataset_dir)
+    else:
+        dataset_dir = Path(__file__).parent.parent / "docs" / "datasets"
+    models_dir = Path(models_dir) if models_dir else Path(__file__).parent / "models"
     
     # Create models directory if it doesn't exist
-    models_dir.mkdir(exist_ok=True)
+    models_dir.mkdir(parents=True, exist_ok=True)
     
     # Check if dataset directory exists
     if not dataset_dir.exists():
@@ -167,8 +484,8 @@ def setup_directories():
     
     return dataset_dir, models_dir
 
-def load_datasets(dataset_dir: Path):
-    """Load training datasets"""
+def load_datasets(dataset_dir: Path, load_plans: bool = True):
+    """Load training datasets (plans are skipped when they will be streamed)"""
     logger.info("📊 Loading datasets...")
     
     # Define file paths
@@ -191,7 +508,7 @@ def load_datasets(dataset_dir: Path):
     try:
         foods = load_foods_csv(str(foods_path))
         patients = load_patients_csv(str(patients_path))
-        plans = load_doctor_plans_csv(str(plans_path))
+        plans = load_doctor_plans_csv(str(plans_path)) if load_plans else []
         
         logger.info(f"✓ Loaded {len(foods)} foods")
         logger.info(f"✓ Loaded {len(patients)} patients") 
@@ -223,6 +540,14 @@ def save_training_config(config: dict, output_dir: Path):
     
     logger.info(f"✓ Training config saved to {config_path}")
 
+def load_training_config(model_dir: Path) -> dict:
+    """Load training_config.json from a model directory (empty if missing)"""
+    config_path = Path(model_dir) / "training_config.json"
+    if not config_path.exists():
+        return {}
+    with open(config_path) as f:
+        return json.load(f)
+
 def main():
     """Main training function"""
     logger.info("=" * 60)
@@ -236,22 +561,51 @@ def main():
     if args.daily_mode:
         args.weekly_mode = False
     
+    if args.streaming:
+        if args.max_steps <= 0:
+            logger.error("--streaming needs --max-steps (a stream has no length)")
+            sys.exit(1)
+        conflicting = [flag for flag, on in [('--incremental', args.incremental), ('--compact', args.compact),
+                                             ('--sweep', args.sweep), ('--distill', args.distill),
+                                             ('--pretokenize-only', args.pretokenize_only)] if on]
+        if conflicting:
+            logger.error(f"--streaming cannot be combined with {', '.join(conflicting)}")
+            sys.exit(1)
+    
     # Setup directories
-    dataset_dir, models_dir = setup_directories()
+    dataset_dir, models_dir = setup_directories(args.dataset_dir, args.models_dir)
     output_dir = models_dir / args.output_name
-    
-    # Check if model already exists
-    if output_dir.exists() and not args.force:
+    if args.lora:
+        output_dir = models_dir / "adapters" / args.output_name
+    token_cache_dir = None
+    if not args.no_token_cache:
+        token_cache_dir = Path(args.token_cache_dir) if args.token_cache_dir else models_dir / "token_cache"
+    
+    # Check if model already exists (the launcher already checked for workers)
+    if (output_dir.exists() and not args.force and not args.pretokenize_only
+            and not args.incremental and not is_distributed_worker()):
         logger.error(f"Model directory already exists: {output_dir}")
         logger.error("Use --force to overwrite or choose a different --output-name")
         sys.exit(1)
     
+    # Hand off to torchrun; each rank re-enters main() as a worker
+    if args.nproc > 1 and not is_distributed_worker() and not args.pretokenize_only:
+        return launch_distributed(args.nproc)
+    
+    if is_distributed_worker():
+        import torch
+        torch.set_num_threads(int(os.environ.get("OMP_NUM_THREADS", "1")))
+    
+    # Deterministic seeding (identical on every rank)
+    set_seed(args.seed)
+    
     # Create output directory
-    output_dir.mkdir(parents=True, exist_ok=True)
+    if not args.pretokenize_only:
+        output_dir.mkdir(parents=True, exist_ok=True)
     
     # Load datasets
     try:
-        foods, patients, plans = load_datasets(dataset_dir)
+        foods, patients, plans = load_datasets(dataset_dir, load_plans=not args.streaming)
     except Exception as e:
         logger.error(f"Failed to load datasets: {e}")
         sys.exit(1)
@@ -265,10 +619,74 @@ def main():
         logger.error("No patients found in dataset")
         sys.exit(1)
     
-    if len(plans) == 0:
+    if len(plans) == 0 and not args.streaming:
         logger.error("No meal plans found in dataset")
         sys.exit(1)
     
+    # Sweep mode: many configurations in parallel, ranked in a leaderboard
+    if args.sweep:
+        try:
+            spec = load_sweep_spec(args.sweep)
+            leaderboard = run_sweep(
+                spec, foods, patients, plans,
+                sweep_dir=str(output_dir),
+                models_dir=str(models_dir),
+                threads_per_trial=args.sweep_threads_per_trial,
+                max_workers=args.sweep_workers,
+                seed=args.seed,
+                fixed={
+                    'weekly_mode': args.weekly_mode,
+                    'val_split': args.val_split,
+                    'max_input_length': args.max_input_length,
+                    'max_target_length': args.max_target_length,
+                    'token_cache_dir': str(token_cache_dir) if token_cache_dir else None,
+                    'generation_eval': args.generation_eval,
+                    'generation_eval_samples': args.generation_eval_samples,
+                    'early_stopping_patience': args.early_stopping_patience,
+                    'compact': args.compact,
+                    'dedup_threshold': args.dedup_threshold,
+                }
+            )
+        except Exception as e:
+            logger.error(f"❌ Sweep failed: {e}")
+            return 1
+        for entry in leaderboard[:5]:
+            params = {k: entry.get(k) for k in ('model_name', 'epochs', 'learning_rate', 'batch_size') if k in entry}
+            logger.info(f"   #{entry['rank']} trial {entry['trial']:03d} {params}: "
+                        f"{spec.get('metric', 'eval_loss')}={entry.get(spec.get('metric', 'eval_loss'))}")
+        logger.info(f"✅ Sweep completed! Leaderboard: {output_dir / 'leaderboard.json'}")
+        return 0
+    
+    # Distillation mode: teacher -> pseudo-labels -> student, plus comparison report
+    if args.distill:
+        logger.info(f"⚗️  Distilling {args.teacher_model_name} into {args.model_name}...")
+        try:
+            report = run_distillation(
+                foods, patients, plans,
+                models_dir=str(models_dir),
+                output_dir=str(output_dir),
+                teacher_name=args.teacher_model_name,
+                student_name=args.model_name,
+                teacher_dir=args.teacher_dir,
+                num_epochs=args.epochs,
+                batch_size=args.batch_size,
+                learning_rate=args.learning_rate,
+                weekly_mode=args.weekly_mode,
+                eval_size=args.distill_eval_size,
+                max_input_length=args.max_input_length,
+                max_target_length=args.max_target_length,
+                seed=args.seed
+            )
+        except Exception as e:
+            logger.error(f"❌ Distillation failed: {e}")
+            return 1
+        for role in ('teacher', 'student'):
+            stats = report[role]
+            logger.info(f"   {role}: {stats['model_name']} - {stats['latency_ms_mean']} ms/plan, "
+                        f"parse success {stats['parse_success_rate']}")
+        logger.info(f"✅ Distillation completed! Student saved to: {output_dir}")
+        return 0
+    
     # Initialize trainer
     logger.info("🤖 Initializing AI trainer...")
     trainer = MealPlanTrainer(
@@ -285,6 +703,64 @@ def main():
         logger.error(f"Failed to initialize engine: {e}")
         sys.exit(1)
     
+    # Offline pre-tokenization only
+    if args.pretokenize_only:
+        if token_cache_dir is None:
+            logger.error("--pretokenize-only cannot be combined with --no-token-cache")
+            return 1
+        cache_path = trainer.pretokenize(
+            patients, plans, str(token_cache_dir),
+            weekly_mode=args.weekly_mode,
+            max_input_length=args.max_input_length,
+            max_target_length=args.max_target_length
+        )
+        logger.info(f"✓ Token cache ready at {cache_path}")
+        return 0
+    
+    # Incremental mode: resume from the deployed checkpoint, train on new plans only
+    plans_watermark = 0
+    train_plans = plans
+    incremental_stats = {}
+    base_model_dir = None
+    if args.incremental:
+        base_model_dir = Path(args.base_model) if args.base_model else output_dir
+        if not (base_model_dir / "config.json").exists():
+            logger.error(f"No trained model to resume from at {base_model_dir}")
+            return 1
+        
+        plans_watermark = load_training_config(base_model_dir).get('plans_watermark', 0)
+        if plans_watermark == 0:
+            logger.warning("Base model has no plans watermark; training on all plans")
+        
+        train_plans, incremental_stats = select_incremental_plans(
+            plans, plans_watermark, replay_ratio=args.replay_ratio, seed=args.seed
+        )
+        if incremental_stats['num_new_plans'] == 0:
+            logger.info(f"✓ No new plans since watermark {plans_watermark}; nothing to train")
+            return 0
+        
+        try:
+            trainer.load_checkpoint(str(base_model_dir))
+        except Exception as e:
+            logger.error(f"Failed to load base model {base_model_dir}: {e}")
+            return 1
+        logger.info(f"♻️  Incremental run from {base_model_dir}: "
+                    f"{incremental_stats['num_new_plans']} new plans + "
+                    f"{incremental_stats['num_replay_plans']} replay plans")
+    elif args.lora:
+        # Adapters only apply to the weights they were trained on, so train on the served model
+        base_model_dir = Path(args.base_model) if args.base_model else models_dir / "ayurveda_meal_planner"
+        if not (base_model_dir / "config.json").exists():
+            logger.error(f"No trained model to train the adapter on at {base_model_dir}")
+            logger.error("Train the served model first or pass --base-model")
+            return 1
+        try:
+            trainer.load_checkpoint(str(base_model_dir))
+        except Exception as e:
+            logger.error(f"Failed to load base model {base_model_dir}: {e}")
+            return 1
+        logger.info(f"🧩 Training adapter {args.output_name} on {base_model_dir}")
+    
     # Training configuration
     training_config = {
         'model_name': args.model_name,
@@ -293,12 +769,30 @@ def main():
         'learning_rate': args.learning_rate,
         'weekly_mode': args.weekly_mode,
         'val_split': args.val_split,
+        'max_input_length': args.max_input_length,
+        'max_target_length': args.max_target_length,
+        'token_cache_dir': token_cache_dir,
+        'dataloader_workers': args.dataloader_workers,
+        'nproc': args.nproc,
         'seed': args.seed,
         'output_dir': output_dir,
         'dataset_dir': dataset_dir,
         'num_foods': len(foods),
         'num_patients': len(patients),
-        'num_plans': len(plans)
+        'num_plans': len(plans),
+        'streaming': args.streaming,
+        'max_steps': args.max_steps,
+        'incremental': args.incremental,
+        'base_model': base_model_dir,
+        'replay_ratio': args.replay_ratio if args.incremental else None,
+        'compact': args.compact,
+        'dedup_threshold': args.dedup_threshold if args.compact else None,
+        'generation_eval': args.generation_eval,
+        'early_stopping_patience': args.early_stopping_patience,
+        'lora': {'r': args.lora_r, 'alpha': args.lora_alpha, 'dropout': args.lora_dropout} if args.lora else None,
+        **incremental_stats,
+        # Plan rows trained on so far; only advanced after training succeeds
+        'plans_watermark': plans_watermark
     }
     
     logger.info("📋 Training Configuration:")
@@ -307,7 +801,34 @@ def main():
             logger.info(f"  {key}: {value}")
     
     # Save training configuration
-    save_training_config(training_config, output_dir)
+    if is_main_process():
+        save_training_config(training_config, output_dir)
+    
+    # Throughput report (training_metrics.json next to training_config.json)
+    throughput = ThroughputCallback(
+        str(output_dir / "training_metrics.json"),
+        profile_steps=args.profile_steps
+    )
+    callbacks = [throughput]
+    if args.progress_file:
+        callbacks.append(ProgressCallback(args.progress_file))
+    
+    # Streaming: plans stay on disk and are read shard by shard during training
+    dataset = None
+    if args.streaming:
+        plan_files = sorted(dataset_dir.glob(args.plan_shards))
+        if not plan_files:
+            logger.error(f"No plan shards matching {args.plan_shards} in {dataset_dir}")
+            return 1
+        logger.info(f"🌊 Streaming {len(plan_files)} plan shard(s) for {args.max_steps} steps")
+        dataset = trainer.build_streaming_dataset(
+            [str(path) for path in plan_files], patients,
+            weekly_mode=args.weekly_mode,
+            max_input_length=args.max_input_length,
+            max_target_length=args.max_target_length,
+            shuffle_buffer=args.shuffle_buffer,
+            seed=args.seed
+        )
     
     # Start training
     logger.info("🎯 Starting model training...")
@@ -317,19 +838,48 @@ def main():
         model_path = trainer.train(
             foods=foods,
             patients=patients,
-            plans=plans,
+            plans=train_plans,
             output_dir=str(output_dir),
             num_epochs=args.epochs,
             batch_size=args.batch_size,
             learning_rate=args.learning_rate,
             weekly_mode=args.weekly_mode,
             val_split=args.val_split,
-            save_model=True
+            save_model=True,
+            max_input_length=args.max_input_length,
+            max_target_length=args.max_target_length,
+            token_cache_dir=str(token_cache_dir) if token_cache_dir else None,
+            dataloader_num_workers=args.dataloader_workers,
+            seed=args.seed,
+            ddp_backend="gloo" if is_distributed_worker() else None,
+            callbacks=callbacks,
+            lora=training_config['lora'],
+            generation_eval=args.generation_eval,
+            generation_eval_samples=args.generation_eval_samples,
+            early_stopping_patience=args.early_stopping_patience,
+            compact=args.compact,
+            dedup_threshold=args.dedup_threshold,
+            max_steps=args.max_steps,
+            dataset=dataset,
+            pairing_plans=plans
         )
         
         end_time = datetime.now()
         training_duration = end_time - start_time
         
+        # Reporting and the smoke test below only run once
+        if not is_main_process():
+            return 0
+        
+        # Advance the watermark now that the plans are in the model
+        if not args.streaming:
+            training_config['plans_watermark'] = len(plans)
+        if trainer.compaction_stats:
+            training_config['compaction'] = {
+                k: v for k, v in trainer.compaction_stats.items() if k != 'largest_clusters'
+            }
+        save_training_config(training_config, output_dir)
+        
         logger.info("=" * 60)
         logger.info("✅ Training completed successfully!")
         logger.info(f"📁 Model saved to: {model_path}")
@@ -340,6 +890,12 @@ def main():
         logger.info(f"   - Epochs: {args.epochs}")
         logger.info(f"   - Batch size: {args.batch_size}")
         logger.info(f"   - Learning rate: {args.learning_rate}")
+        stats = throughput.summary()
+        logger.info(f"📈 Throughput: {stats['samples_per_second']} samples/s, "
+                    f"{stats['tokens_per_second']} tokens/s, "
+                    f"step p50 {stats['step_time_ms']['p50']} ms, "
+                    f"dataloader wait {stats['dataloader_wait_fraction']}, "
+                    f"peak RSS {stats['peak_rss_mb']} MB")
         logger.info("=" * 60)
         
         # Test the trained model
@@ -347,7 +903,12 @@ def main():
         try:
             # Load the trained model
             test_engine = HybridNeuralEngine(models_dir=str(models_dir))
-            test_engine.load_model(model_path)
+            test_adapter = None
+            if args.lora:
+                test_engine.load_model(str(trainer.lora_base_dir))
+                test_adapter = output_dir.name
+            else:
+                test_engine.load_model(model_path)
             
             # Build knowledge graph
             graph_data = test_engine.build_knowledge_graph(foods, patients)
@@ -358,10 +919,12 @@ def main():
                 logger.info(f"   Testing with patient: {test_patient.prakriti} constitution")
                 
                 if args.weekly_mode:
-                    result = test_engine.generate_weekly_meal_plan(test_patient, graph_data=graph_data)
+                    result = test_engine.generate_weekly_meal_plan(test_patient, graph_data=graph_data,
+                                                                   adapter=test_adapter)
                     logger.info(f"   ✓ Generated {len(result.days)}-day meal plan")
                 else:
-                    result = test_engine.generate_meal_plan(test_patient, day=1, graph_data=graph_data)
+                    result = test_engine.generate_meal_plan(test_patient, day=1, graph_data=graph_data,
+                                                            adapter=test_adapter)
                     parsed = test_engine.parse_generated_plan(result)
                     logger.info(f"   ✓ Generated meal plan with {len(parsed['breakfast'])} breakfast items")
                 
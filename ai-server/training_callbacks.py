@@ -0,0 +1,212 @@
+"""
+Trainer callbacks used by the meal plan training pipeline.
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+from transformers import TrainerCallback
+
+
+def write_json_atomic(path: Path, data: Dict[str, Any]):
+    """Write JSON via a temporary file and rename so readers never see partial files"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ProgressCallback(TrainerCallback):
+    """Periodically write training progress (step, loss, steps/s, ETA) to a JSON file.
+
+    The file is polled by the training job manager to report status for jobs
+    running in a separate process.
+    """
+
+    def __init__(self, progress_file: str, min_interval: float = 2.0):
+        self.progress_file = Path(progress_file)
+        self.min_interval = min_interval
+        self.start_time: Optional[float] = None
+        self.start_step = 0
+        self.last_write = 0.0
+        self.last_loss: Optional[float] = None
+
+    def _write(self, state, status: str):
+        if not state.is_world_process_zero:
+            return
+        now = time.time()
+        elapsed = now - self.start_time if self.start_time else 0.0
+        steps_done = state.global_step - self.start_step
+        steps_per_second = steps_done / elapsed if elapsed > 0 else 0.0
+        remaining = max(state.max_steps - state.global_step, 0)
+        eta_seconds = remaining / steps_per_second if steps_per_second > 0 else None
+        write_json_atomic(self.progress_file, {
+            'status': status,
+            'step': state.global_step,
+            'max_steps': state.max_steps,
+            'epoch': state.epoch,
+            'loss': self.last_loss,
+            'steps_per_second': round(steps_per_second, 4),
+            'elapsed_seconds': round(elapsed, 1),
+            'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+            'updated_at': datetime.now().isoformat(),
+        })
+        self.last_write = now
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.start_time = time.time()
+        self.start_step = state.global_step
+        self._write(state, "running")
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if logs and 'loss' in logs:
+            self.last_loss = float(logs['loss'])
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if time.time() - self.last_write >= self.min_interval:
+            self._write(state, "running")
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self._write(state, "finished")
+
+
+def _peak_rss_mb(children: bool = False) -> float:
+    """Peak resident set size in MB (ru_maxrss is KB on Linux, bytes on macOS)"""
+    import resource  # POSIX only; this module is imported by the server through training_jobs
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+class ThroughputCallback(TrainerCallback):
+    """Record training throughput and write a JSON report when training ends.
+
+    Reports samples/s, non-padding tokens/s, step time percentiles, time spent
+    waiting between steps (dataloader fetch and collation) and peak RSS.
+    Batch contents are reported through `record_batch`, which the training
+    loop calls for every batch; evaluation and checkpoint time between steps
+    is reported through `record_pause` and left out of the dataloader wait.
+    Optionally traces `profile_steps` steps with torch.profiler after
+    `profile_wait` steps.
+    """
+
+    def __init__(self, report_file: str, profile_steps: int = 0, profile_wait: int = 5,
+                 profile_dir: Optional[str] = None):
+        self.report_file = Path(report_file)
+        self.profile_steps = profile_steps
+        self.profile_wait = profile_wait
+        self.profile_dir = Path(profile_dir) if profile_dir else self.report_file.parent / "profiler"
+        self.profiler = None
+        self._reset()
+
+    def _reset(self):
+        self.train_start: Optional[float] = None
+        self.train_end: Optional[float] = None
+        self.step_start: Optional[float] = None
+        self.last_step_end: Optional[float] = None
+        self.step_times: List[float] = []
+        self.wait_times: List[float] = []
+        self.pause = 0.0  # evaluation/checkpoint time since the last step
+        self.pause_total = 0.0
+        self.samples = 0
+        self.input_tokens = 0
+        self.target_tokens = 0
+        self.padded_tokens = 0
+
+    def record_batch(self, inputs: Dict[str, Any]):
+        """Count samples and real (non-padding) tokens in a training batch"""
+        input_ids = inputs.get('input_ids')
+        if input_ids is None:
+            return
+        self.samples += int(input_ids.shape[0])
+        self.padded_tokens += int(input_ids.numel())
+        attention_mask = inputs.get('attention_mask')
+        self.input_tokens += int(attention_mask.sum()) if attention_mask is not None else int(input_ids.numel())
+        labels = inputs.get('labels')
+        if labels is not None:
+            self.padded_tokens += int(labels.numel())
+            self.target_tokens += int((labels != -100).sum())
+
+    def record_pause(self, seconds: float):
+        """Time spent between steps on evaluation or checkpoint saves"""
+        self.pause += seconds
+        self.pause_total += seconds
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._reset()
+        self.train_start = time.perf_counter()
+        self.last_step_end = self.train_start
+        if self.profile_steps > 0 and state.is_world_process_zero:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.profiler = torch.profiler.profile(
+                activities=activities,
+                schedule=torch.profiler.schedule(
+                    wait=self.profile_wait, warmup=1, active=self.profile_steps, repeat=1
+                ),
+                on_trace_ready=torch.profiler.tensorboard_trace_handler(str(self.profile_dir)),
+                record_shapes=True,
+                profile_memory=True,
+            )
+            self.profiler.start()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self.step_start = time.perf_counter()
+        if self.last_step_end is not None:
+            self.wait_times.append(max(self.step_start - self.last_step_end - self.pause, 0.0))
+        self.pause = 0.0
+
+    def on_step_end(self, args, state, control, **kwargs):
+        now = time.perf_counter()
+        if self.step_start is not None:
+            self.step_times.append(now - self.step_start)
+        self.last_step_end = now
+        if self.profiler is not None:
+            self.profiler.step()
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.train_end or time.perf_counter()
+        elapsed = end - self.train_start if self.train_start else 0.0
+        step_ms = np.array(self.step_times) * 1000.0
+        wait_s = float(np.sum(self.wait_times)) if self.wait_times else 0.0
+        real_tokens = self.input_tokens + self.target_tokens
+
+        def pct(q):
+            return round(float(np.percentile(step_ms, q)), 2) if len(step_ms) else None
+
+        return {
+            'train_seconds': round(elapsed, 2),
+            'steps': len(self.step_times),
+            'samples': self.samples,
+            'samples_per_second': round(self.samples / elapsed, 3) if elapsed else None,
+            'tokens_per_second': round(real_tokens / elapsed, 1) if elapsed else None,
+            'input_tokens': self.input_tokens,
+            'target_tokens': self.target_tokens,
+            'padding_fraction': round(1 - real_tokens / self.padded_tokens, 4) if self.padded_tokens else None,
+            'step_time_ms': {'p50': pct(50), 'p90': pct(90), 'p99': pct(99),
+                             'mean': round(float(step_ms.mean()), 2) if len(step_ms) else None},
+            'dataloader_wait_seconds': round(wait_s, 3),
+            'dataloader_wait_fraction': round(wait_s / elapsed, 4) if elapsed else None,
+            'eval_and_save_seconds': round(self.pause_total, 3),
+            'peak_rss_mb': _peak_rss_mb(),
+            'peak_rss_children_mb': _peak_rss_mb(children=True),
+            'profiler_trace_dir': str(self.profile_dir) if self.profile_steps > 0 else None,
+        }
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.train_end = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+        if state.is_world_process_zero:
+            write_json_atomic(self.report_file, self.summary())
+            print(f"✓ Training throughput report saved to {self.report_file}")
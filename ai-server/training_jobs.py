@@ -0,0 +1,232 @@
+"""
+Training job manager for the Ayurveda AI server.
+
+Training runs `train_model.py` in a separate, resource-limited process so it
+never shares CPU threads or model weights with the serving engine. Each job
+writes its model into its own directory and reports progress through a JSON
+file; job history is persisted to disk. When a job completes, the
+`on_complete` hook is called so the server can load the new model and swap
+it in atomically.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from training_callbacks import write_json_atomic
+
+TRAIN_SCRIPT = Path(__file__).parent / "train_model.py"
+
+# Applies the priority and memory limit in a fresh interpreter, then execs the
+# command: a preexec_fn is unsafe in the multithreaded server process.
+# argv: niceness, address space limit in bytes (0 = none), command...
+LIMITS_WRAPPER = (
+    "import os, resource, sys\n"
+    "os.nice(int(sys.argv[1]))\n"
+    "limit = int(sys.argv[2])\n"
+    "if limit:\n"
+    "    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))\n"
+    "os.execv(sys.argv[3], sys.argv[3:])\n"
+)
+
+
+@dataclass
+class TrainingJob:
+    job_id: str
+    status: str  # queued, running, completed, failed
+    params: Dict[str, Any]
+    output_dir: str
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    pid: Optional[int] = None
+    return_code: Optional[int] = None
+    error: Optional[str] = None
+    deployed: bool = False
+    progress: Dict[str, Any] = field(default_factory=dict)
+
+
+class JobAlreadyRunningError(RuntimeError):
+    pass
+
+
+class TrainingJobManager:
+    """Launch, track and persist training jobs running in child processes"""
+
+    def __init__(self, models_dir: str, dataset_dir: str,
+                 cpu_threads: Optional[int] = None, niceness: int = 10,
+                 memory_limit_mb: Optional[int] = None,
+                 on_complete: Optional[Callable[[TrainingJob], None]] = None):
+        self.models_dir = Path(models_dir).resolve()
+        self.dataset_dir = Path(dataset_dir).resolve()
+        self.jobs_dir = self.models_dir / "training_jobs"
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.history_file = self.jobs_dir / "jobs.json"
+        # Leave at least half the cores to the serving process by default
+        self.cpu_threads = cpu_threads or max(1, (os.cpu_count() or 2) // 2)
+        self.niceness = niceness
+        self.memory_limit_mb = memory_limit_mb
+        self.on_complete = on_complete
+        self._lock = threading.Lock()
+        self.jobs: Dict[str, TrainingJob] = self._load_history()
+
+    # Persistence
+    def _load_history(self) -> Dict[str, TrainingJob]:
+        if not self.history_file.exists():
+            return {}
+        with open(self.history_file) as f:
+            raw = json.load(f)
+        jobs = {}
+        for item in raw:
+            job = TrainingJob(**item)
+            # Jobs that were running when the server stopped cannot be resumed
+            if job.status in ("queued", "running"):
+                job.status = "failed"
+                job.error = "Interrupted by server restart"
+            jobs[job.job_id] = job
+        return jobs
+
+    def _save_history(self):
+        write_json_atomic(self.history_file, [asdict(job) for job in self.jobs.values()])
+
+    # Job lifecycle
+    def submit(self, params: Dict[str, Any]) -> TrainingJob:
+        """Start a new training job; only one job runs at a time"""
+        with self._lock:
+            if any(job.status in ("queued", "running") for job in self.jobs.values()):
+                raise JobAlreadyRunningError("A training job is already running")
+            job_id = uuid.uuid4().hex[:12]
+            output_name = f"{params.get('output_name', 'ayurveda_meal_planner')}_{job_id}"
+            job = TrainingJob(
+                job_id=job_id,
+                status="queued",
+                params=params,
+                output_dir=str(self.models_dir / output_name),
+                created_at=datetime.now().isoformat(),
+            )
+            self.jobs[job_id] = job
+            self._save_history()
+
+        thread = threading.Thread(target=self._run, args=(job,), daemon=True)
+        thread.start()
+        return job
+
+    def _build_command(self, job: TrainingJob) -> List[str]:
+        params = job.params
+        cmd = [
+            sys.executable, str(TRAIN_SCRIPT),
+            "--epochs", str(params.get("epochs", 3)),
+            "--batch-size", str(params.get("batch_size", 1)),
+            "--learning-rate", str(params.get("learning_rate", 3e-4)),
+            "--model-name", str(params.get("model_name", "t5-small")),
+            "--output-name", Path(job.output_dir).name,
+            "--models-dir", str(self.models_dir),
+            "--dataset-dir", str(self.dataset_dir),
+            "--progress-file", str(self._progress_file(job)),
+            "--force",
+        ]
+        if not params.get("weekly_mode", True):
+            cmd.append("--daily-mode")
+        if params.get("incremental"):
+            # Continue from the model currently being served
+            base_model = params.get("base_model")
+            if not base_model:
+                latest = self.latest_deployed()
+                base_model = latest.output_dir if latest else str(self.models_dir / "ayurveda_meal_planner")
+            cmd += ["--incremental", "--base-model", str(base_model),
+                    "--replay-ratio", str(params.get("replay_ratio", 0.1))]
+        return cmd
+
+    def _progress_file(self, job: TrainingJob) -> Path:
+        return self.jobs_dir / f"{job.job_id}.progress.json"
+
+    def _with_limits(self, cmd: List[str]) -> List[str]:
+        """`cmd` run at lower priority and with capped memory (POSIX only)"""
+        if os.name != "posix":
+            return cmd
+        limit = (self.memory_limit_mb or 0) * 1024 * 1024
+        return [sys.executable, "-c", LIMITS_WRAPPER, str(self.niceness), str(limit), *cmd]
+
+    def _run(self, job: TrainingJob):
+        env = os.environ.copy()
+        threads = str(self.cpu_threads)
+        env.update({"OMP_NUM_THREADS": threads, "MKL_NUM_THREADS": threads,
+                    "TOKENIZERS_PARALLELISM": "false"})
+        log_path = self.jobs_dir / f"{job.job_id}.log"
+        try:
+            with open(log_path, "w") as log_file:
+                proc = subprocess.Popen(
+                    self._with_limits(self._build_command(job)),
+                    cwd=str(TRAIN_SCRIPT.parent),
+                    env=env,
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                )
+                with self._lock:
+                    job.status = "running"
+                    job.pid = proc.pid
+                    job.started_at = datetime.now().isoformat()
+                    self._save_history()
+                return_code = proc.wait()
+        except Exception as e:
+            return_code = -1
+            job.error = str(e)
+
+        with self._lock:
+            job.return_code = return_code
+            job.finished_at = datetime.now().isoformat()
+            job.progress = self._read_progress(job)
+            if return_code == 0:
+                job.status = "completed"
+            else:
+                job.status = "failed"
+                job.error = job.error or f"Training process exited with code {return_code}; see {log_path}"
+            self._save_history()
+
+        if job.status == "completed" and not (Path(job.output_dir) / "config.json").exists():
+            # e.g. an incremental run that found no new plans
+            with self._lock:
+                job.error = "Training finished without producing a new model"
+                self._save_history()
+        elif job.status == "completed" and self.on_complete:
+            try:
+                self.on_complete(job)
+                with self._lock:
+                    job.deployed = True
+                    self._save_history()
+            except Exception as e:
+                with self._lock:
+                    job.error = f"Model swap failed: {e}"
+                    self._save_history()
+
+    # Queries
+    def _read_progress(self, job: TrainingJob) -> Dict[str, Any]:
+        progress_file = self._progress_file(job)
+        if not progress_file.exists():
+            return job.progress
+        try:
+            with open(progress_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return job.progress
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        job = self.jobs.get(job_id)
+        if job is not None and job.status == "running":
+            job.progress = self._read_progress(job)
+        return job
+
+    def list_jobs(self) -> List[TrainingJob]:
+        return sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def latest_deployed(self) -> Optional[TrainingJob]:
+        """Most recent job whose model was swapped into serving"""
+        deployed = [j for j in self.list_jobs() if j.deployed and Path(j.output_dir).exists()]
+        return deployed[0] if deployed else None